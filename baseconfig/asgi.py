@@ -14,3 +14,14 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'baseconfig.settings')
 
 application = get_asgi_application()
+
+# Load the in-process skill index before serving the first request. ASGI
+# servers import this module inside their event loop, where the ORM refuses
+# to run, so the index is built in a thread.
+from threading import Thread  # noqa: E402
+
+from jobseek.skill_index import skill_index  # noqa: E402
+
+warm_up = Thread(target=skill_index.warm_up)
+warm_up.start()
+warm_up.join()
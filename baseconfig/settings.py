@@ -1,6 +1,7 @@
 import dj_database_url
 from decouple import config
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'jobseek.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -79,6 +81,19 @@ WSGI_APPLICATION = 'baseconfig.wsgi.application'
 DATABASES = {
     'default': dj_database_url.parse(config('DATABASE_URL'), conn_max_age=600)
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Tests use a file database: threads sharing an in-memory one fail on
+    # table locks instead of waiting for them
+    DATABASES['default']['TEST'] = {'NAME': os.path.join(tempfile.gettempdir(), 'jobseeker_test.sqlite3')}
+
+# Cache, local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared backend (file, database, redis) when running several workers
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='jobseeker'),
+    }
+}
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -114,13 +129,51 @@ if not DEBUG:
     STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Resume uploads are sent in chunks of this size, up to the maximum size
+RESUME_UPLOAD_CHUNK_SIZE = config('RESUME_UPLOAD_CHUNK_SIZE', default=1024 * 1024, cast=int)
+RESUME_UPLOAD_MAX_SIZE = config('RESUME_UPLOAD_MAX_SIZE', default=20 * 1024 * 1024, cast=int)
+
+# Resume text kept for search, and the most bytes inflated from one compressed part of a resume
+RESUME_TEXT_MAX_LENGTH = config('RESUME_TEXT_MAX_LENGTH', default=200_000, cast=int)
+RESUME_TEXT_MAX_INPUT = config('RESUME_TEXT_MAX_INPUT', default=50 * 1024 * 1024, cast=int)
+
+# Processes rendering the logo and profile picture thumbnails
+THUMBNAIL_WORKERS = config('THUMBNAIL_WORKERS', default=2, cast=int)
+
+# Background tasks, concurrency is the most tasks of a queue running at once across all workers
+TASK_QUEUES = {
+    'default': {'concurrency': 4},
+    'notifications': {'concurrency': 2},
+    'resumes': {'concurrency': 2},
+    'thumbnails': {'concurrency': 2},
+}
+TASK_LEASE_SECONDS = config('TASK_LEASE_SECONDS', default=600, cast=int)  # Running tasks older than this are retried
+TASK_RETRY_BASE_SECONDS = config('TASK_RETRY_BASE_SECONDS', default=10, cast=int)
+TASK_RETRY_MAX_SECONDS = config('TASK_RETRY_MAX_SECONDS', default=3600, cast=int)
+
+# Request metrics served at /metrics, which then requires this bearer token when
+# set, and otherwise only answers staff signed in to the admin, or anyone with DEBUG
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_SERVER_TIMING = config('METRICS_SERVER_TIMING', default=True, cast=bool)
+
+# Sampling profiler, off unless a threshold is set; slower requests are written as collapsed stacks
+PROFILE_SLOW_REQUESTS_MS = config('PROFILE_SLOW_REQUESTS_MS', default=0, cast=int)
+PROFILE_INTERVAL_MS = config('PROFILE_INTERVAL_MS', default=5, cast=int)
+PROFILE_DIR = config('PROFILE_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+
+# Email
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='no-reply@jobseeker.local')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'jobseek.authentication.ClaimsJWTAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'jobseek.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
 
 SIMPLE_JWT = {
@@ -128,4 +181,25 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'jobseek.authentication.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'jobseek.authentication.TokenRefreshSerializer',
 }
+
+# How long the user rows and token stamps read by the JWT authentication are
+# cached; see jobseek/authentication.py
+JWT_USER_CACHE_SECONDS = config('JWT_USER_CACHE_SECONDS', default=60, cast=int)
+
+# Jobs recommended per user, skill sets searched per user before settling
+# for the best jobs found, and newest jobs scored live for users without
+# stored ones; see jobseek/recommendations.py
+RECOMMENDATIONS_TOP_K = config('RECOMMENDATIONS_TOP_K', default=20, cast=int)
+RECOMMENDATIONS_MAX_SKILL_SETS = config('RECOMMENDATIONS_MAX_SKILL_SETS', default=100_000, cast=int)
+RECOMMENDATIONS_LIVE_CANDIDATES = config('RECOMMENDATIONS_LIVE_CANDIDATES', default=2000, cast=int)
+
+# Relative error of the salary percentiles, which sets the width of the
+# histogram buckets; see jobseek/salaries.py
+SALARY_ACCURACY = config('SALARY_ACCURACY', default=0.01, cast=float)
+
+# Days of job and company changes kept for the sync feed, older cursors are
+# expired; see jobseek/changes.py
+CHANGES_RETENTION_DAYS = config('CHANGES_RETENTION_DAYS', default=30, cast=int)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'baseconfig.settings')
 
 application = get_wsgi_application()
+
+# Load the in-process skill index before serving the first request
+from jobseek.skill_index import skill_index  # noqa: E402
+
+skill_index.warm_up()
@@ -4,7 +4,12 @@ from .models import Company, Job, JobSkill, Skill, Application, CustomUser
 
 admin.site.register(Company)
 admin.site.register(Job)
-admin.site.register(JobSkill)
 admin.site.register(Skill)
 admin.site.register(Application)
 admin.site.register(CustomUser)
+
+
+@admin.register(JobSkill)
+class JobSkillAdmin(admin.ModelAdmin):
+    # JobSkill.__str__ reads the job title
+    list_select_related = ('job',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class JobseekConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'jobseek'
+
+    def ready(self):
+        from . import events, metrics, resumes, signals  # noqa: F401
+        metrics.instrument_serializers()
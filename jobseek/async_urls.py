@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import async_views
+
+urlpatterns = [
+    path('job/', async_views.job_list, name='async-job-list'),
+    path('job/search/', async_views.job_search, name='async-job-search'),
+    path('job/<int:pk>/', async_views.job_detail, name='async-job-detail'),
+    path('application/get_by_user/', async_views.application_get_by_user, name='async-application-get-by-user'),
+    path('user/get_current_user/', async_views.user_get_current_user, name='async-user-get-current-user'),
+]
@@ -0,0 +1,105 @@
+"""
+Async versions of the hot read endpoints, served under /async/.
+
+They run on the ASGI entry point and use the async ORM, so a uvicorn worker
+keeps accepting requests while queries are in flight. Serialization happens
+on rows already loaded with their relations, so no serializer field can
+issue a query from the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import STAMP_CLAIM, ClaimsJWTAuthentication, check_user
+from .mixins import relation_lookups
+from .models import Application, CustomUser, Job
+from .pagination import KeysetPagination
+from .places import PlaceQueryError
+from .search import search_job_params
+from .serializers import ApplicationSerializer, CustomUserSerializer, JobSerializer
+
+
+def related_queryset(queryset, serializer_class):
+    select, prefetch = relation_lookups(serializer_class)
+    return queryset.select_related(*select).prefetch_related(*prefetch)
+
+
+async def paginated_response(request, queryset, serializer_class):
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(related_queryset(queryset, serializer_class), Request(request))
+    data = serializer_class(page, many=True).data
+    return JsonResponse(paginator.get_paginated_response(data).data)
+
+
+async def authenticate(request):
+    """
+    Returns the user of the JWT access token of a request, or None. The
+    token is checked in memory, its stamp against the current one as the
+    sync views do, so revoked tokens are refused here too, and the user row
+    is read with the async ORM.
+    """
+    authentication = ClaimsJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+        user_id = token[jwt_settings.USER_ID_CLAIM]
+        if STAMP_CLAIM in token:
+            await sync_to_async(check_user)(token)
+    except (AuthenticationFailed, InvalidToken, TokenError, KeyError):
+        return None
+    try:
+        return await CustomUser.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id}, is_active=True)
+    except CustomUser.DoesNotExist:
+        return None
+
+
+def unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+@require_GET
+async def job_list(request):
+    return await paginated_response(request, Job.objects.order_by('-created_at', '-id'), JobSerializer)
+
+
+@require_GET
+async def job_detail(request, pk):
+    queryset = related_queryset(Job.objects.all(), JobSerializer)
+    try:
+        job = await queryset.aget(pk=pk)
+    except Job.DoesNotExist:
+        raise Http404('No Job matches the given query.')
+    return JsonResponse(JobSerializer(job).data)
+
+
+@require_GET
+async def job_search(request):
+    try:
+        # The area reads the geohashes of its edge cells
+        jobs = await sync_to_async(search_job_params)(Job.objects.order_by('-created_at', '-id'), request.GET)
+    except PlaceQueryError as error:
+        return JsonResponse({'detail': str(error)}, status=400)
+    return await paginated_response(request, jobs, JobSerializer)
+
+
+@require_GET
+async def application_get_by_user(request):
+    user = await authenticate(request)
+    if user is None:
+        return unauthorized()
+    applications = Application.objects.filter(applicant_email=user.email).order_by('-created_at', '-id')
+    return await paginated_response(request, applications, ApplicationSerializer)
+
+
+@require_GET
+async def user_get_current_user(request):
+    user = await authenticate(request)
+    if user is None:
+        return unauthorized()
+    return JsonResponse(CustomUserSerializer(user).data)
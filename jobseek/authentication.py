@@ -0,0 +1,258 @@
+"""
+JWT authentication without a user query per request.
+
+Access tokens carry the fields most views need (id, username, email, staff
+and superuser flags) and a stamp derived from the password hash, the active
+flag and those fields. A request is authenticated from the signed claims once
+the stamp is checked against the current one, kept in the cache for
+JWT_USER_CACHE_SECONDS and dropped whenever the user is saved or deleted, so
+a password change, a deactivation or a change of the fields carried revokes
+the access tokens issued before it. Refreshing checks the password and the
+active flag alone and writes the current fields into the new tokens.
+
+With the default per-process cache, other processes notice within
+JWT_USER_CACHE_SECONDS; a shared cache backend makes it immediate. Updates
+through QuerySet.update() send no signal and are only noticed on expiry.
+Tokens issued before the stamp existed are checked against the database.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication, serializers, tokens
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import ClaimsUser, CustomUser
+
+STAMP_CLAIM = 'stamp'
+STAMP_PREFIX = 'jobseek:auth:stamp:'
+
+# User fields carried by the tokens, by claim
+CLAIMS = {'username': 'username', 'email': 'email', 'is_staff': 'staff', 'is_superuser': 'superuser'}
+
+
+class TTLCache:
+    """A small thread-safe per-process cache whose entries expire."""
+
+    def __init__(self, seconds, size=10_000):
+        self.seconds = seconds
+        self.size = size
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value, seconds=None):
+        with self.lock:
+            if key not in self.entries and len(self.entries) >= self.size:
+                del self.entries[next(iter(self.entries))]  # The oldest
+            self.entries[key] = (time.monotonic() + (self.seconds if seconds is None else seconds), value)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Full user rows for the views that read more than the claims
+user_rows = TTLCache(settings.JWT_USER_CACHE_SECONDS)
+
+# What is known of refresh tokens by jti: the id of their outstanding row,
+# and whether they are blacklisted. Neither changes once true.
+outstanding_ids = TTLCache(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+blacklisted = TTLCache(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+def user_stamp(password, is_active, claims):
+    """
+    Changes with the password, the active flag and the claim values, by
+    claim name; empty for inactive users.
+    """
+    if not is_active:
+        return ''
+    value = '\0'.join([password, *(str(claims.get(claim)) for claim in CLAIMS.values())])
+    return salted_hmac('jobseek.authentication.user_stamp', value, algorithm='sha256').hexdigest()[:16]
+
+
+def claim_row(user_id):
+    """The password, active flag and claim values of a user, None if the user is gone."""
+    row = CustomUser.objects.filter(pk=user_id).values('password', 'is_active', *CLAIMS).first()
+    if row is None:
+        return None
+    return row['password'], row['is_active'], {claim: row[field] for field, claim in CLAIMS.items()}
+
+
+def current_stamp(user_id):
+    key = f'{STAMP_PREFIX}{user_id}'
+    stamp = cache.get(key)
+    if stamp is None:
+        row = claim_row(user_id)
+        stamp = user_stamp(*row) if row else ''
+        cache.set(key, stamp, settings.JWT_USER_CACHE_SECONDS)
+    return stamp
+
+
+def cached_user_row(user_id):
+    """The field values of a user by attribute name, None if the user is gone."""
+    row = user_rows.get(user_id)
+    if row is None:
+        row = CustomUser.objects.filter(pk=user_id).values(
+            *[field.attname for field in CustomUser._meta.concrete_fields]
+        ).first()
+        if row is not None:
+            user_rows.set(user_id, row)
+    return row
+
+
+def forget_user(user_id):
+    """Drops what is cached of a user, again after the transaction commits."""
+    def forget():
+        cache.delete(f'{STAMP_PREFIX}{user_id}')
+        user_rows.delete(user_id)
+    forget()
+    transaction.on_commit(forget)
+
+
+def check_user(token):
+    """
+    Raises AuthenticationFailed unless the user of a token is active and has
+    not changed its password or the fields carried since the token was issued.
+    """
+    try:
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+    stamp = current_stamp(user_id)
+    if not stamp:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if not constant_time_compare(stamp, token.get(STAMP_CLAIM, '')):
+        raise AuthenticationFailed(_('Token was revoked'), code='token_revoked')
+    return user_id
+
+
+class ClaimsJWTAuthentication(authentication.JWTAuthentication):
+    """
+    JWTAuthentication building the user from the token claims; see the
+    module docstring. Tokens without a stamp fall back to reading the user.
+    """
+
+    def get_user(self, validated_token):
+        if STAMP_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        values = {field: validated_token.get(claim) for field, claim in CLAIMS.items()}
+        values['id'] = check_user(validated_token)
+        values['is_active'] = True
+        return ClaimsUser.from_claims(values)
+
+
+class CachedRefreshToken(tokens.RefreshToken):
+    """
+    A refresh token checking the blacklist with one lookup of its
+    outstanding row, remembering what it found, and refusing a second
+    rotation of the same token instead of letting both through.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if blacklisted.get(jti):
+            raise TokenError(_('Token is blacklisted'))
+        row = OutstandingToken.objects.filter(jti=jti).values_list('id', 'blacklistedtoken').first()
+        if row is not None:
+            outstanding_ids.set(jti, row[0])
+            if row[1] is not None:
+                blacklisted.set(jti, True)
+                raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        token_id = outstanding_ids.get(jti)
+        if token_id is None:
+            token_id = OutstandingToken.objects.get_or_create(jti=jti, defaults={
+                'token': str(self),
+                'expires_at': datetime_from_epoch(self.payload['exp']),
+            })[0].pk
+        try:
+            with transaction.atomic():
+                record = BlacklistedToken.objects.create(token_id=token_id)
+        except IntegrityError:
+            raise TokenError(_('Token is blacklisted'))
+        blacklisted.set(jti, True)
+        return record, True
+
+    def outstand(self, user_id):
+        """Records the token as outstanding, as for_user does for new pairs."""
+        record = OutstandingToken.objects.create(
+            user_id=user_id,
+            jti=self.payload[api_settings.JTI_CLAIM],
+            token=str(self),
+            created_at=self.current_time,
+            expires_at=datetime_from_epoch(self.payload['exp']),
+        )
+        outstanding_ids.set(record.jti, record.pk)
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    token_class = CachedRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for field, claim in CLAIMS.items():
+            token[claim] = getattr(user, field)
+        token[STAMP_CLAIM] = user_stamp(
+            user.password, user.is_active, {claim: token[claim] for claim in CLAIMS.values()},
+        )
+        return token
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    """
+    Rotates refresh tokens like the default serializer, also refusing the
+    tokens of users that were deactivated or changed their password, and
+    writing the current fields of the user into the new tokens.
+    """
+    token_class = CachedRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        row = claim_row(user_id)
+        if row is None or not row[1]:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        password, claims = row[0], row[2]
+        # The stamp of the claims the token carries, with the current password
+        if STAMP_CLAIM in refresh and not constant_time_compare(
+            user_stamp(password, True, {claim: refresh.get(claim) for claim in CLAIMS.values()}), refresh[STAMP_CLAIM],
+        ):
+            raise AuthenticationFailed(_('Token was revoked'), code='token_revoked')
+        for claim, value in claims.items():
+            refresh[claim] = value
+        refresh[STAMP_CLAIM] = user_stamp(password, True, claims)
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand(user_id)
+            data['refresh'] = str(refresh)
+        return data
@@ -0,0 +1,148 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .mixins import relation_lookups
+
+GENERATION_PREFIX = 'jobseek:generation:'
+RESPONSE_PREFIX = 'jobseek:response:'
+
+
+def generation(scope):
+    """Returns the current generation of a cache scope such as `job` or `job:12`."""
+    return cache.get_or_set(GENERATION_PREFIX + scope, 1, None)
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = GENERATION_PREFIX + scope
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+
+
+def invalidate(*scopes):
+    """
+    Moves the scopes to a new generation, which orphans every cached response
+    built from them. This runs again after the transaction commits so that a
+    response cached from a reader that saw the old rows is dropped too.
+    """
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def validators(instances, select=()):
+    """
+    Derives the `(ETag, Last-Modified)` of a response from the `updated_at`
+    of the rendered instances and of the related rows they render.
+
+    Args:
+        instances (iterable): The rendered model instances.
+        select (iterable, optional): select_related lookups rendered with them.
+
+    Returns:
+        tuple: The quoted ETag and the last modification as an integer
+        timestamp, or None when no instance has an `updated_at`.
+    """
+    parts, latest = [], None
+    for instance in instances:
+        rows = [instance]
+        for lookup in select:
+            related = instance
+            for attr in lookup.split('__'):
+                related = getattr(related, attr, None)
+            rows.append(related)
+        for row in rows:
+            updated_at = getattr(row, 'updated_at', None)
+            if updated_at is None:
+                continue
+            parts.append(f'{row._meta.label}:{row.pk}:{updated_at.timestamp()}')
+            if latest is None or updated_at > latest:
+                latest = updated_at
+    digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    # HTTP dates have a one second resolution, the ETag carries the rest
+    return quote_etag(digest), int(latest.timestamp()) if latest else None
+
+
+def with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class CachedReadMixin:
+    """
+    Caches the list and retrieve responses of a viewset and answers
+    conditional requests with 304 before any serialization.
+
+    Cached responses are keyed on the generations of `cache_scope` (for
+    lists) or `cache_scope:<pk>` (for details), which the signals move
+    forward whenever a row the response renders changes.
+    """
+    cache_scope = None
+    cache_timeout = 60 * 5
+
+    def response_cache_key(self, request, scopes):
+        generations = ','.join(f'{scope}={generation(scope)}' for scope in scopes)
+        accepted = getattr(request, 'accepted_media_type', '')
+        raw = f'{request.build_absolute_uri()}|{accepted}|{generations}'
+        return RESPONSE_PREFIX + hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+    def cached_response(self, request, key):
+        cached = cache.get(key)
+        if cached is None:
+            return None
+        data, etag, last_modified = cached
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        response = not_modified or Response(data)
+        return with_validators(response, etag, last_modified)
+
+    def render_and_cache(self, request, key, instances, serialize):
+        select, _ = relation_lookups(self.get_serializer_class())
+        etag, last_modified = validators(instances, select)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return with_validators(not_modified, etag, last_modified)
+        response = serialize()
+        if response.status_code == 200:
+            cache.set(key, (response.data, etag, last_modified), self.cache_timeout)
+        return with_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        key = self.response_cache_key(request, [self.cache_scope])
+        response = self.cached_response(request, key)
+        if response is not None:
+            return response
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        instances = list(page if page is not None else queryset)
+
+        def serialize():
+            serializer = self.get_serializer(instances, many=True)
+            if page is not None:
+                return self.get_paginated_response(serializer.data)
+            return Response(serializer.data)
+
+        return self.render_and_cache(request, key, instances, serialize)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        if not pk.isdigit() or pk != str(int(pk)):
+            # Only canonical ids map onto the scope the signals invalidate
+            return super().retrieve(request, *args, **kwargs)
+        key = self.response_cache_key(request, [f'{self.cache_scope}:{pk}'])
+        response = self.cached_response(request, key)
+        if response is not None:
+            return response
+
+        instance = self.get_object()
+        return self.render_and_cache(
+            request, key, [instance], lambda: Response(self.get_serializer(instance).data)
+        )
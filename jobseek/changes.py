@@ -0,0 +1,249 @@
+"""
+Feed of the jobs and companies created, updated or deleted after a cursor,
+for mirrors syncing incrementally instead of downloading the catalog again.
+
+Triggers on the job and company tables (migration 0013) append a Change row
+in the statement making the change: bulk writes, queryset updates and
+cascades are logged like saves, and a rolled back change never is. On
+SQLite a migration remaking either table drops its triggers, so they are
+created again after every `migrate`, with a warning, by `install_triggers`.
+
+A page reads the log after the cursor in position order, `(transaction id,
+id)`. The changes of one row within a page make one entry with its current
+state, or a tombstone once the row is gone, so a sync costs the churn since
+the last one rather than the size of the catalog. On PostgreSQL ids are
+handed out before commit and a transaction committing late could add a
+change behind a cursor already given out; there the feed only reads the
+changes of transactions older than every running one, below the xmin of
+the snapshot, which are all visible already.
+
+`manage.py prune_changes` drops the log older than the retention and leaves
+a marker in its place: cursors from before it are expired, their consumers
+resync from the exports and follow the feed from the head cursor taken
+before.
+"""
+import json
+import logging
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .mixins import relation_lookups
+from .models import Change, Company, Job
+from .pagination import KeysetPagination
+from .serializers import CompanySerializer, JobSerializer
+
+logger = logging.getLogger(__name__)
+
+ORDERING = [('transaction_id', False), ('id', False)]
+
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+SOURCES = {
+    'job': (Job, JobSerializer),
+    'company': (Company, CompanySerializer),
+}
+
+
+# The triggers of migration 0013, by vendor, created only where missing
+TABLES = {'job': 'jobseek_job', 'company': 'jobseek_company'}
+
+SQLITE_TRIGGERS = {
+    f'jobseek_{model}_change_{suffix}': f"""
+    CREATE TRIGGER IF NOT EXISTS jobseek_{model}_change_{suffix} AFTER {event} ON {table} BEGIN
+        INSERT INTO jobseek_change (transaction_id, model, object_id, action, changed_at)
+        VALUES (0, '{model}', {row}.id, '{action}', strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END
+    """
+    for model, table in TABLES.items()
+    for suffix, event, row, action in (
+        ('ai', 'INSERT', 'new', 'created'), ('au', 'UPDATE', 'new', 'updated'), ('ad', 'DELETE', 'old', 'deleted'),
+    )
+}
+
+POSTGRES_FUNCTION = """
+    CREATE OR REPLACE FUNCTION jobseek_record_change() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO jobseek_change (transaction_id, model, object_id, action, changed_at)
+        VALUES (
+            pg_current_xact_id()::text::bigint, TG_ARGV[0],
+            CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+            CASE TG_OP WHEN 'INSERT' THEN 'created' WHEN 'UPDATE' THEN 'updated' ELSE 'deleted' END,
+            now()
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+POSTGRES_TRIGGERS = {
+    f'jobseek_{model}_change': f"""
+    CREATE TRIGGER jobseek_{model}_change AFTER INSERT OR UPDATE OR DELETE ON {table}
+    FOR EACH ROW EXECUTE FUNCTION jobseek_record_change('{model}')
+    """
+    for model, table in TABLES.items()
+}
+
+
+class ChangeFeedError(ValueError):
+    """Raised for change feed parameters that cannot be understood."""
+    pass
+
+
+class CursorExpiredError(ChangeFeedError):
+    """Raised for a cursor from before the pruned part of the log."""
+    pass
+
+
+def missing_triggers(connection):
+    """The names of the change log triggers missing from a database."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            expected = SQLITE_TRIGGERS
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        elif connection.vendor == 'postgresql':
+            expected = POSTGRES_TRIGGERS
+            cursor.execute('SELECT tgname FROM pg_trigger WHERE NOT tgisinternal')
+        else:
+            return []
+        existing = {name for name, in cursor.fetchall()}
+    return sorted(set(expected) - existing)
+
+
+def install_triggers(connection):
+    """
+    Creates the change log triggers missing from a database, for instance
+    after a migration remade the job or company table on SQLite.
+
+    Returns:
+        list: The names of the triggers created.
+    """
+    missing = missing_triggers(connection)
+    if not missing:
+        return []
+    logger.warning('Change log triggers %s were missing and are created again', ', '.join(missing))
+    triggers = SQLITE_TRIGGERS if connection.vendor == 'sqlite' else POSTGRES_TRIGGERS
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_FUNCTION)
+        for name in missing:
+            cursor.execute(triggers[name])
+    return missing
+
+
+def encode_cursor(position):
+    return urlsafe_b64encode(json.dumps(list(position)).encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        position = json.loads(urlsafe_b64decode(cursor.encode('ascii')).decode('ascii'))
+        if len(position) != 2 or not all(isinstance(value, int) for value in position):
+            raise ValueError
+    except (TypeError, ValueError, UnicodeError):
+        raise ChangeFeedError('Invalid cursor.')
+    return tuple(position)
+
+
+def visible(queryset):
+    """Leaves out the changes that transactions still running could precede."""
+    if connection.vendor == 'postgresql':
+        return queryset.filter(transaction_id__lt=RawSQL('pg_snapshot_xmin(pg_current_snapshot())::text::bigint', ()))
+    return queryset
+
+
+def head():
+    """The cursor of the latest change, the feed starts after it."""
+    position = visible(Change.objects.order_by('-transaction_id', '-id')).values_list('transaction_id', 'id').first()
+    return encode_cursor(position or (0, 0))
+
+
+def page(cursor=None, models=None, limit=PAGE_SIZE, request=None):
+    """
+    Returns the changes after a cursor, as `{'results', 'next_cursor',
+    'has_more'}`. A result is `{'model', 'id', 'action', 'changed_at',
+    'data'}`, with the action `created`, `updated` or `deleted` and the data
+    of the row as its endpoint serializes it, None when deleted.
+
+    Args:
+        cursor (str, optional): The `next_cursor` of the previous page, or
+            the head cursor; from the start of the log otherwise.
+        models (list, optional): `job` and/or `company`, both by default.
+        limit (int, optional): Changes read, the entries are fewer when a
+            row changed more than once.
+        request (Request, optional): For the absolute URLs in the data.
+
+    Raises:
+        ChangeFeedError: For an invalid cursor or parameters.
+        CursorExpiredError: For a cursor from before the pruned log.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    models = models or list(SOURCES)
+    if any(model not in SOURCES for model in models):
+        raise ChangeFeedError(f'Expected models among {", ".join(SOURCES)}.')
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ChangeFeedError(f'The limit must be more than 0 and at most {MAX_PAGE_SIZE}.')
+    pruned = Change.objects.filter(action='pruned').values_list('transaction_id', 'id').first()
+    if pruned is not None and (position is None or position < pruned):
+        raise CursorExpiredError('The cursor is from before the pruned changes, resync and start from the head cursor.')
+
+    changes = Change.objects.filter(model__in=models).exclude(action='pruned')
+    if position is not None:
+        changes = changes.filter(KeysetPagination.after(ORDERING, position))
+    rows = list(
+        visible(changes).order_by('transaction_id', 'id')
+        .values_list('transaction_id', 'id', 'model', 'object_id', 'action', 'changed_at')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # The last change of every row, in the order of those last changes
+    latest, created = {}, set()
+    for _, _, model, object_id, action, changed_at in rows:
+        key = (model, object_id)
+        latest.pop(key, None)
+        latest[key] = changed_at
+        if action == 'created':
+            created.add(key)
+    current = {}
+    for model in models:
+        ids = [object_id for kind, object_id in latest if kind == model]
+        if not ids:
+            continue
+        source, serializer_class = SOURCES[model]
+        select, prefetch = relation_lookups(serializer_class)
+        instances = source.objects.filter(id__in=ids).select_related(*select).prefetch_related(*prefetch)
+        for data in serializer_class(instances, many=True, context={'request': request}).data:
+            current[model, data['id']] = data
+
+    results = []
+    for key, changed_at in latest.items():
+        data = current.get(key)
+        action = 'deleted' if data is None else 'created' if key in created else 'updated'
+        results.append({'model': key[0], 'id': key[1], 'action': action, 'changed_at': changed_at, 'data': data})
+    next_position = rows[-1][:2] if rows else position or (0, 0)
+    return {'results': results, 'next_cursor': encode_cursor(next_position), 'has_more': has_more}
+
+
+def prune(before):
+    """
+    Deletes the changes made before a moment, keeping the last of them as
+    the marker of the pruned log.
+
+    Returns:
+        int: The number of changes deleted.
+    """
+    with transaction.atomic():
+        boundary = (
+            Change.objects.filter(changed_at__lt=before).order_by('-transaction_id', '-id')
+            .values_list('transaction_id', 'id').first()
+        )
+        if boundary is None:
+            return 0
+        deleted, _ = Change.objects.filter(KeysetPagination.after(
+            [('transaction_id', True), ('id', True)], boundary,
+        )).delete()
+        Change.objects.filter(id=boundary[1]).update(action='pruned')
+    return deleted
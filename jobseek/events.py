@@ -0,0 +1,41 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import send_mail
+
+from . import thumbnails
+from .models import Application, CustomUser
+from .tasks import task
+
+# Work triggered by API events, run by the background workers
+
+
+@task(queue='notifications')
+def application_created(application_id):
+    application = Application.objects.select_related('job', 'company').filter(pk=application_id).first()
+    if application is None:
+        return  # Withdrawn before the task ran
+    send_mail(
+        f'Application received: {application.job.title}',
+        f'Hi {application.applicant_name},\n\n'
+        f'{application.company.name} has received your application for {application.job.title}.',
+        settings.DEFAULT_FROM_EMAIL,
+        [application.applicant_email],
+    )
+
+
+@task(queue='notifications')
+def user_registered(user_id):
+    user = CustomUser.objects.filter(pk=user_id).first()
+    if user is None or not user.email:
+        return
+    send_mail(
+        'Welcome to Jobseeker',
+        f'Hi {user.username},\n\nYour account is ready.',
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+
+
+@task(queue='thumbnails')
+def render_image_derivatives(model, pk, field, digest_field, scopes=()):
+    thumbnails.generate(apps.get_model(model), pk, field, digest_field, scopes)
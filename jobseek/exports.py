@@ -0,0 +1,238 @@
+"""
+Jobs and applications streamed as NDJSON or CSV, optionally gzip
+compressed as they are written, for the export endpoints and `manage.py
+export`. Like the wallet statements, rows are read in keyset batches over
+`(created_at, id)` and written as they are read: memory holds one batch and
+one output buffer whatever the number of rows, and no cursor stays open
+while a slow client downloads.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from wallet.statements import Echo
+
+from .models import Application, Job, JobSkill
+from .pagination import KeysetPagination
+
+ORDERING = [('created_at', False), ('id', False)]
+
+# Bytes gathered before they are handed to the response or the file
+BUFFER_SIZE = 64 * 1024
+
+BATCH_SIZE = 2000
+
+
+class ExportError(ValueError):
+    """Raised for export parameters that cannot be understood."""
+    pass
+
+
+def job_rows(rows):
+    skills = {}
+    for job_id, name in (
+        JobSkill.objects.filter(job_id__in=[row['id'] for row in rows]).order_by('id')
+        .values_list('job_id', 'skills__name')
+    ):
+        skills.setdefault(job_id, []).append(name)
+    for row in rows:
+        yield {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'company_id': row['company_id'],
+            'company': row['company__name'],
+            'location': row['location'],
+            'place_id': row['place_id'],
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+            'job_type': row['job_type'],
+            'experience_level': row['experience_level'],
+            'salary': row['salary'],
+            'is_active': row['is_active'],
+            'skills': skills.get(row['id'], []),
+            'created_at': row['created_at'].isoformat(),
+            'updated_at': row['updated_at'].isoformat(),
+        }
+
+
+def application_rows(rows):
+    for row in rows:
+        yield {
+            'id': row['id'],
+            'job_id': row['job_id'],
+            'job': row['job__title'],
+            'company_id': row['company_id'],
+            'company': row['company__name'],
+            'applicant_name': row['applicant_name'],
+            'applicant_email': row['applicant_email'],
+            'cover_letter': row['cover_letter'],
+            'resume': row['resume'],
+            'created_at': row['created_at'].isoformat(),
+            'updated_at': row['updated_at'].isoformat(),
+        }
+
+
+# Model, fields read, rows of a batch, lookup of the active flag
+EXPORTS = {
+    'jobs': (Job, ['id', 'title', 'description', 'company_id', 'company__name', 'location', 'place_id', 'latitude',
+                   'longitude', 'job_type', 'experience_level', 'salary', 'is_active', 'created_at', 'updated_at'],
+             job_rows, 'is_active'),
+    'applications': (Application, ['id', 'job_id', 'job__title', 'company_id', 'company__name', 'applicant_name',
+                                   'applicant_email', 'cover_letter', 'resume', 'created_at', 'updated_at'],
+                     application_rows, 'job__is_active'),
+}
+
+COLUMNS = {
+    'jobs': ['id', 'title', 'description', 'company_id', 'company', 'location', 'place_id', 'latitude', 'longitude',
+             'job_type', 'experience_level', 'salary', 'is_active', 'skills', 'created_at', 'updated_at'],
+    'applications': ['id', 'job_id', 'job', 'company_id', 'company', 'applicant_name', 'applicant_email',
+                     'cover_letter', 'resume', 'created_at', 'updated_at'],
+}
+
+
+def parse_moment(value):
+    """
+    Reads an ISO 8601 date or date and time, a date standing for its midnight.
+
+    Raises:
+        ExportError: If the value cannot be parsed.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value) if len(value) == 10 else None
+        if day is None:
+            raise ExportError(f'Expected an ISO 8601 date or date and time, got "{value}".')
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_flag(value):
+    if value not in ('true', 'false'):
+        raise ExportError(f'Expected true or false, got "{value}".')
+    return value == 'true'
+
+
+def parse_filters(params):
+    """
+    Reads the filters of an export from query parameters: `company` (id),
+    `start` (inclusive) and `end` (exclusive) creation moments, `is_active`.
+    """
+    filters = {}
+    company = params.get('company')
+    if company:
+        if not company.isdigit():
+            raise ExportError('Expected a company id.')
+        filters['company'] = int(company)
+    for name in ('start', 'end'):
+        if params.get(name):
+            filters[name] = parse_moment(params[name])
+    if params.get('is_active'):
+        filters['is_active'] = parse_flag(params['is_active'])
+    return filters
+
+
+def filtered(name, company=None, start=None, end=None, is_active=None):
+    """The rows of an export, with the active flag of their job for applications."""
+    model, _, _, active_lookup = EXPORTS[name]
+    queryset = model.objects.all()
+    if company is not None:
+        queryset = queryset.filter(company_id=company)
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    if is_active is not None:
+        queryset = queryset.filter(**{active_lookup: is_active})
+    return queryset
+
+
+def iter_rows(name, queryset, batch_size=BATCH_SIZE):
+    """
+    Yields the export rows of a queryset, oldest first.
+
+    Each batch is its own query positioned after the last row of the
+    previous one.
+    """
+    _, fields, convert, _ = EXPORTS[name]
+    queryset = queryset.order_by('created_at', 'id').values(*fields)
+    position = None
+    while True:
+        batch = queryset
+        if position is not None:
+            batch = batch.filter(KeysetPagination.after(ORDERING, position))
+        rows = list(batch[:batch_size])
+        yield from convert(rows)
+        if len(rows) < batch_size:
+            return
+        position = [rows[-1]['created_at'], rows[-1]['id']]
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([
+            '|'.join(value) if isinstance(value, list) else '' if value is None else value
+            for value in (row[column] for column in columns)
+        ])
+
+
+def ndjson_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
+
+
+def encode(lines, compress=False):
+    """
+    Joins lines into chunks of about BUFFER_SIZE bytes, gzip compressed as
+    they are written when asked.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def stream(name, queryset, output='ndjson', compress=False, batch_size=BATCH_SIZE):
+    """
+    Returns the byte chunks of an export, its content type and file name.
+
+    Args:
+        name (str): `jobs` or `applications`.
+        queryset (QuerySet): The rows exported, see `filtered`.
+        output (str, optional): `ndjson` or `csv`.
+        compress (bool, optional): Gzip the output.
+    """
+    if output not in FORMATS:
+        raise ExportError(f'Expected output to be one of {", ".join(FORMATS)}.')
+    write, content_type = FORMATS[output]
+    chunks = encode(write(iter_rows(name, queryset, batch_size), COLUMNS[name]), compress)
+    if compress:
+        return chunks, 'application/gzip', f'{name}.{output}.gz'
+    return chunks, content_type, f'{name}.{output}'
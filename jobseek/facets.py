@@ -0,0 +1,139 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import EXPERIENCE_LEVEL_CHOICES, JOB_TYPE_CHOICES, FacetCount, Job, JobSkill, Skill
+
+CACHE_KEY = 'jobseek:facets'
+CACHE_TIMEOUT = 60 * 60
+
+CHOICE_FACETS = {
+    'job_type': JOB_TYPE_CHOICES,
+    'experience_level': EXPERIENCE_LEVEL_CHOICES,
+}
+
+
+def job_facets(job, skill_ids=()):
+    """
+    Returns the `(facet, value)` pairs a job contributes to the counts. Only
+    active jobs are counted.
+
+    Args:
+        job: A Job, or any object with its facet attributes.
+        skill_ids (iterable, optional): Skill ids of the job to include.
+
+    Returns:
+        list: The facet pairs, values as strings.
+    """
+    if not job.is_active:
+        return []
+    pairs = [
+        ('job_type', str(job.job_type)),
+        ('experience_level', str(job.experience_level)),
+        ('location', job.location),
+    ]
+    pairs.extend(('skill', str(skill_id)) for skill_id in skill_ids)
+    return pairs
+
+
+def apply_changes(added=(), removed=()):
+    """
+    Adds one to the count of every pair in `added` and removes one for every
+    pair in `removed`, with atomic `count = count + delta` updates.
+    """
+    deltas = Counter(added)
+    deltas.subtract(removed)
+    deltas = {pair: delta for pair, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for (facet, value), delta in deltas.items():
+            counts = FacetCount.objects.filter(facet=facet, value=value)
+            if not counts.update(count=F('count') + delta):
+                FacetCount.objects.get_or_create(facet=facet, value=value)
+                counts.update(count=F('count') + delta)
+        transaction.on_commit(invalidate)
+    invalidate()
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
+
+
+def is_active_job(job_id):
+    return Job.objects.filter(pk=job_id, is_active=True).exists()
+
+
+def rebuild():
+    """
+    Recomputes every count from the job tables, to fill the store after bulk
+    loads that bypass the signals.
+    """
+    rows = []
+    active = Job.objects.filter(is_active=True).order_by()
+    for facet in ('job_type', 'experience_level', 'location'):
+        for row in active.values(facet).annotate(count=Count('id')):
+            rows.append(FacetCount(facet=facet, value=str(row[facet]), count=row['count']))
+    skills = JobSkill.objects.filter(job__is_active=True).order_by().values('skills_id').annotate(count=Count('id'))
+    rows.extend(FacetCount(facet='skill', value=str(row['skills_id']), count=row['count']) for row in skills)
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(rows, batch_size=1000)
+        transaction.on_commit(invalidate)
+    return len(rows)
+
+
+def format_counts(counts):
+    """
+    Shapes `{facet: {value: count}}` for the API: the choice facets list every
+    choice, the others list the values with at least one job, largest first.
+    """
+    result = {}
+    for facet, choices in CHOICE_FACETS.items():
+        values = counts.get(facet, {})
+        result[facet] = [
+            {'value': value, 'label': label, 'count': values.get(str(value), 0)}
+            for value, label in choices
+        ]
+    locations = counts.get('location', {})
+    result['location'] = [
+        {'value': value, 'label': value, 'count': count}
+        for value, count in sorted(locations.items(), key=lambda item: (-item[1], item[0]))
+        if count > 0
+    ]
+    skills = {key: count for key, count in counts.get('skill', {}).items() if count > 0}
+    names = dict(Skill.objects.filter(id__in=list(skills)).values_list('id', 'name')) if skills else {}
+    result['skill'] = [
+        {'value': int(value), 'label': names.get(int(value), ''), 'count': count}
+        for value, count in sorted(skills.items(), key=lambda item: (-item[1], int(item[0])))
+    ]
+    return result
+
+
+def stored_counts():
+    """Returns the API counts for all active jobs, cached until the next change."""
+    result = cache.get(CACHE_KEY)
+    if result is None:
+        counts = {}
+        for facet, value, count in FacetCount.objects.values_list('facet', 'value', 'count'):
+            counts.setdefault(facet, {})[value] = count
+        result = format_counts(counts)
+        cache.set(CACHE_KEY, result, CACHE_TIMEOUT)
+    return result
+
+
+def queryset_counts(queryset):
+    """Returns the API counts restricted to the active jobs of a queryset."""
+    # Group the queryset itself rather than nesting it, the search backends
+    # may join tables that have to stay in the outer query
+    jobs = queryset.filter(is_active=True).order_by()
+    counts = {}
+    for facet in ('job_type', 'experience_level', 'location'):
+        counts[facet] = {str(row[facet]): row['count'] for row in jobs.values(facet).annotate(count=Count('id'))}
+    skills = jobs.values('jobskill__skills_id').annotate(count=Count('id'))
+    counts['skill'] = {
+        str(row['jobskill__skills_id']): row['count'] for row in skills if row['jobskill__skills_id'] is not None
+    }
+    return format_counts(counts)
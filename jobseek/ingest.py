@@ -0,0 +1,142 @@
+from functools import partial
+from itertools import islice
+
+from django.db import transaction
+
+from . import caching, facets, places, salaries, search
+from .models import Company, Job, JobSkill, Skill
+from .serializers import BulkJobSerializer
+from .skill_index import skill_index
+
+
+class JobIngestor:
+    """
+    Writes jobs given with inline company and skill names using a handful of
+    bulk queries per batch, each batch in its own transaction.
+
+    Companies and skills are matched by exact name and created when missing.
+    The name to id maps are kept across batches, so memory grows with the
+    number of distinct names, not with the number of items.
+
+    Rows written with bulk_create do not send signals, so each batch also
+    updates the search documents, facet counts, skill index and response
+    cache itself.
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.company_ids = {}
+        self.skill_ids = {}
+
+    def ingest(self, items, start=0):
+        """
+        Ingests an iterable of job dicts batch by batch.
+
+        Args:
+            items (iterable): The raw job dicts, consumed lazily.
+            start (int, optional): Index of the first item in the results.
+
+        Yields:
+            dict: `{'index': i, 'id': job_id}` for every created job and
+            `{'index': i, 'errors': {...}}` for every rejected item.
+        """
+        items = iter(items)
+        index = start
+        while True:
+            batch = list(islice(items, self.batch_size))
+            if not batch:
+                return
+            yield from self.ingest_batch(batch, index)
+            index += len(batch)
+
+    def ingest_batch(self, items, start=0):
+        results, valid = [], []
+        for index, item in enumerate(items, start):
+            serializer = BulkJobSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results.append({'index': index, 'errors': serializer.errors})
+        if valid:
+            try:
+                with transaction.atomic():
+                    results.extend(self.write(valid))
+            except Exception:
+                # Ids of rows created by the rolled back batch are now invalid
+                self.company_ids.clear()
+                self.skill_ids.clear()
+                raise
+        return sorted(results, key=lambda result: result['index'])
+
+    def write(self, valid):
+        new_skills = self.resolve_names(
+            Skill, self.skill_ids, {name: {} for _, data in valid for name in data['skills']}
+        )
+        self.resolve_names(
+            Company, self.company_ids,
+            {data['company']: {'location': data['location'], 'description': '',
+                               **places.location_fields(data['location'])} for _, data in valid},
+        )
+
+        # bulk_create skips the pre_save signal resolving the places
+        jobs = Job.objects.bulk_create([
+            Job(company_id=self.company_ids[data['company']], **places.location_fields(data['location']),
+                **{key: value for key, value in data.items() if key not in ('company', 'skills')})
+            for _, data in valid
+        ])
+        job_skills = JobSkill.objects.bulk_create([
+            JobSkill(job_id=job.id, skills_id=skill_id)
+            for job, (_, data) in zip(jobs, valid)
+            for skill_id in {self.skill_ids[name] for name in data['skills']}
+        ])
+
+        self.update_derived(jobs, job_skills, new_skills)
+        return [{'index': index, 'id': job.id} for job, (index, _) in zip(jobs, valid)]
+
+    @staticmethod
+    def resolve_names(model, ids, wanted):
+        """
+        Fills `ids` with the id of every wanted name, creating the missing rows.
+
+        Args:
+            model: Company or Skill.
+            ids (dict): Known name to id map, updated in place.
+            wanted (dict): Name to field defaults for the rows to create.
+
+        Returns:
+            dict: Names of the created rows by id.
+        """
+        missing = [name for name in wanted if name not in ids]
+        if not missing:
+            return {}
+        for pk, name in model.objects.filter(name__in=missing).order_by('-id').values_list('id', 'name'):
+            ids[name] = pk  # The oldest row wins on duplicate names
+        created = model.objects.bulk_create([
+            model(name=name, **wanted[name]) for name in missing if name not in ids
+        ])
+        for row in created:
+            ids[row.name] = row.id
+        return {row.id: row.name for row in created}
+
+    @staticmethod
+    def update_derived(jobs, job_skills, new_skills):
+        job_ids = [job.id for job in jobs]
+        search.refresh_documents(job_ids)
+
+        skills_by_job = {}
+        for job_skill in job_skills:
+            skills_by_job.setdefault(job_skill.job_id, []).append(job_skill.skills_id)
+        added, salaries_added = [], []
+        for job in jobs:
+            added.extend(facets.job_facets(job, skills_by_job.get(job.id, ())))
+            salaries_added.extend(salaries.job_entries(job, skills_by_job.get(job.id, ())))
+        facets.apply_changes(added=added)
+        salaries.apply_changes(added=salaries_added)
+
+        transaction.on_commit(partial(
+            skill_index.add_jobs,
+            [job.id for job in jobs if job.is_active],
+            [(job_skill.job_id, job_skill.skills_id) for job_skill in job_skills],
+            new_skills,
+        ))
+        caching.invalidate('job', 'company')
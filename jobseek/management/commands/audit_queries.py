@@ -0,0 +1,119 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations import AddIndex, Migration
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.db.models import Count
+
+from jobseek import query_plans
+from jobseek.models import Application, CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Calls the read endpoints of every viewset, explains the SQL they run against the current '
+        'data, flags full table scans, sorts and nested loops over scans, and proposes the indexes '
+        'that fix them with the plan costs before and after. Run it against seeded data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', nargs='+', help='Only the endpoints whose URL name contains one of these')
+        parser.add_argument('--min-rows', type=int, default=1000, help='Smaller tables are not flagged')
+        parser.add_argument('--plans', action='store_true', help='Print the plan of every flagged statement')
+        parser.add_argument('--write', action='store_true',
+                            help='Write a migration per app with the indexes that improve the plans')
+
+    def handle(self, *args, **options):
+        user = self.audit_user()
+        endpoints, statements = query_plans.capture(user, options['endpoint'])
+        if not endpoints:
+            raise CommandError('No endpoint to audit.')
+        self.stdout.write(f'As {user.username}, on {connection.vendor}:')
+        for name, path, outcome, queries in endpoints:
+            self.stdout.write(f'  {name} {path}: {outcome}, {queries} queries')
+
+        explainer = query_plans.Explainer(options['min_rows'])
+        flagged = []
+        for statement in statements:
+            statement.plan = explainer.explain(statement.sql)
+            if statement.plan.findings:
+                flagged.append(statement)
+        self.stdout.write(f'\n{len(statements)} distinct statements, {len(flagged)} flagged')
+        for statement in flagged:
+            kinds = Counter(finding.kind for finding in statement.plan.findings)
+            self.stdout.write(self.style.WARNING(
+                f'\n{", ".join(sorted(statement.endpoints))}: '
+                f'{", ".join(f"{count} {kind}" for kind, count in kinds.items())}, cost {statement.plan.cost}'
+            ))
+            self.stdout.write(f'  {statement.sql[:300]}{"..." if len(statement.sql) > 300 else ""}')
+            for finding in statement.plan.findings:
+                self.stdout.write(f'  - {finding.kind} on {finding.table or "?"}: {finding.detail}')
+            if options['plans']:
+                self.stdout.write('\n'.join(f'    {line}' for line in statement.plan.lines))
+
+        recommendations = query_plans.recommend(flagged, explainer)
+        useful = [recommendation for recommendation in recommendations if recommendation.useful]
+        self.stdout.write(f'\n{len(useful)} indexes recommended')
+        for recommendation in recommendations:
+            line = (
+                f'{recommendation.model._meta.label} {self.describe(recommendation.index)}: '
+                f'cost {recommendation.before:.2f} -> {recommendation.after:.2f}, '
+                f'{recommendation.resolved} findings resolved, for '
+                f'{", ".join(sorted(set().union(*(statement.endpoints for statement in recommendation.statements))))}'
+            )
+            self.stdout.write(self.style.SUCCESS(line) if recommendation.useful else f'{line} (not worth it)')
+
+        if options['write'] and useful:
+            self.write_migrations(useful)
+
+    @staticmethod
+    def audit_user():
+        """
+        A staff user with the most applications, so the per-user endpoints
+        read as much as they can. It is not saved.
+        """
+        email = (
+            Application.objects.values('applicant_email').annotate(count=Count('id')).order_by('-count')
+            .values_list('applicant_email', flat=True).first()
+        )
+        user = CustomUser.objects.filter(email=email).first() if email else None
+        user = user or CustomUser.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('No users, load some data first.')
+        user.is_staff = user.is_superuser = True
+        return user
+
+    @staticmethod
+    def describe(index):
+        if index.fields:
+            return f'models.Index(fields={list(index.fields)!r}, name={index.name!r})'
+        return f'{type(index).__name__}({", ".join(map(str, index.expressions))}, name={index.name!r})'
+
+    def write_migrations(self, recommendations):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        by_app = {}
+        for recommendation in recommendations:
+            by_app.setdefault(recommendation.model._meta.app_label, []).append(recommendation)
+        for app_label, app_recommendations in by_app.items():
+            leaves = loader.graph.leaf_nodes(app_label)
+            number = max((MigrationAutodetector.parse_number(name) or 0 for _, name in leaves), default=0) + 1
+            migration = Migration(f'{number:04d}_query_plan_indexes', app_label)
+            migration.dependencies = leaves
+            if any(recommendation.trigram for recommendation in app_recommendations):
+                from django.contrib.postgres.operations import TrigramExtension
+                migration.operations.append(TrigramExtension())
+            migration.operations += [
+                AddIndex(recommendation.model._meta.model_name, recommendation.index)
+                for recommendation in app_recommendations
+            ]
+            writer = MigrationWriter(migration)
+            with open(writer.path, 'w') as output:
+                output.write(writer.as_string())
+            self.stdout.write(self.style.SUCCESS(f'Wrote {writer.path}'))
+            for recommendation in app_recommendations:
+                self.stdout.write(
+                    f'  add {self.describe(recommendation.index)} to {recommendation.model.__name__}.Meta.indexes'
+                )
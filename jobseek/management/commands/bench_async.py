@@ -0,0 +1,91 @@
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobseek.models import Job
+
+SERVERS = {
+    'wsgi': [sys.executable, '-m', 'gunicorn', 'baseconfig.wsgi:application', '--log-level', 'warning'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'baseconfig.asgi:application', '--log-level', 'warning'],
+}
+PREFIXES = {'wsgi': '', 'asgi': '/async'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts the sync views under gunicorn and the async views under uvicorn against the '
+        'configured database and compares throughput and latency under concurrent load.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Server processes per deployment')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per deployment and path')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--paths', nargs='+', default=['/job/', '/job/search/?q=engineer'])
+
+    def handle(self, *args, **options):
+        if not Job.objects.exists():
+            raise CommandError('No jobs to read, load some data first.')
+        job_id = Job.objects.values_list('id', flat=True).first()
+        paths = options['paths'] + [f'/job/{job_id}/']
+
+        for name, command in SERVERS.items():
+            port = options['port']
+            server = subprocess.Popen(
+                command + ['--workers', str(options['workers']),
+                           *(['--bind', f'127.0.0.1:{port}'] if name == 'wsgi' else ['--port', str(port)])]
+            )
+            try:
+                base = f'http://127.0.0.1:{port}{PREFIXES[name]}'
+                self.wait_until_up(base + paths[0])
+                for path in paths:
+                    self.report(name, path, self.run(base + path, options['requests'], options['concurrency']))
+            finally:
+                server.terminate()
+                server.wait()
+
+    @staticmethod
+    def wait_until_up(url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(url, timeout=1).read()
+                return
+            except (urllib.error.URLError, ConnectionError, TimeoutError):  # Workers may still be booting
+                time.sleep(0.2)
+        raise CommandError(f'Server did not answer {url} within {timeout}s')
+
+    @staticmethod
+    def run(url, count, concurrency):
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                    ok = response.status == 200
+            except (urllib.error.URLError, ConnectionError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(fetch, range(count)))
+        return time.perf_counter() - started, results
+
+    def report(self, name, path, outcome):
+        elapsed, results = outcome
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'{name} {path}: {len(results) / elapsed:.0f} req/s, '
+            f'p50 {percentiles[49] * 1000:.1f}ms, p95 {percentiles[94] * 1000:.1f}ms, '
+            f'p99 {percentiles[98] * 1000:.1f}ms, {errors} errors'
+        )
@@ -0,0 +1,93 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as DefaultRefreshSerializer
+
+from jobseek import authentication
+from jobseek.models import CustomUser
+
+MODES = {
+    'database': (JWTAuthentication, DefaultRefreshSerializer),
+    'claims': (authentication.ClaimsJWTAuthentication, authentication.TokenRefreshSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the simplejwt authentication reading the user row on every request with the '
+        'claims based one: authentications per second, authenticated requests per second and '
+        'queries per request on a few endpoints, and refresh token rotations. Runs in process '
+        'against the configured database; the user it creates is deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and mode')
+        parser.add_argument('--rotations', type=int, default=200, help='Refresh token rotations per mode')
+        parser.add_argument('--paths', nargs='+', default=['/application/get_by_user/', '/user/get_current_user/',
+                                                            '/wallet/transactions/'])
+
+    def handle(self, *args, **options):
+        number = random.Random().randrange(10**8)
+        user = CustomUser.objects.create_user(
+            username=f'bench-auth-{number}', email=f'bench-auth-{number}@example.com', password='bench-auth',
+            phone_number=f'060{number:08d}',
+        )
+        try:
+            refresh = authentication.TokenObtainPairSerializer.get_token(user)
+            header = f'Bearer {refresh.access_token}'
+            factory = APIRequestFactory(SERVER_NAME='localhost')
+            for mode, (authentication_class, _) in MODES.items():
+                self.authenticate(mode, authentication_class, factory, header, options['requests'] * 5)
+            for path in options['paths']:
+                for mode, (authentication_class, _) in MODES.items():
+                    self.request(mode, authentication_class, factory, header, path, options['requests'])
+            for mode, (_, serializer_class) in MODES.items():
+                self.rotate(mode, serializer_class, str(authentication.TokenObtainPairSerializer.get_token(user)),
+                            options['rotations'])
+        finally:
+            user.delete()
+
+    def measure(self, label, count, call):
+        call()  # Warms up the caches, like a client with more than one request
+        with CaptureQueriesContext(connection) as queries:
+            call()
+        started = time.perf_counter()
+        for _ in range(count):
+            call()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: {count / elapsed:.0f}/s, {elapsed / count * 1e6:.0f}us each, {len(queries)} queries'
+        )
+
+    def authenticate(self, mode, authentication_class, factory, header, count):
+        request = factory.get('/', HTTP_AUTHORIZATION=header)
+        backend = authentication_class()
+        self.measure(f'authenticate, {mode}', count, lambda: backend.authenticate(request))
+
+    def request(self, mode, authentication_class, factory, header, path, count):
+        match = resolve(path)
+        view = match.func.cls.as_view(match.func.actions, **dict(match.func.initkwargs,
+                                                                 authentication_classes=[authentication_class]))
+
+        def call():
+            response = view(factory.get(path, HTTP_AUTHORIZATION=header), **match.kwargs)
+            response.render()
+            assert response.status_code == 200, response.data
+
+        self.measure(f'GET {path}, {mode}', count, call)
+
+    def rotate(self, mode, serializer_class, refresh, count):
+        tokens = [refresh]
+
+        def call():
+            serializer = serializer_class(data={'refresh': tokens[-1]})
+            serializer.is_valid(raise_exception=True)
+            tokens.append(serializer.validated_data['refresh'])
+
+        self.measure(f'refresh rotation, {mode}', count, call)
@@ -0,0 +1,90 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from jobseek import exports
+from jobseek.models import CustomUser
+from jobseek.serializers import ApplicationSerializer, JobSerializer
+from jobseek.views import ApplicationViewSet, JobViewSet
+
+VIEWS = {'jobs': JobViewSet, 'applications': ApplicationViewSet}
+SERIALIZERS = {'jobs': JobSerializer, 'applications': ApplicationSerializer}
+
+
+def current_rss():
+    """Resident memory of the process in MB, sampled now rather than the peak."""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams growing numbers of rows of the configured database through the export endpoints and '
+        'reports the peak resident memory of each run, which should stay flat, with the throughput. '
+        'With --materialize, also serializes the same rows at once the way the list endpoints do, '
+        'for comparison. Sizes beyond the rows of the table are capped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000, 10_000_000])
+        parser.add_argument('--output', choices=sorted(exports.FORMATS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--materialize', action='store_true', help='Also measure serializing every row at once')
+
+    def handle(self, *args, **options):
+        admin = CustomUser.objects.filter(is_staff=True).first()
+        if options['name'] == 'applications' and admin is None:
+            raise CommandError('The applications export needs a staff user.')
+        model = exports.EXPORTS[options['name']][0]
+        ordered = model.objects.order_by('created_at', 'id')
+        total = ordered.count()
+        view = VIEWS[options['name']].as_view({'get': 'export'})
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+
+        for rows in sorted(options['rows']):
+            rows = min(rows, total)
+            if not rows:
+                raise CommandError('No rows to export.')
+            # The first row left out bounds the export, the end is exclusive
+            end = ordered.values_list('created_at', flat=True)[rows] if rows < total else None
+            params = {'output': options['output'], **({'end': end.isoformat()} if end else {})}
+            if options['gzip']:
+                params['compress'] = 'gzip'
+            request = factory.get(f'/{options["name"]}/export/', params)
+            if admin is not None:
+                force_authenticate(request, user=admin)
+
+            baseline = peak = current_rss()
+            started = time.perf_counter()
+            response = view(request)
+            written = chunks = 0
+            for chunk in response.streaming_content:
+                written += len(chunk)
+                chunks += 1
+                if chunks % 16 == 0:
+                    peak = max(peak, current_rss())
+            elapsed = time.perf_counter() - started
+            peak = max(peak, current_rss())
+            self.stdout.write(
+                f'{rows} rows: streamed {written / 2 ** 20:.1f}MB in {elapsed:.1f}s '
+                f'({rows / elapsed:.0f} rows/s), peak RSS {peak:.0f}MB (+{peak - baseline:.1f}MB)'
+            )
+
+            if options['materialize']:
+                baseline = current_rss()
+                started = time.perf_counter()
+                instances = list(ordered.filter(created_at__lt=end) if end else ordered)
+                body = json.dumps(SERIALIZERS[options['name']](instances, many=True).data)
+                peak = current_rss()
+                del instances, body
+                self.stdout.write(
+                    f'{rows} rows serialized at once: {time.perf_counter() - started:.1f}s, '
+                    f'peak RSS {peak:.0f}MB (+{peak - baseline:.1f}MB)'
+                )
+            if rows == total:
+                break
+
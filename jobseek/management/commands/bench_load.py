@@ -0,0 +1,250 @@
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from jobseek.models import Company, CustomUser, Job, Skill
+from wallet.models import Wallet
+
+from .bench_async import SERVERS, Command as AsyncBench
+
+# Relative weight of each scenario in the default mix
+MIX = {'job_search': 4, 'job_list': 2, 'company_list': 1, 'get_by_user': 2, 'transfer': 1}
+
+QUERIES = ['engineer', 'developer', 'python', 'data analyst', 'remote', 'senior', 'sales', 'designer']
+
+
+def git_commit():
+    try:
+        head = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return f'{head}-dirty' if dirty else head
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentiles[49] * 1000, 1),
+        'p95_ms': round(percentiles[94] * 1000, 1),
+        'p99_ms': round(percentiles[98] * 1000, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives a weighted mix of job search, list, applications of a user and wallet transfer '
+        'requests at a given concurrency against a local server, reports throughput and p50/p95/p99 '
+        'latency per scenario, and appends the results to a JSON lines file, comparing them with '
+        'the previous run of the same settings. Load data with the seed command first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server; by default gunicorn is started')
+        parser.add_argument('--workers', type=int, default=2, help='Gunicorn processes when starting one')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests in total')
+        parser.add_argument('--mix', nargs='+', metavar='SCENARIO=WEIGHT',
+                            help=f'Scenario weights, default {" ".join(f"{k}={v}" for k, v in MIX.items())}')
+        parser.add_argument('--users', type=int, default=100, help='Users the authenticated requests come from')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'load.jsonl'),
+                            help='JSON lines file the results are appended to')
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help='Percent of p95 or throughput change reported as a regression')
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        generator = random.Random(options['seed'])
+        scenarios = self.build_scenarios(mix, options['users'], generator)
+        names, weights = zip(*((name, mix[name]) for name in scenarios))
+        plan = generator.choices(names, weights, k=options['requests'])
+
+        server = None
+        base = options['url']
+        if base is None:
+            base = f'http://127.0.0.1:{options["port"]}'
+            server = subprocess.Popen(SERVERS['wsgi'] + [
+                '--workers', str(options['workers']), '--bind', f'127.0.0.1:{options["port"]}',
+            ])
+        try:
+            AsyncBench.wait_until_up(base + '/job/')
+            elapsed, results = self.run(base.rstrip('/'), plan, scenarios, options['concurrency'], generator)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        stats = {}
+        for name in names:
+            outcomes = [(latency, ok) for scenario, latency, ok in results if scenario == name]
+            if outcomes:
+                stats[name] = summarize([latency for latency, _ in outcomes],
+                                        sum(1 for _, ok in outcomes if not ok), elapsed)
+        stats['all'] = summarize([latency for _, latency, _ in results],
+                                 sum(1 for _, _, ok in results if not ok), elapsed)
+
+        record = {
+            'commit': git_commit(),
+            'at': timezone.now().isoformat(timespec='seconds'),
+            'settings': {
+                'server': 'external' if options['url'] else f'gunicorn:{options["workers"]}',
+                'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'mix': mix,
+            },
+            'data': {'jobs': Job.objects.count(), 'companies': Company.objects.count(),
+                     'users': CustomUser.objects.count()},
+            'results': stats,
+        }
+        previous = self.previous(options['output'], record['settings'])
+        self.report(stats, previous, options['threshold'])
+        os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+        with open(options['output'], 'a') as output:
+            output.write(json.dumps(record) + '\n')
+        self.stdout.write(f'Results appended to {options["output"]}')
+
+    @staticmethod
+    def parse_mix(items):
+        if not items:
+            return dict(MIX)
+        mix = {}
+        for item in items:
+            name, _, weight = item.partition('=')
+            if name not in MIX:
+                raise CommandError(f'Unknown scenario {name}, expected one of {", ".join(MIX)}')
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'Expected a number as the weight of {name}')
+        return mix
+
+    def build_scenarios(self, mix, user_count, generator):
+        """
+        Returns a function per scenario drawing a `(method, path, body,
+        token)` request. Authenticated requests use access tokens minted here
+        for users with a wallet, valid for the length of a run.
+        """
+        if not Job.objects.exists():
+            raise CommandError('No jobs to read, run the seed command first.')
+        skills = list(Skill.objects.values_list('name', flat=True)[:50]) or ['Python']
+        users = list(
+            CustomUser.objects.filter(userwallet__isnull=False, walletaddress__isnull=False)
+            .order_by('id').values_list('id', flat=True).distinct()[:user_count]
+        ) if {'get_by_user', 'transfer'} & set(mix) else []
+        if {'get_by_user', 'transfer'} & set(mix) and len(users) < 2:
+            raise CommandError('Authenticated scenarios need at least two users with a wallet.')
+        tokens = {}
+        for user in CustomUser.objects.filter(pk__in=users):
+            token = AccessToken.for_user(user)
+            token.set_exp(lifetime=timedelta(hours=1))
+            tokens[user.pk] = str(token)
+        funded = list(
+            Wallet.objects.filter(userwallet__user__in=users, balance__gte=1).values_list('userwallet__user', flat=True)
+        )
+        if 'transfer' in mix and not funded:
+            raise CommandError('The transfer scenario needs users with money in their wallet.')
+
+        def job_search():
+            query = generator.choice(QUERIES)
+            if generator.random() < 0.3:
+                return 'GET', f'/job/search/?skill={urllib.request.quote(generator.choice(skills))}', None, None
+            return 'GET', f'/job/search/?q={urllib.request.quote(query)}', None, None
+
+        def get_by_user():
+            return 'GET', '/application/get_by_user/', None, tokens[generator.choice(users)]
+
+        def transfer():
+            sender = generator.choice(funded)
+            recipient = generator.choice([user for user in users[:10] if user != sender])
+            body = {'recipient': recipient, 'amount': '0.01', 'description': 'Load test'}
+            return 'POST', '/wallet/wallet/transfer/', body, tokens[sender]
+
+        scenarios = {
+            'job_search': job_search,
+            'job_list': lambda: ('GET', '/job/', None, None),
+            'company_list': lambda: ('GET', '/company/', None, None),
+            'get_by_user': get_by_user,
+            'transfer': transfer,
+        }
+        return {name: scenarios[name] for name in mix if mix[name] > 0}
+
+    @staticmethod
+    def run(base, plan, scenarios, concurrency, generator):
+        # Requests are drawn up front so the generator is not shared by the threads
+        requests = [(name, *scenarios[name]()) for name in plan]
+
+        def fetch(request):
+            name, method, path, body, token = request
+            headers = {'Accept': 'application/json'}
+            if token:
+                headers['Authorization'] = f'Bearer {token}'
+            data = None
+            if body is not None:
+                data = json.dumps(body).encode()
+                headers['Content-Type'] = 'application/json'
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(base + path, data, headers, method=method),
+                                            timeout=60) as response:
+                    response.read()
+                    ok = response.status < 400
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                ok = False
+            return name, time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(fetch, requests))
+        return time.perf_counter() - started, results
+
+    @staticmethod
+    def previous(path, run_settings):
+        """The last stored run with the same settings, None if there is none."""
+        try:
+            with open(path) as lines:
+                records = [json.loads(line) for line in lines if line.strip()]
+        except FileNotFoundError:
+            return None
+        matching = [record for record in records if record.get('settings') == run_settings]
+        return matching[-1] if matching else None
+
+    def report(self, stats, previous, threshold):
+        if previous:
+            self.stdout.write(f'Compared with {previous["commit"] or "unknown commit"} at {previous["at"]}')
+        for name, row in stats.items():
+            line = (
+                f'{name}: {row["requests"]} requests, {row["rps"]:.0f} req/s, p50 {row["p50_ms"]:.1f}ms, '
+                f'p95 {row["p95_ms"]:.1f}ms, p99 {row["p99_ms"]:.1f}ms, {row["errors"]} errors'
+            )
+            before = previous and previous['results'].get(name)
+            if not before:
+                self.stdout.write(line)
+                continue
+            p95 = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            rps = (row['rps'] - before['rps']) / before['rps'] * 100 if before['rps'] else 0.0
+            line += f' (p95 {p95:+.0f}%, req/s {rps:+.0f}%)'
+            if p95 > threshold or rps < -threshold:
+                self.stdout.write(self.style.WARNING(f'{line} REGRESSION'))
+            else:
+                self.stdout.write(line)
@@ -0,0 +1,100 @@
+import heapq
+import random
+import resource
+import statistics
+import time
+from bisect import bisect
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobseek.recommendations import SkillMatrix, profile_vector
+
+from .seed import zipf_weights
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the recommendation engine on synthetic data shaped like the seed command\'s, without '
+        'the database: the time and memory to build the job by skill matrix, the time to compute the '
+        'top jobs of a sample of users and the extrapolated batch time for all of them, and the recall '
+        'of the top jobs against scoring every job.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--skills', type=int, default=96)
+        parser.add_argument('--applications-per-job', type=int, default=3)
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMENDATIONS_TOP_K)
+        parser.add_argument('--max-skill-sets', type=int, nargs='+', default=[settings.RECOMMENDATIONS_MAX_SKILL_SETS],
+                            help='Values to compare')
+        parser.add_argument('--sample', type=int, default=1000, help='Users timed')
+        parser.add_argument('--exact', type=int, default=20, help='Users whose top jobs are checked against all jobs')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        skill_weights = zipf_weights(options['skills'], 0.9)
+        job_skills = [
+            [bisect(skill_weights, generator.random() * skill_weights[-1]) for _ in range(generator.randint(2, 8))]
+            for _ in range(options['jobs'])
+        ]
+
+        memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        matrix = SkillMatrix(enumerate(job_skills, start=1))
+        elapsed = time.perf_counter() - started
+        grown = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory) / 1024
+        self.stdout.write(
+            f'Matrix of {len(matrix)} jobs, {len(matrix.skills)} job skills, {len(matrix.signatures)} skill sets: '
+            f'built in {elapsed:.1f}s, peak memory +{grown:.0f}MB'
+        )
+
+        # Applications drawn as the seed command does: a Pareto number per job, Zipf users
+        sample = max(options['sample'], options['exact'])
+        user_weights = zipf_weights(options['users'], 0.5)
+        alpha = (options['applications_per_job'] + 1) / options['applications_per_job']
+        chosen = set(generator.sample(range(options['users']), min(sample, options['users'])))
+        applied = {user: set() for user in chosen}
+        for job_id in range(1, options['jobs'] + 1):
+            for _ in range(min(round(generator.paretovariate(alpha)) - 1, 500)):
+                user = bisect(user_weights, generator.random() * user_weights[-1])
+                if user in chosen:
+                    applied[user].add(job_id)
+        users = [(jobs, profile_vector((job_skills[job_id - 1] for job_id in jobs), matrix.weight))
+                 for jobs in applied.values() if jobs]
+        self.stdout.write(
+            f'{len(users)} sampled users with applications, '
+            f'{statistics.mean(len(profile) for _, profile in users):.1f} skills per profile on average'
+        )
+
+        exact = [self.exact(matrix, profile, options['top_k'], jobs) for jobs, profile in users[:options['exact']]]
+        for limit in options['max_skill_sets']:
+            timings = []
+            for jobs, profile in users[:options['sample']]:
+                started = time.perf_counter()
+                matrix.top(profile, options['top_k'], jobs, limit)
+                timings.append(time.perf_counter() - started)
+            recall, ratio = [], []
+            for (jobs, profile), best in zip(users, exact):
+                found = matrix.top(profile, options['top_k'], jobs, limit)
+                recall.append(len({job_id for job_id, _ in found} & {job_id for job_id, _ in best}) / len(best))
+                ratio.append(sum(score for _, score in found) / sum(score for _, score in best))
+            mean = statistics.mean(timings)
+            p95 = statistics.quantiles(timings, n=20)[18] if len(timings) > 1 else mean
+            self.stdout.write(
+                f'--max-skill-sets {limit}: {mean * 1000:.2f}ms per user (p95 {p95 * 1000:.2f}ms, '
+                f'max {max(timings) * 1000:.0f}ms), '
+                f'{mean * options["users"] / 60:.1f}min for {options["users"]} users, '
+                f'recall@{options["top_k"]} {statistics.mean(recall):.2f}, '
+                f'score {statistics.mean(ratio) * 100:.1f}% of exact'
+            )
+
+    @staticmethod
+    def exact(matrix, profile, k, exclude):
+        scored = (
+            (matrix.score(row, profile), job_id)
+            for row, job_id in enumerate(matrix.job_ids) if job_id not in exclude
+        )
+        return [(job_id, score) for score, job_id in heapq.nlargest(k, scored)]
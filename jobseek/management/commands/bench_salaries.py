@@ -0,0 +1,87 @@
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from jobseek import places, salaries
+from jobseek.models import Job, SalaryBucket
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the salary statistics read from the maintained histograms with computing them '
+        'from the job table, which sorts the salaries of the group, on the largest groups of every '
+        'facet of the configured database: latency of both and the largest relative error of the '
+        'percentiles. Run rebuild_salaries first if the jobs were loaded without the signals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=5, help='Largest groups measured per facet')
+        parser.add_argument('--repeat', type=int, default=20, help='Reads timed per group')
+        parser.add_argument('--percentiles', default='1,10,25,50,75,90,99')
+
+    def handle(self, *args, **options):
+        if not SalaryBucket.objects.exists():
+            raise CommandError('No salary histograms, run rebuild_salaries first.')
+        percentiles = salaries.parse_percentiles(options['percentiles'])
+        groups = [('all', '')]
+        for facet in salaries.FACETS:
+            groups.extend(
+                (facet, row['value']) for row in salaries.statistics(facet, percentiles=())['results'][:options['groups']]
+            )
+
+        stored, live, errors = [], [], []
+        for facet, value in groups:
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                summary = salaries.statistics(facet=facet, value=value, percentiles=percentiles)
+            stored.append((time.perf_counter() - started) / options['repeat'])
+
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                exact = self.exact(facet, value, percentiles)
+            live.append((time.perf_counter() - started) / options['repeat'])
+
+            if summary['count'] != exact['count']:
+                self.stdout.write(self.style.WARNING(
+                    f'{facet}={value}: {summary["count"]} jobs in the histograms, {exact["count"]} in the table'
+                ))
+            error = max((
+                abs(summary['percentiles'][key] - actual) / actual
+                for key, actual in exact['percentiles'].items() if actual
+            ), default=0.0)
+            errors.append(error)
+            self.stdout.write(
+                f'{facet}={value or "*"}: {exact["count"]} jobs, histograms {stored[-1] * 1000:.2f}ms, '
+                f'table {live[-1] * 1000:.2f}ms, largest percentile error {error * 100:.3f}%, '
+                f'mean {summary["mean"]:.0f} vs {exact["mean"]:.0f}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(groups)} groups: histograms {statistics.mean(stored) * 1000:.2f}ms on average '
+            f'(max {max(stored) * 1000:.2f}ms), table {statistics.mean(live) * 1000:.2f}ms '
+            f'(max {max(live) * 1000:.2f}ms); largest percentile error {max(errors) * 100:.3f}%, '
+            f'bound {settings.SALARY_ACCURACY * 100:g}%'
+        ))
+
+    @staticmethod
+    def exact(facet, value, percentiles):
+        jobs = Job.objects.filter(is_active=True)
+        if facet == 'location':
+            jobs = jobs.filter(place_id__in=places.gazetteer().within(places.gazetteer().places[value]))
+        elif facet == 'skill':
+            jobs = jobs.filter(jobskill__skills_id=int(value))
+        elif facet != 'all':
+            jobs = jobs.filter(**{facet: int(value)})
+        values = list(jobs.order_by('salary').values_list('salary', flat=True))
+        count = len(values)
+        return {
+            'count': count,
+            'mean': sum(values) / count if count else 0.0,
+            'percentiles': {
+                f'p{percentile:g}': values[max(1, math.ceil(percentile / 100 * count)) - 1] if count else None
+                for percentile in percentiles
+            },
+        }
@@ -0,0 +1,108 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from jobseek import search
+from jobseek.models import Company, Job, JobSkill, Skill
+
+SKILLS = ['Python', 'Django', 'PHP', 'Laravel', 'JavaScript', 'React', 'Go', 'Rust', 'SQL', 'Docker']
+LOCATIONS = ['Lagos', 'Abuja', 'Ikeja, Lagos State', 'Port Harcourt', 'Nairobi', 'Accra', 'Kigali', 'Remote']
+TITLES = ['Backend Engineer', 'Frontend Developer', 'Data Analyst', 'DevOps Engineer', 'Product Designer']
+WORDS = 'build maintain scalable services team product customers api data cloud mobile platform'.split()
+# Terms that appear in about 1% of the descriptions
+RARE_WORDS = ['kubernetes', 'terraform', 'graphql']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compares the full-text search index with the icontains filters on synthetic jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=20000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        # Everything runs in a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                self.populate(options['jobs'])
+                self.run(options['queries'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, count):
+        skills = Skill.objects.bulk_create(Skill(name=name) for name in SKILLS)
+        companies = Company.objects.bulk_create(
+            Company(name=f'Company {i}', location=random.choice(LOCATIONS), description='')
+            for i in range(max(count // 100, 1))
+        )
+        jobs = Job.objects.bulk_create(
+            (
+                Job(
+                    title=random.choice(TITLES),
+                    description=' '.join(
+                        random.choices(WORDS, k=30) + random.choices(RARE_WORDS, k=random.random() < 0.01)
+                    ),
+                    company=random.choice(companies),
+                    location=random.choice(LOCATIONS),
+                    job_type=random.randrange(6),
+                    experience_level=random.randrange(5),
+                    salary=random.randrange(100, 1000) * 1000,
+                )
+                for _ in range(count)
+            ),
+            batch_size=1000,
+        )
+        JobSkill.objects.bulk_create(
+            (JobSkill(job=job, skills=skill) for job in jobs for skill in random.sample(skills, 3)),
+            batch_size=1000,
+        )
+        started = time.perf_counter()
+        search.rebuild_all()
+        self.stdout.write(f'Indexed {count} jobs in {time.perf_counter() - started:.2f}s')
+
+    def run(self, queries):
+        cases = [
+            (
+                'location + skill',
+                lambda: {'location': random.choice(LOCATIONS), 'skill': random.choice(SKILLS)},
+                lambda location, skill: Job.objects.filter(
+                    location__icontains=location, jobskill__skills__name__icontains=skill
+                ),
+            ),
+            (
+                'free text, common term',
+                lambda: {'query': random.choice(WORDS)},
+                lambda query: Job.objects.filter(Q(title__icontains=query) | Q(description__icontains=query)),
+            ),
+            (
+                'free text, rare term',
+                lambda: {'query': random.choice(RARE_WORDS)},
+                lambda query: Job.objects.filter(Q(title__icontains=query) | Q(description__icontains=query)),
+            ),
+        ]
+        for name, arguments, icontains in cases:
+            timings = {'icontains': 0.0, 'search': 0.0}
+            for _ in range(queries):
+                kwargs = arguments()
+                for label, jobs in (
+                    ('icontains', icontains(**kwargs)),
+                    ('search', search.search_jobs(Job.objects.all(), **kwargs)),
+                ):
+                    started = time.perf_counter()
+                    list(jobs[:50].values_list('id', flat=True))
+                    timings[label] += time.perf_counter() - started
+            self.stdout.write(
+                f'{name}: icontains {timings["icontains"] / queries * 1000:.2f}ms, '
+                f'search {timings["search"] / queries * 1000:.2f}ms per query '
+                f'({search.get_backend().__class__.__name__})'
+            )
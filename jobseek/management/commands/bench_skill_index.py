@@ -0,0 +1,99 @@
+import random
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobseek.models import Company, Job, JobSkill, Skill
+from jobseek.skill_index import SkillBitmapIndex, iter_bits
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compares the skill bitmap index with ORM joins on synthetic job-skill rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Number of job-skill rows')
+        parser.add_argument('--skills-per-job', type=int, default=5)
+        parser.add_argument('--skills', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        # Everything runs in a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                skills = self.populate(options['rows'], options['skills_per_job'], options['skills'])
+                self.run(skills, options['queries'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, rows, per_job, skill_count):
+        started = time.perf_counter()
+        skills = Skill.objects.bulk_create(Skill(name=f'Skill {i}') for i in range(skill_count))
+        company = Company.objects.create(name='Bench', location='Lagos', description='')
+        jobs = Job.objects.bulk_create(
+            (
+                Job(title='Job', description='', company=company, location='Lagos', job_type=0,
+                    experience_level=0, salary=1, is_active=random.random() < 0.9)
+                for _ in range(rows // per_job)
+            ),
+            batch_size=5000,
+        )
+        # Skewed popularity: a few skills appear on most jobs
+        weights = [1 / (rank + 1) for rank in range(skill_count)]
+        JobSkill.objects.bulk_create(
+            (
+                JobSkill(job=job, skills=skill)
+                for job in jobs
+                for skill in set(random.choices(skills, weights=weights, k=per_job))
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(
+            f'Inserted {JobSkill.objects.count()} job-skill rows for {len(jobs)} jobs '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+        return skills
+
+    def run(self, skills, queries):
+        index = SkillBitmapIndex()
+        started = time.perf_counter()
+        index.build()
+        size = sum(sys.getsizeof(bitmap) for bitmap in index.skills.values())
+        self.stdout.write(f'Built index in {time.perf_counter() - started:.2f}s, {size / 1e6:.1f} MB of bitmaps')
+
+        popular = skills[:20]
+        timings = {'orm': 0.0, 'index': 0.0, 'index page': 0.0}
+        for _ in range(queries):
+            first, second, excluded = random.sample(popular, 3)
+            expression = f'"{first.name}" AND "{second.name}" AND NOT "{excluded.name}"'
+
+            started = time.perf_counter()
+            jobs = (
+                Job.objects.filter(is_active=True)
+                .filter(jobskill__skills=first).filter(jobskill__skills=second)
+                .exclude(jobskill__skills=excluded)
+            )
+            expected = set(jobs.values_list('id', flat=True))
+            timings['orm'] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            bitmap = index.match(expression)
+            timings['index'] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            list(iter_bits(bitmap, limit=21))
+            timings['index page'] += time.perf_counter() - started
+
+            if set(iter_bits(bitmap)) != expected:
+                self.stderr.write(f'Mismatch for {expression}')
+
+        for label, total in timings.items():
+            self.stdout.write(f'{label}: {total / queries * 1e6:.0f}us per query')
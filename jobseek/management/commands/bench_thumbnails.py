@@ -0,0 +1,61 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from jobseek.thumbnails import PREFIX, render
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff')
+
+
+class Command(BaseCommand):
+    help = (
+        'Renders the thumbnails of every image under MEDIA_ROOT serially and with process pools of '
+        'increasing size, and reports the throughput. Nothing is written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=None, help='Defaults to MEDIA_ROOT')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+        parser.add_argument('--repeat', type=int, default=1, help='Render every image this many times')
+
+    def handle(self, *args, **options):
+        root = options['root'] or settings.MEDIA_ROOT
+        paths = [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(root)
+            if not os.path.relpath(directory, root).startswith(PREFIX.rstrip('/'))
+            for name in names
+            if name.lower().endswith(EXTENSIONS)
+        ]
+        if not paths:
+            raise CommandError(f'No images under {root}')
+        sources = []
+        for path in paths * options['repeat']:
+            with open(path, 'rb') as source:
+                sources.append(source.read())
+        megabytes = sum(len(data) for data in sources) / 1e6
+        self.stdout.write(f'{len(sources)} images, {megabytes:.1f} MB under {root}')
+
+        started = time.perf_counter()
+        failed = 0
+        for data in sources:
+            try:
+                render(data)
+            except Exception:
+                failed += 1
+        self.report('serial', len(sources), failed, time.perf_counter() - started)
+
+        for workers in options['workers']:
+            with ProcessPoolExecutor(workers, mp_context=get_context('forkserver')) as pool:
+                pool.submit(len, b'').result()  # Start the workers before timing
+                started = time.perf_counter()
+                futures = [pool.submit(render, data) for data in sources]
+                failed = sum(1 for future in futures if future.exception() is not None)
+                self.report(f'{workers} workers', len(sources), failed, time.perf_counter() - started)
+
+    def report(self, label, count, failed, elapsed):
+        self.stdout.write(f'{label}: {count / elapsed:.1f} images/s, {failed} failed, {elapsed:.2f}s')
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from jobseek.authentication import TokenObtainPairSerializer
+from jobseek.models import Application, Company, CustomUser, Job
+
+from .bench_async import Command as AsyncBenchCommand
+
+BOUNDARY = 'bench-upload-boundary'
+BLOCK = 64 * 1024
+
+
+def read_blocks(path, start=0, length=None):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        remaining = os.path.getsize(path) - start if length is None else length
+        while remaining > 0:
+            block = source.read(min(BLOCK, remaining))
+            remaining -= len(block)
+            yield block
+
+
+def peak_rss(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    raise CommandError(f'No VmHWM for process {pid}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Uploads resumes concurrently to a gunicorn worker, once as single multipart requests and once '
+        'through the chunked resume upload endpoints, and reports the peak memory of the worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=32)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--size', type=int, default=8, help='Resume size in MB')
+        parser.add_argument('--port', type=int, default=8766)
+
+    def handle(self, *args, **options):
+        company = Company.objects.create(name='Upload bench', location='Lagos', description='')
+        job = Job.objects.create(title='Bench', description='', company=company, location='Lagos',
+                                 job_type=0, experience_level=0, salary=1)
+        # The chunked endpoints take uploads from the applicant
+        user = CustomUser.objects.create(username='upload-bench', email='bench@example.com', phone_number='89999999999')
+        self.authorization = f'Bearer {TokenObtainPairSerializer.get_token(user).access_token}'
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as source:
+            digest = hashlib.sha256()
+            for _ in range(options['size'] * 1024 * 1024 // BLOCK):
+                block = os.urandom(BLOCK)
+                digest.update(block)
+                source.write(block)
+        try:
+            for mode in ('multipart', 'chunked'):
+                self.run(mode, source.name, digest.hexdigest(), job, options)
+        finally:
+            os.unlink(source.name)
+            for application in Application.objects.filter(job=job):
+                if application.resume:
+                    default_storage.delete(application.resume.name)
+            company.delete()
+            user.delete()
+
+    def run(self, mode, path, sha256, job, options):
+        port, concurrency = options['port'], options['concurrency']
+        server = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', 'baseconfig.wsgi:application', '--log-level', 'warning',
+            '--workers', '1', '--worker-class', 'gthread', '--threads', str(concurrency),
+            '--bind', f'127.0.0.1:{port}',
+        ])
+        try:
+            base = f'http://127.0.0.1:{port}'
+            AsyncBenchCommand.wait_until_up(base + '/skill/')
+            with open(f'/proc/{server.pid}/task/{server.pid}/children') as children:
+                worker = int(children.read().split()[0])
+            idle = peak_rss(worker)
+
+            upload = self.upload_multipart if mode == 'multipart' else self.upload_chunked
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                statuses = list(pool.map(lambda _: upload(base, path, sha256, job), range(options['uploads'])))
+            elapsed = time.perf_counter() - started
+
+            failed = sum(1 for ok in statuses if not ok)
+            self.stdout.write(
+                f'{mode}: {options["uploads"]} x {options["size"]} MB at concurrency {concurrency} '
+                f'in {elapsed:.1f}s, worker peak RSS {idle / 1e6:.0f} MB idle -> '
+                f'{peak_rss(worker) / 1e6:.0f} MB, {failed} failed'
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    @staticmethod
+    def request(url, body=None, headers=None, method='GET'):
+        request = urllib.request.Request(url, data=body, headers=headers or {}, method=method)
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return response.status, response.read()
+
+    def upload_multipart(self, base, path, sha256, job):
+        fields = {'job_id': job.id, 'company_id': job.company_id, 'applicant_name': 'Bench',
+                  'applicant_email': 'bench@example.com', 'cover_letter': 'Bench'}
+        head = ''.join(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="resume"; filename="resume.pdf"\r\n'
+                 'Content-Type: application/pdf\r\n\r\n')
+        tail = f'\r\n--{BOUNDARY}--\r\n'.encode()
+        length = len(head.encode()) + os.path.getsize(path) + len(tail)
+
+        def body():
+            yield head.encode()
+            yield from read_blocks(path)
+            yield tail
+
+        status, _ = self.request(base + '/application/', body(), {
+            'Content-Type': f'multipart/form-data; boundary={BOUNDARY}', 'Content-Length': str(length),
+        }, 'POST')
+        return status == 201
+
+    def upload_chunked(self, base, path, sha256, job):
+        json_headers = {'Content-Type': 'application/json', 'Authorization': self.authorization}
+        _, created = self.request(base + '/application/', json.dumps({
+            'job_id': job.id, 'company_id': job.company_id, 'applicant_name': 'Bench',
+            'applicant_email': 'bench@example.com', 'cover_letter': 'Bench',
+        }).encode(), json_headers, 'POST')
+        size = os.path.getsize(path)
+        _, session = self.request(base + '/resume_upload/', json.dumps({
+            'application': json.loads(created)['id'], 'filename': 'resume.pdf', 'size': size, 'sha256': sha256,
+        }).encode(), json_headers, 'POST')
+        session = json.loads(session)
+
+        chunk_size = session['chunk_size']
+        for index, start in enumerate(range(0, size, chunk_size)):
+            length = min(chunk_size, size - start)
+            self.request(f'{base}/resume_upload/{session["id"]}/chunks/{index}/', read_blocks(path, start, length), {
+                'Content-Type': 'application/octet-stream', 'Content-Length': str(length),
+                'Authorization': self.authorization,
+            }, 'PUT')
+        status, _ = self.request(f'{base}/resume_upload/{session["id"]}/finalize/', b'', json_headers, 'POST')
+        return status == 200
@@ -0,0 +1,50 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobseek import exports
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams all jobs or applications as NDJSON or CSV, optionally gzip compressed, to a file or '
+        'the standard output. Rows are read in keyset batches, so memory stays flat whatever their number.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--output', choices=sorted(exports.FORMATS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output')
+        parser.add_argument('--company', type=int, help='Company id')
+        parser.add_argument('--start', type=exports.parse_moment, help='Created at or after, ISO 8601')
+        parser.add_argument('--end', type=exports.parse_moment, help='Created before, ISO 8601')
+        parser.add_argument('--is-active', type=exports.parse_flag, help='true or false, of the job for applications')
+        parser.add_argument('--batch-size', type=int, default=exports.BATCH_SIZE, help='Rows read at once')
+        parser.add_argument('--file', default='-', help='Written to the standard output by default')
+
+    def handle(self, *args, **options):
+        queryset = exports.filtered(
+            options['name'], company=options['company'], start=options['start'], end=options['end'],
+            is_active=options['is_active'],
+        )
+        try:
+            chunks, _, _ = exports.stream(options['name'], queryset, options['output'], options['gzip'],
+                                          options['batch_size'])
+        except exports.ExportError as error:
+            raise CommandError(error)
+
+        started = time.perf_counter()
+        written = 0
+        destination = sys.stdout.buffer if options['file'] == '-' else open(options['file'], 'wb')
+        try:
+            for chunk in chunks:
+                destination.write(chunk)
+                written += len(chunk)
+        finally:
+            if destination is not sys.stdout.buffer:
+                destination.close()
+        if options['file'] != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {written} bytes to {options["file"]} in {time.perf_counter() - started:.1f}s'
+            ))
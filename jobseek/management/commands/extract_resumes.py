@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from jobseek import resumes
+from jobseek.models import Application
+from jobseek.tasks import enqueue
+
+
+class Command(BaseCommand):
+    help = (
+        'Queues the text extraction of every resume not indexed yet for the background workers, '
+        'or extracts them in this process with --inline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Also extract resumes that are already indexed')
+        parser.add_argument('--inline', action='store_true', help='Extract here instead of queueing tasks')
+
+    def handle(self, *args, **options):
+        applications = Application.objects.exclude(resume='')
+        if not options['force']:
+            applications = applications.filter(
+                Q(resume_document__isnull=True) | ~Q(resume_document__source=F('resume'))
+            )
+        started = time.perf_counter()
+        count = failed = 0
+        for application in applications.order_by('id').iterator(chunk_size=500):
+            count += 1
+            if not options['inline']:
+                enqueue(resumes.extract_resume, application_id=application.pk)
+                continue
+            try:
+                document = resumes.index_application(application)
+            except OSError as error:
+                self.stderr.write(f'{application.pk}: {error}')
+                failed += 1
+                continue
+            if document.error:
+                self.stderr.write(f'{application.pk}: {document.error}')
+                failed += 1
+        if options['inline']:
+            message = f'Extracted {count - failed} resumes, {failed} failed'
+        else:
+            message = f'Queued {count} resumes'
+        self.stdout.write(self.style.SUCCESS(f'{message} in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,66 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobseek.ingest import JobIngestor
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams jobs from a JSONL or CSV file (or - for stdin) into the bulk ingestion pipeline. '
+        'CSV skills are separated by "|".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default=None,
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        reader = self.read_csv if file_format == 'csv' else self.read_jsonl
+
+        created = failed = 0
+        started = time.perf_counter()
+        try:
+            for result in JobIngestor(batch_size=options['batch_size']).ingest(reader(stream), start=1):
+                if 'id' in result:
+                    created += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Item {result["index"]}: {json.dumps(result["errors"])}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} jobs, {failed} rejected in {elapsed:.1f}s '
+            f'({created / elapsed if elapsed else 0:.0f} jobs/s)'
+        ))
+
+    @staticmethod
+    def read_jsonl(stream):
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise CommandError(f'Line {number}: {error}')
+
+    @staticmethod
+    def read_csv(stream):
+        for row in csv.DictReader(stream):
+            # Empty cells fall back to the field defaults
+            row = {key: value for key, value in row.items() if value != ''}
+            skills = row.pop('skills', '')
+            row['skills'] = [skill.strip() for skill in skills.split('|') if skill.strip()]
+            yield row
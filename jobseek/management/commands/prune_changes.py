@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobseek import changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes the job and company changes older than the retention from the sync feed log. '
+        'Cursors from before them are expired and their consumers resync from the exports.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHANGES_RETENTION_DAYS, help='Days of changes kept')
+
+    def handle(self, *args, **options):
+        count = changes.prune(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} changes'))
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobseek.models import ResumeUpload
+from jobseek.uploads import discard_chunks
+
+
+class Command(BaseCommand):
+    help = 'Deletes resume uploads that were never finalized, along with their stored chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Hours without activity before an upload is deleted')
+
+    def handle(self, *args, **options):
+        stale = ResumeUpload.objects.filter(
+            completed_at=None, updated_at__lt=timezone.now() - timedelta(hours=options['hours'])
+        )
+        count = 0
+        for upload in stale.iterator():
+            discard_chunks(upload)
+            upload.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} stale resume uploads'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from jobseek import facets
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the job facet counts from the job tables.'
+
+    def handle(self, *args, **options):
+        total = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} facet counts'))
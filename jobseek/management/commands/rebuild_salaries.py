@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobseek import salaries
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the salary histograms from the job tables, reading the active jobs and their '
+        'skills in primary key chunks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=20_000, help='Rows read at once')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        jobs, buckets = salaries.rebuild(options['chunk'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {buckets} salary buckets for {jobs} active jobs in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from jobseek import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search document of every job.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = search.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} jobs'))
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobseek.models import CustomUser, JobRecommendation
+from jobseek.recommendations import SkillMatrix, profile_vector, user_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Computes the most similar active jobs for every user with applications and stores them '
+        'for the recommended jobs endpoint, replacing the previous run. Users are read and written '
+        'in chunks; the skills of all active jobs are held in memory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMENDATIONS_TOP_K, help='Jobs stored per user')
+        parser.add_argument('--chunk', type=int, default=1000, help='Users read and written at once')
+        parser.add_argument('--max-skill-sets', type=int, default=settings.RECOMMENDATIONS_MAX_SKILL_SETS,
+                            help='Skill sets searched per user before settling for the best jobs found')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        matrix = SkillMatrix.load()
+        loaded = time.perf_counter()
+        self.stdout.write(
+            f'{len(matrix)} active jobs, {len(matrix.weights)} skills, {len(matrix.signatures)} skill sets, '
+            f'loaded in {loaded - started:.1f}s'
+        )
+
+        computed_at = timezone.now()
+        users = stored = 0
+        last_id = 0
+        while True:
+            chunk = list(
+                CustomUser.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'email')[:options['chunk']]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            profiles = user_profiles({email for _, email in chunk if email})
+            rows = []
+            for user_id, email in chunk:
+                if email not in profiles:
+                    continue
+                applied, skill_lists = profiles[email]
+                profile = profile_vector(skill_lists, matrix.weight)
+                top = matrix.top(profile, options['top_k'], applied, options['max_skill_sets']) if profile else []
+                rows.append(JobRecommendation(
+                    user_id=user_id, jobs=[[job_id, round(score, 4)] for job_id, score in top],
+                    computed_at=computed_at,
+                ))
+            JobRecommendation.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['user'], update_fields=['jobs', 'computed_at'],
+            )
+            users += len(chunk)
+            stored += len(rows)
+
+        # Users whose applications are all gone since the previous run
+        removed, _ = JobRecommendation.objects.filter(computed_at__lt=computed_at).delete()
+        elapsed = time.perf_counter() - loaded
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored recommendations for {stored} of {users} users in {elapsed:.1f}s '
+            f'({elapsed / stored * 1000 if stored else 0:.2f}ms each), removed {removed} stale'
+        ))
+
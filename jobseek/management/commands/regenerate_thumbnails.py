@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobseek import thumbnails
+from jobseek.models import Company, CustomUser
+
+SOURCES = {
+    'company': (Company, 'company_logo', 'company_logo_digest'),
+    'user': (CustomUser, 'profile_picture', 'profile_picture_digest'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Renders the thumbnails of company logos and profile pictures with the process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=list(SOURCES), action='append',
+                            help='Defaults to every model with images')
+        parser.add_argument('--force', action='store_true', help='Also render images that already have thumbnails')
+
+    def handle(self, *args, **options):
+        for label in options['model'] or list(SOURCES):
+            model, field, digest_field = SOURCES[label]
+            scopes_for = (lambda pk: ('company', f'company:{pk}')) if model is Company else None
+            started = time.perf_counter()
+            rendered, failed = thumbnails.regenerate(
+                model, field, digest_field, force=options['force'], scopes_for=scopes_for,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}: rendered {rendered} images, {failed} failed in {time.perf_counter() - started:.1f}s'
+            ))
@@ -0,0 +1,69 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobseek import caching, places, salaries
+from jobseek.models import Company, Job
+
+MODELS = {'company': Company, 'job': Job}
+FIELDS = ['place_id', 'latitude', 'longitude', 'geohash']
+
+
+class Command(BaseCommand):
+    help = (
+        'Resolves the location of existing jobs and companies to their gazetteer place, for rows '
+        'created before places were stored or after the gazetteer changed. Rows are read in primary '
+        'key chunks and the changed ones of a chunk are written with one update per place. Lists '
+        'the most frequent locations that resolve to no place.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), nargs='+', default=sorted(MODELS))
+        parser.add_argument('--chunk', type=int, default=5000, help='Rows read and written at once')
+        parser.add_argument('--unresolved', type=int, default=10, help='Unresolved locations listed')
+
+    def handle(self, *args, **options):
+        for name in options['model']:
+            changed = self.resolve(MODELS[name], options['chunk'], options['unresolved'])
+            if name == 'job' and changed:
+                # The salary histograms group the jobs by place
+                jobs, buckets = salaries.rebuild()
+                self.stdout.write(f'Rebuilt {buckets} salary buckets for {jobs} active jobs')
+        # The cached responses render the place fields
+        caching.invalidate(*options['model'])
+
+    def resolve(self, model, chunk_size, listed):
+        started = time.perf_counter()
+        rows = changed = 0
+        unresolved = Counter()
+        last_id = 0
+        while True:
+            chunk = list(
+                model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'location', *FIELDS)[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            rows += len(chunk)
+            # Row ids by the place fields they are missing
+            updates = {}
+            for pk, location, *current in chunk:
+                fields = places.location_fields(location)
+                if not fields['place_id']:
+                    unresolved[location] += 1
+                values = tuple(fields[name] for name in FIELDS)
+                if values != tuple(current):
+                    updates.setdefault(values, []).append(pk)
+            with transaction.atomic():
+                for values, ids in updates.items():
+                    changed += model.objects.filter(pk__in=ids).update(**dict(zip(FIELDS, values)))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{model.__name__}: {rows} rows, {changed} updated, {sum(unresolved.values())} without a place, '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+        for location, count in unresolved.most_common(listed):
+            self.stdout.write(f'  {count:>8}  {location!r}')
+        return changed
@@ -0,0 +1,109 @@
+import signal
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from jobseek import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued background tasks in a pool of threads until stopped, reporting the '
+        'throughput, queue wait and run time of every queue.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='append', help='Defaults to every queue in TASK_QUEUES')
+        parser.add_argument('--concurrency', type=int, default=4, help='Threads of this worker')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when idle')
+        parser.add_argument('--stats-interval', type=float, default=60.0)
+        parser.add_argument('--burst', action='store_true', help='Exit once no task is due')
+
+    def handle(self, *args, **options):
+        queues = options['queue'] or list(settings.TASK_QUEUES)
+        concurrency = options['concurrency']
+        worker = tasks.worker_name()
+        stopping = threading.Event()
+        previous_handlers = {
+            signum: signal.signal(signum, lambda *_: stopping.set()) for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            self.work(queues, concurrency, worker, stopping, options)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def work(self, queues, concurrency, worker, stopping, options):
+        self.outcomes = defaultdict(Counter)
+        self.timings = defaultdict(lambda: {'wait': [], 'run': []})
+        self.lock = threading.Lock()
+        self.since = time.monotonic()
+        last_report = self.since
+        self.stdout.write(f'Worker {worker} on {", ".join(queues)} with {concurrency} threads')
+
+        in_flight = set()
+        with ThreadPoolExecutor(concurrency) as pool:
+            while not stopping.is_set():
+                claimed = 0
+                for queue in queues:
+                    free = concurrency - len(in_flight)
+                    if free <= 0:
+                        break
+                    for claimed_task in tasks.claim(queue, worker, free):
+                        in_flight.add(pool.submit(self.run_task, claimed_task))
+                        claimed += 1
+                if options['burst'] and not claimed and not in_flight:
+                    break
+                if in_flight:
+                    done, in_flight = wait(in_flight, timeout=0 if claimed else options['poll_interval'],
+                                           return_when=FIRST_COMPLETED)
+                    in_flight = set(in_flight)
+                    for future in done:
+                        future.result()
+                elif not claimed:
+                    stopping.wait(options['poll_interval'])
+                if time.monotonic() - last_report >= options['stats_interval']:
+                    self.report()
+                    last_report = time.monotonic()
+            wait(in_flight)
+        self.report()
+
+    def run_task(self, claimed):
+        close_old_connections()
+        started = time.monotonic()
+        try:
+            status = tasks.run(claimed)
+        finally:
+            close_old_connections()
+        elapsed = time.monotonic() - started
+        outcome = {tasks.Task.DONE: 'done', tasks.Task.QUEUED: 'retried', tasks.Task.FAILED: 'failed'}[status]
+        with self.lock:
+            self.outcomes[claimed.queue][outcome] += 1
+            self.timings[claimed.queue]['wait'].append((claimed.locked_at - claimed.run_at).total_seconds())
+            self.timings[claimed.queue]['run'].append(elapsed)
+
+    def report(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.since
+            for queue, outcomes in sorted(self.outcomes.items()):
+                timings = self.timings[queue]
+                total = sum(outcomes.values())
+                self.stdout.write(
+                    f'{timezone.now():%H:%M:%S} {queue}: {outcomes["done"]} done, {outcomes["retried"]} retried, '
+                    f'{outcomes["failed"]} failed, {total / elapsed:.1f} tasks/s, '
+                    f'wait p50 {self.median(timings["wait"]):.3f}s, run p50 {self.median(timings["run"]):.3f}s'
+                )
+            self.outcomes.clear()
+            self.timings.clear()
+            self.since = time.monotonic()
+
+    @staticmethod
+    def median(values):
+        return statistics.median(values) if values else 0.0
@@ -0,0 +1,309 @@
+import random
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from jobseek import facets, places, salaries, search
+from jobseek.models import Application, Company, CustomUser, Job, JobSkill, Skill
+from wallet.models import CompanyWallet, Posting, Transaction, UserWallet, Wallet, WalletAddress
+
+# Rows per INSERT and per transaction
+BATCH_SIZE = 2000
+
+# Rows of each table at scale 1
+BASE_COUNTS = {'companies': 2_000, 'jobs': 100_000, 'users': 100_000, 'transactions': 200_000}
+
+SKILLS = (
+    'Python Django Flask FastAPI JavaScript TypeScript React Vue.js Angular Node.js Express PHP Laravel Java Spring '
+    'Kotlin Swift Go Rust C C++ C# .NET Ruby Rails Scala Elixir SQL PostgreSQL MySQL MongoDB Redis Elasticsearch '
+    'Kafka RabbitMQ Docker Kubernetes Terraform Ansible AWS Azure GCP Linux Git CI/CD Jenkins GraphQL REST gRPC '
+    'HTML CSS Sass Tailwind Figma Sketch Excel Tableau Power-BI Pandas NumPy Spark Hadoop Airflow dbt TensorFlow '
+    'PyTorch Scikit-learn NLP Flutter Dart Android iOS Selenium Cypress Jest Pytest Agile Scrum Jira Salesforce '
+    'SAP Accounting Sales Marketing SEO Copywriting Customer-Service Logistics Procurement Recruiting'
+).split()
+TITLES = ['Backend Engineer', 'Frontend Developer', 'Full Stack Developer', 'Data Analyst', 'Data Scientist',
+          'DevOps Engineer', 'Mobile Developer', 'QA Engineer', 'Product Designer', 'Product Manager',
+          'Accountant', 'Sales Executive', 'Marketing Manager', 'Customer Support Agent', 'Recruiter']
+SENIORITY = ['Graduate', 'Junior', '', 'Senior', 'Lead']
+# Yearly salary medians in naira by experience level
+SALARY_MEDIANS = [1_200_000, 2_400_000, 4_800_000, 8_000_000, 12_000_000]
+LOCATIONS = ['Lagos', 'Abuja', 'Ikeja, Lagos State', 'Port Harcourt', 'Ibadan', 'Kano', 'Enugu', 'Remote',
+             'Nairobi', 'Accra', 'Kigali', 'Lekki, Lagos State']
+LOCATION_WEIGHTS = [30, 12, 10, 6, 4, 3, 3, 15, 6, 5, 2, 4]
+JOB_TYPE_WEIGHTS = [55, 8, 7, 15, 10, 5]
+EXPERIENCE_WEIGHTS = [8, 25, 35, 22, 10]
+WORDS = ('build maintain scalable services team product customers api data cloud mobile platform design '
+         'deliver reliable secure fast growing startup fintech payments logistics health education users '
+         'features ownership collaborate mentor review test deploy monitor improve').split()
+FIRST_NAMES = ['Ada', 'Bola', 'Chidi', 'Dayo', 'Emeka', 'Funmi', 'Gbenga', 'Halima', 'Ife', 'Jide', 'Kemi',
+               'Lola', 'Musa', 'Ngozi', 'Obi', 'Seun', 'Tunde', 'Uche', 'Yemi', 'Zainab']
+LAST_NAMES = ['Adeyemi', 'Bello', 'Chukwu', 'Danjuma', 'Eze', 'Fashola', 'Ibrahim', 'Okafor', 'Okonkwo',
+              'Olawale', 'Onyeka', 'Suleiman', 'Usman', 'Yusuf']
+COMPANY_WORDS = ['Blue', 'Green', 'Bright', 'Swift', 'Prime', 'Delta', 'Sahel', 'Niger', 'Atlantic', 'Zenith']
+COMPANY_NOUNS = ['Labs', 'Systems', 'Logistics', 'Pay', 'Health', 'Foods', 'Energy', 'Capital', 'Works', 'Hub']
+
+
+def zipf_weights(count, exponent):
+    """Cumulative weights of a Zipf law over `count` ranks, for random.choices."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def batches(iterable, size=BATCH_SIZE):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Lets bulk inserts set created_at and updated_at instead of the current time."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the database with synthetic companies, jobs, skills, users, applications, wallets and '
+        'transactions with realistic distributions, using batched inserts. Scale 1 is about 100k jobs '
+        'and users; --scale 20 makes millions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0)
+        parser.add_argument('--applications-per-job', type=float, default=3.0,
+                            help='Mean of the Pareto distributed applications per job')
+        parser.add_argument('--history-days', type=int, default=730)
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generator, also tags the rows')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.tag = f'seed{options["seed"]}'
+        if CustomUser.objects.filter(username__startswith=f'{self.tag}-').exists():
+            raise CommandError(f'Rows of seed {options["seed"]} already exist, pick another --seed.')
+        self.now = timezone.now()
+        self.history = timedelta(days=options['history_days'])
+        counts = {name: max(int(count * options['scale']), 1) for name, count in BASE_COUNTS.items()}
+
+        with explicit_timestamps(Company, Job, CustomUser, Application, Wallet, UserWallet, CompanyWallet,
+                                 WalletAddress, Transaction, Posting):
+            skills = self.step('skills', self.seed_skills)
+            companies = self.step('companies', self.seed_companies, counts['companies'], options['seed'])
+            users = self.step('users and wallets', self.seed_users, counts['users'], options['seed'])
+            self.step('jobs and applications', self.seed_jobs, counts['jobs'], companies, skills, users,
+                      options['applications_per_job'])
+            self.step('transactions', self.seed_transactions, counts['transactions'], users)
+        self.step('search documents', search.rebuild_all)
+        self.step('facet counts', facets.rebuild)
+        self.step('salary histograms', salaries.rebuild)
+
+    def step(self, label, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        self.stdout.write(f'{label}: {time.perf_counter() - started:.1f}s')
+        return result
+
+    def moment(self, after=None):
+        """A time in the history, more recent ones more likely, like a growing site."""
+        start = after or self.now - self.history
+        return start + (self.now - start) * self.random.random() ** 0.6
+
+    def seed_skills(self):
+        existing = dict(Skill.objects.filter(name__in=SKILLS).values_list('name', 'id'))
+        Skill.objects.bulk_create(Skill(name=name) for name in SKILLS if name not in existing)
+        names = dict(Skill.objects.filter(name__in=SKILLS).values_list('name', 'id'))
+        return [names[name] for name in SKILLS]
+
+    def seed_companies(self, count, seed):
+        rows = []
+        for batch in batches(range(count)):
+            with transaction.atomic():
+                companies = Company.objects.bulk_create(
+                    Company(
+                        name=f'{self.random.choice(COMPANY_WORDS)} {self.random.choice(COMPANY_NOUNS)} {i}',
+                        **self.location(),
+                        description=self.sentence(20),
+                        created_at=(created := self.moment()),
+                        updated_at=created,
+                    )
+                    for i in batch
+                )
+                wallets = Wallet.objects.bulk_create(
+                    Wallet(phone_number=f'08{seed % 10}{company.pk:08d}', created_at=company.created_at,
+                           updated_at=company.created_at)
+                    for company in companies
+                )
+                CompanyWallet.objects.bulk_create(
+                    CompanyWallet(company=company, wallet=wallet, created_at=company.created_at,
+                                  updated_at=company.created_at)
+                    for company, wallet in zip(companies, wallets)
+                )
+            rows.extend((company.pk, company.created_at) for company in companies)
+        return rows
+
+    def seed_users(self, count, seed):
+        password = make_password('seed-password')  # Hashed once, hashing is slow on purpose
+        rows = []
+        for batch in batches(range(count)):
+            with transaction.atomic():
+                users = CustomUser.objects.bulk_create(
+                    CustomUser(
+                        username=f'{self.tag}-{i}',
+                        email=f'{self.tag}-{i}@example.com',
+                        first_name=(first := self.random.choice(FIRST_NAMES)),
+                        last_name=(last := self.random.choice(LAST_NAMES)),
+                        password=password,
+                        phone_number=f'07{seed % 10}{i:08d}',
+                        date_joined=(created := self.moment()),
+                        created_at=created,
+                        updated_at=created,
+                    )
+                    for i in batch
+                )
+                wallets = Wallet.objects.bulk_create(
+                    Wallet(phone_number=user.phone_number, created_at=user.created_at, updated_at=user.created_at)
+                    for user in users
+                )
+                UserWallet.objects.bulk_create(
+                    UserWallet(wallet=wallet, user=user, created_at=user.created_at, updated_at=user.created_at)
+                    for user, wallet in zip(users, wallets)
+                )
+                addresses = WalletAddress.objects.bulk_create(
+                    WalletAddress(wallet=user, address=f'{user.phone_number}-{self.random.getrandbits(8):02x}',
+                                  created_at=user.created_at, updated_at=user.created_at)
+                    for user in users
+                )
+            rows.extend(
+                (user.pk, f'{user.first_name} {user.last_name}', user.email, user.created_at, wallet.pk, address.pk)
+                for user, wallet, address in zip(users, wallets, addresses)
+            )
+        return rows
+
+    def sentence(self, words):
+        return ' '.join(self.random.choices(WORDS, k=words)).capitalize() + '.'
+
+    def location(self):
+        # With its place, bulk_create skips the pre_save signal resolving it
+        location = self.random.choices(LOCATIONS, LOCATION_WEIGHTS)[0]
+        return {'location': location, **places.location_fields(location)}
+
+    def seed_jobs(self, count, companies, skills, users, applications_per_job):
+        # A few companies post most jobs, a few skills are in most jobs, a few users apply a lot
+        company_weights = zipf_weights(len(companies), 1.1)
+        skill_weights = zipf_weights(len(skills), 0.9)
+        user_weights = zipf_weights(len(users), 0.5)
+        # One less than a Pareto variable of mean applications_per_job + 1
+        alpha = (applications_per_job + 1) / applications_per_job if applications_per_job > 0 else 1000.0
+        for batch in batches(range(count)):
+            with transaction.atomic():
+                jobs = []
+                for _ in batch:
+                    company_id, company_created = companies[bisect(company_weights, self.random.random() * company_weights[-1])]
+                    level = self.random.choices(range(5), EXPERIENCE_WEIGHTS)[0]
+                    created = self.moment(company_created)
+                    jobs.append(Job(
+                        title=f'{SENIORITY[level]} {self.random.choice(TITLES)}'.strip(),
+                        description=' '.join(self.sentence(self.random.randint(8, 20))
+                                             for _ in range(self.random.randint(3, 8))),
+                        company_id=company_id,
+                        **self.location(),
+                        job_type=self.random.choices(range(6), JOB_TYPE_WEIGHTS)[0],
+                        experience_level=level,
+                        salary=round(SALARY_MEDIANS[level] * self.random.lognormvariate(0, 0.35), -3),
+                        is_active=self.random.random() < 0.85,
+                        created_at=created,
+                        updated_at=created,
+                    ))
+                jobs = Job.objects.bulk_create(jobs)
+                job_skills, applications = [], []
+                for job in jobs:
+                    chosen = {
+                        skills[bisect(skill_weights, self.random.random() * skill_weights[-1])]
+                        for _ in range(self.random.randint(2, 8))
+                    }
+                    job_skills.extend(JobSkill(job=job, skills_id=skill_id) for skill_id in chosen)
+                    for _ in range(min(round(self.random.paretovariate(alpha)) - 1, 500)):
+                        _, name, email, _, _, _ = users[bisect(user_weights, self.random.random() * user_weights[-1])]
+                        created = self.moment(job.created_at)
+                        applications.append(Application(
+                            job=job, company_id=job.company_id, applicant_name=name, applicant_email=email,
+                            cover_letter=self.sentence(30), created_at=created, updated_at=created,
+                        ))
+                JobSkill.objects.bulk_create(job_skills, batch_size=BATCH_SIZE)
+                Application.objects.bulk_create(applications, batch_size=BATCH_SIZE)
+
+    def seed_transactions(self, count, users):
+        """
+        Deposits, transfers and withdrawals with their ledger postings. The
+        balances are tracked in cents so no wallet goes below zero, and are
+        written to the wallets at the end so they match the ledger.
+        """
+        balances = {}
+        for batch in batches(range(count)):
+            records, sides = [], []
+            for _ in batch:
+                user_id, _, _, joined, wallet_id, address_id = self.random.choice(users)
+                created = self.moment(joined)
+                balance = balances.get(wallet_id, 0)
+                kind = self.random.random()
+                if balance < 1000 or kind < 0.3:
+                    cents = int(self.random.lognormvariate(11, 1)) + 100
+                    records.append(Transaction(user_id=user_id, transaction_type=Transaction.DEPOSIT,
+                                               recipient_address_id=address_id))
+                    sides.append((None, wallet_id, cents, created))
+                    balances[wallet_id] = balance + cents
+                elif kind < 0.85:
+                    recipient_id, _, _, _, recipient_wallet_id, recipient_address_id = self.random.choice(users)
+                    if recipient_wallet_id == wallet_id:
+                        continue
+                    cents = self.random.randint(100, balance)
+                    records.append(Transaction(user_id=user_id, transaction_type=Transaction.TRANSFER,
+                                               sender_address_id=address_id, recipient_address_id=recipient_address_id))
+                    sides.append((wallet_id, recipient_wallet_id, cents, created))
+                    balances[wallet_id] = balance - cents
+                    balances[recipient_wallet_id] = balances.get(recipient_wallet_id, 0) + cents
+                else:
+                    cents = self.random.randint(100, balance)
+                    records.append(Transaction(user_id=user_id, transaction_type=Transaction.WITHDRAWAL,
+                                               sender_address_id=address_id))
+                    sides.append((wallet_id, None, cents, created))
+                    balances[wallet_id] = balance - cents
+            for record, (_, _, cents, created) in zip(records, sides):
+                record.amount = Decimal(cents) / 100
+                record.description = record.transaction_type.capitalize()
+                record.created_at = record.updated_at = created
+            with transaction.atomic():
+                records = Transaction.objects.bulk_create(records)
+                Posting.objects.bulk_create((
+                    Posting(transaction=record, wallet_id=wallet_id, amount=amount, created_at=record.created_at)
+                    for record, (debit, credit, _, _) in zip(records, sides)
+                    for wallet_id, amount in ((debit, -record.amount), (credit, record.amount))
+                ), batch_size=BATCH_SIZE)
+
+        for batch in batches(balances.items()):
+            with transaction.atomic():
+                Wallet.objects.bulk_update(
+                    [Wallet(pk=wallet_id, balance=Decimal(cents) / 100) for wallet_id, cents in batch], ['balance'],
+                )
@@ -0,0 +1,207 @@
+"""
+In-process request metrics: per-request SQL, serializer and total timings,
+aggregated into histograms by view and exposed in the Prometheus text
+format at /metrics.
+
+The histograms live in the memory of each process, so with several
+gunicorn workers every worker reports its own share; Prometheus adds them
+up when each worker is scraped, or a single worker's view is a sample.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+# Timings of the request being served by this thread or task, None outside a request
+current = ContextVar('request_timings', default=None)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+
+class RequestTimings:
+    """What one request spent in the database and in serializers."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """A `connection.execute_wrapper` counting and timing every statement."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        """Returns the value of the Server-Timing header, durations in milliseconds."""
+        return ', '.join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+            f'ser;dur={self.serializer_seconds * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed set of label names."""
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        # Counts per bucket are made cumulative when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = sorted((labels, [list(counts), total, count]) for labels, (counts, total, count) in self.series.items())
+        for labels, (counts, total, count) in series:
+            label_text = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+class Counter:
+    """A Prometheus counter with a fixed set of label names."""
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = sorted(self.series.items())
+        for labels, value in series:
+            label_text = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, labels))
+            lines.append(f'{self.name}{{{label_text}}} {value}')
+        return lines
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response.', ('view', 'method'), SECONDS_BUCKETS,
+)
+DB_SECONDS = Histogram(
+    'http_request_db_duration_seconds', 'Time spent running SQL per request.', ('view', 'method'), SECONDS_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL statements run per request.', ('view', 'method'), QUERY_BUCKETS,
+)
+SERIALIZER_SECONDS = Histogram(
+    'http_request_serializer_duration_seconds', 'Time spent in serializers per request.', ('view', 'method'),
+    SECONDS_BUCKETS,
+)
+RESPONSES = Counter('http_responses_total', 'Responses by status code.', ('view', 'method', 'status'))
+
+METRICS = (REQUEST_SECONDS, DB_SECONDS, DB_QUERIES, SERIALIZER_SECONDS, RESPONSES)
+
+
+def observe_request(view, method, status, total, timings):
+    labels = (view, method)
+    REQUEST_SECONDS.observe(labels, total)
+    DB_SECONDS.observe(labels, timings.db_seconds)
+    DB_QUERIES.observe(labels, timings.queries)
+    SERIALIZER_SECONDS.observe(labels, timings.serializer_seconds)
+    RESPONSES.inc((view, method, str(status)))
+
+
+def timed_data(data_property):
+    """
+    Wraps the `data` property of a DRF serializer class so the time spent
+    building the representation is added to the current request. Nested
+    serializers are only counted once, by the outermost one.
+    """
+    def data(serializer):
+        timings = current.get()
+        if timings is None or timings.serializer_depth:
+            return data_property.fget(serializer)
+        timings.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data_property.fget(serializer)
+        finally:
+            timings.serializer_seconds += time.perf_counter() - started
+            timings.serializer_depth -= 1
+    data.instrumented = True
+    return property(data)
+
+
+def instrument_serializers():
+    from rest_framework import serializers
+    for serializer_class in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(serializer_class.data.fget, 'instrumented', False):
+            serializer_class.data = timed_data(serializer_class.data)
+
+
+def task_lines():
+    # Read when scraped, the queue is shared by every process
+    from .tasks import queue_stats
+    lines = ['# HELP background_tasks Background tasks by queue and status.', '# TYPE background_tasks gauge']
+    for queue, statuses in sorted(queue_stats().items()):
+        for task_status, count in sorted(statuses.items()):
+            lines.append(f'background_tasks{{queue="{escape(queue)}",status="{escape(task_status)}"}} {count}')
+    return lines
+
+
+def metrics_view(request):
+    """
+    Serves the metrics in the Prometheus text format. When METRICS_TOKEN is
+    set, scrapers must send it as a bearer token; otherwise only staff signed
+    in to the admin see them, and anyone else gets a 404 unless DEBUG is on.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not (settings.DEBUG or request.user.is_staff):
+        raise Http404
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(task_lines())
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
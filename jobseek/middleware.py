@@ -0,0 +1,124 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TimingMiddleware:
+    """
+    Records the SQL statements, SQL time, serializer time and total time of
+    every request into the metrics histograms, and reports them to the
+    client in a Server-Timing header.
+
+    With PROFILE_SLOW_REQUESTS_MS set, the stack of each request is also
+    sampled, and requests slower than that are written to PROFILE_DIR as
+    collapsed stacks that flamegraph.pl or speedscope read directly.
+
+    The time of a streaming response is the time to its first byte.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = metrics.RequestTimings()
+        token = metrics.current.set(timings)
+        profiling = bool(settings.PROFILE_SLOW_REQUESTS_MS)
+        if profiling:
+            sampler.start()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - started
+            metrics.current.reset(token)
+            samples = sampler.stop() if profiling else None
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.observe_request(view, request.method, response.status_code, total, timings)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = timings.server_timing(total)
+        if samples and total * 1000 >= settings.PROFILE_SLOW_REQUESTS_MS:
+            dump_profile(view, request.method, total, samples)
+        return response
+
+
+def frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+class Sampler:
+    """
+    Samples the stacks of the threads serving profiled requests from one
+    background thread, which sleeps while no request is profiled.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            self.active[threading.get_ident()] = Counter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='request-sampler', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def stop(self):
+        """Returns the stacks sampled for the calling thread since `start`."""
+        with self.lock:
+            return self.active.pop(threading.get_ident(), Counter())
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                if not self.active:
+                    self.wakeup.clear()
+                for thread_id, stacks in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    names = []
+                    while frame is not None:
+                        names.append(frame_name(frame))
+                        frame = frame.f_back
+                    stacks[';'.join(reversed(names))] += 1
+            del frames
+
+
+sampler = Sampler(interval=settings.PROFILE_INTERVAL_MS / 1000)
+
+
+def dump_profile(view, method, total, samples):
+    """Writes the samples of a slow request as `stack count` lines."""
+    name = f'{timezone.now():%Y%m%dT%H%M%S.%f}-{method}-{view}-{total * 1000:.0f}ms.folded'
+    path = os.path.join(settings.PROFILE_DIR, name.replace(os.sep, '_'))
+    try:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        with open(path, 'w') as output:
+            for stack, count in samples.most_common():
+                output.write(f'{stack} {count}\n')
+    except OSError:
+        logger.warning('Could not write the profile of a slow %s %s', method, view, exc_info=True)
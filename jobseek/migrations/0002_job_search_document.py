@@ -0,0 +1,128 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE jobseek_jobsearch_fts USING fts5(
+        title, skills, company, location, description,
+        content='jobseek_jobsearchdocument', content_rowid='job_id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER jobseek_jobsearch_ai AFTER INSERT ON jobseek_jobsearchdocument BEGIN
+        INSERT INTO jobseek_jobsearch_fts(rowid, title, skills, company, location, description)
+        VALUES (new.job_id, new.title, new.skills, new.company, new.location, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER jobseek_jobsearch_ad AFTER DELETE ON jobseek_jobsearchdocument BEGIN
+        INSERT INTO jobseek_jobsearch_fts(jobseek_jobsearch_fts, rowid, title, skills, company, location, description)
+        VALUES ('delete', old.job_id, old.title, old.skills, old.company, old.location, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER jobseek_jobsearch_au AFTER UPDATE ON jobseek_jobsearchdocument BEGIN
+        INSERT INTO jobseek_jobsearch_fts(jobseek_jobsearch_fts, rowid, title, skills, company, location, description)
+        VALUES ('delete', old.job_id, old.title, old.skills, old.company, old.location, old.description);
+        INSERT INTO jobseek_jobsearch_fts(rowid, title, skills, company, location, description)
+        VALUES (new.job_id, new.title, new.skills, new.company, new.location, new.description);
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS jobseek_jobsearch_au",
+    "DROP TRIGGER IF EXISTS jobseek_jobsearch_ad",
+    "DROP TRIGGER IF EXISTS jobseek_jobsearch_ai",
+    "DROP TABLE IF EXISTS jobseek_jobsearch_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE jobseek_jobsearchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(skills, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(company, '') || ' ' || coalesce(location, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'D')
+    ) STORED
+    """,
+    """
+    ALTER TABLE jobseek_jobsearchdocument ADD COLUMN location_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('english', coalesce(location, ''))
+    ) STORED
+    """,
+    """
+    ALTER TABLE jobseek_jobsearchdocument ADD COLUMN skills_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('english', coalesce(skills, ''))
+    ) STORED
+    """,
+    "CREATE INDEX jobseek_jobsearch_vector_gin ON jobseek_jobsearchdocument USING gin (search_vector)",
+    "CREATE INDEX jobseek_jobsearch_location_gin ON jobseek_jobsearchdocument USING gin (location_vector)",
+    "CREATE INDEX jobseek_jobsearch_skills_gin ON jobseek_jobsearchdocument USING gin (skills_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "ALTER TABLE jobseek_jobsearchdocument DROP COLUMN IF EXISTS skills_vector",
+    "ALTER TABLE jobseek_jobsearchdocument DROP COLUMN IF EXISTS location_vector",
+    "ALTER TABLE jobseek_jobsearchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_for_vendor(sqlite, postgresql):
+    def run(apps, schema_editor):
+        statements = {'sqlite': sqlite, 'postgresql': postgresql}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def backfill_documents(apps, schema_editor):
+    Job = apps.get_model('jobseek', 'Job')
+    JobSkill = apps.get_model('jobseek', 'JobSkill')
+    JobSearchDocument = apps.get_model('jobseek', 'JobSearchDocument')
+    skills = {}
+    for job_id, name in JobSkill.objects.values_list('job_id', 'skills__name'):
+        skills.setdefault(job_id, []).append(name)
+    documents = (
+        JobSearchDocument(
+            job_id=job.id,
+            title=job.title,
+            skills=' '.join(skills.get(job.id, [])),
+            company=job.company.name,
+            location=job.location,
+            description=job.description,
+        )
+        for job in Job.objects.select_related('company').iterator(chunk_size=1000)
+    )
+    JobSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobseek', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobSearchDocument',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='jobseek.job')),
+                ('title', models.CharField(max_length=100)),
+                ('skills', models.TextField(blank=True)),
+                ('company', models.CharField(blank=True, max_length=100)),
+                ('location', models.CharField(blank=True, max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FORWARD, POSTGRES_FORWARD),
+            run_for_vendor(SQLITE_REVERSE, POSTGRES_REVERSE),
+        ),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:16
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counts(apps, schema_editor):
+    Job = apps.get_model('jobseek', 'Job')
+    JobSkill = apps.get_model('jobseek', 'JobSkill')
+    FacetCount = apps.get_model('jobseek', 'FacetCount')
+    rows = []
+    active = Job.objects.filter(is_active=True).order_by()
+    for facet in ('job_type', 'experience_level', 'location'):
+        for row in active.values(facet).annotate(count=Count('id')):
+            rows.append(FacetCount(facet=facet, value=str(row[facet]), count=row['count']))
+    skills = JobSkill.objects.filter(job__is_active=True).order_by().values('skills_id').annotate(count=Count('id'))
+    rows.extend(FacetCount(facet='skill', value=str(row['skills_id']), count=row['count']) for row in skills)
+    FacetCount.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobseek', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('job_type', 'Job type'), ('experience_level', 'Experience level'), ('location', 'Location'), ('skill', 'Skill')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='unique_facet_value')],
+            },
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobseek', '0005_resume_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='company_logo_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE jobseek_resume_fts USING fts5(
+        applicant, skills, cover_letter, text,
+        content='jobseek_resumedocument', content_rowid='application_id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER jobseek_resume_ai AFTER INSERT ON jobseek_resumedocument BEGIN
+        INSERT INTO jobseek_resume_fts(rowid, applicant, skills, cover_letter, text)
+        VALUES (new.application_id, new.applicant, new.skills, new.cover_letter, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER jobseek_resume_ad AFTER DELETE ON jobseek_resumedocument BEGIN
+        INSERT INTO jobseek_resume_fts(jobseek_resume_fts, rowid, applicant, skills, cover_letter, text)
+        VALUES ('delete', old.application_id, old.applicant, old.skills, old.cover_letter, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER jobseek_resume_au AFTER UPDATE ON jobseek_resumedocument BEGIN
+        INSERT INTO jobseek_resume_fts(jobseek_resume_fts, rowid, applicant, skills, cover_letter, text)
+        VALUES ('delete', old.application_id, old.applicant, old.skills, old.cover_letter, old.text);
+        INSERT INTO jobseek_resume_fts(rowid, applicant, skills, cover_letter, text)
+        VALUES (new.application_id, new.applicant, new.skills, new.cover_letter, new.text);
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS jobseek_resume_au",
+    "DROP TRIGGER IF EXISTS jobseek_resume_ad",
+    "DROP TRIGGER IF EXISTS jobseek_resume_ai",
+    "DROP TABLE IF EXISTS jobseek_resume_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE jobseek_resumedocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(skills, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(applicant, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(text, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(cover_letter, '')), 'D')
+    ) STORED
+    """,
+    """
+    ALTER TABLE jobseek_resumedocument ADD COLUMN skills_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('english', coalesce(skills, ''))
+    ) STORED
+    """,
+    "CREATE INDEX jobseek_resume_vector_gin ON jobseek_resumedocument USING gin (search_vector)",
+    "CREATE INDEX jobseek_resume_skills_gin ON jobseek_resumedocument USING gin (skills_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "ALTER TABLE jobseek_resumedocument DROP COLUMN IF EXISTS skills_vector",
+    "ALTER TABLE jobseek_resumedocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_for_vendor(sqlite, postgresql):
+    def run(apps, schema_editor):
+        statements = {'sqlite': sqlite, 'postgresql': postgresql}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def queue_extraction(apps, schema_editor):
+    # The workers index the existing applications, as `manage.py extract_resumes` would
+    Application = apps.get_model('jobseek', 'Application')
+    Task = apps.get_model('jobseek', 'Task')
+    now = timezone.now()
+    tasks = (
+        Task(queue='resumes', name='jobseek.resumes.extract_resume', payload={'application_id': application_id},
+             max_attempts=5, run_at=now)
+        for application_id in Application.objects.values_list('id', flat=True).iterator(chunk_size=1000)
+    )
+    Task.objects.bulk_create(tasks, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobseek', '0007_background_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeDocument',
+            fields=[
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resume_document', serialize=False, to='jobseek.application')),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('applicant', models.CharField(blank=True, max_length=255)),
+                ('skills', models.TextField(blank=True)),
+                ('cover_letter', models.TextField(blank=True)),
+                ('text', models.TextField(blank=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('extracted_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('matched_skills', models.ManyToManyField(blank=True, related_name='resume_documents', to='jobseek.skill')),
+            ],
+        ),
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FORWARD, POSTGRES_FORWARD),
+            run_for_vendor(SQLITE_REVERSE, POSTGRES_REVERSE),
+        ),
+        migrations.RunPython(queue_extraction, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobseek', '0011_places'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalaryBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('all', 'All jobs'), ('job_type', 'Job type'), ('experience_level', 'Experience level'), ('location', 'Location'), ('skill', 'Skill')], max_length=20)),
+                ('value', models.CharField(blank=True, max_length=100)),
+                ('bucket', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value', 'bucket'), name='unique_salary_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:59
+
+from django.db import migrations, models
+
+
+TABLES = {'job': 'jobseek_job', 'company': 'jobseek_company'}
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER jobseek_{model}_change_{suffix} AFTER {event} ON {table} BEGIN
+        INSERT INTO jobseek_change (transaction_id, model, object_id, action, changed_at)
+        VALUES (0, '{model}', {row}.id, '{action}', strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END
+    """
+    for model, table in TABLES.items()
+    for suffix, event, row, action in (
+        ('ai', 'INSERT', 'new', 'created'), ('au', 'UPDATE', 'new', 'updated'), ('ad', 'DELETE', 'old', 'deleted'),
+    )
+]
+
+SQLITE_REVERSE = [
+    f"DROP TRIGGER IF EXISTS jobseek_{model}_change_{suffix}" for model in TABLES for suffix in ('ai', 'au', 'ad')
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE FUNCTION jobseek_record_change() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO jobseek_change (transaction_id, model, object_id, action, changed_at)
+        VALUES (
+            pg_current_xact_id()::text::bigint, TG_ARGV[0],
+            CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+            CASE TG_OP WHEN 'INSERT' THEN 'created' WHEN 'UPDATE' THEN 'updated' ELSE 'deleted' END,
+            now()
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    *(
+        f"""
+        CREATE TRIGGER jobseek_{model}_change AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION jobseek_record_change('{model}')
+        """
+        for model, table in TABLES.items()
+    ),
+]
+
+POSTGRES_REVERSE = [
+    *(f"DROP TRIGGER IF EXISTS jobseek_{model}_change ON {table}" for model, table in TABLES.items()),
+    "DROP FUNCTION IF EXISTS jobseek_record_change()",
+]
+
+
+def run_for_vendor(sqlite, postgresql):
+    def run(apps, schema_editor):
+        statements = {'sqlite': sqlite, 'postgresql': postgresql}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobseek', '0012_salary_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('transaction_id', models.BigIntegerField(default=0)),
+                ('model', models.CharField(choices=[('job', 'Job'), ('company', 'Company')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted'), ('pruned', 'Pruned')], max_length=10)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['transaction_id', 'id'], name='change_position_idx')],
+            },
+        ),
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FORWARD, POSTGRES_FORWARD),
+            run_for_vendor(SQLITE_REVERSE, POSTGRES_REVERSE),
+        ),
+    ]
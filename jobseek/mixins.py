@@ -0,0 +1,82 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def relation_lookups(serializer_class):
+    """
+    Returns the `(select_related, prefetch_related)` lookups needed to render
+    a serializer without a query per row.
+
+    The lookups are read from the serializer fields themselves, so adding a
+    related field to a serializer also adds it to the queryset of every view
+    that renders it.
+    """
+    return _relation_lookups(serializer_class)
+
+
+@lru_cache(maxsize=None)
+def _relation_lookups(serializer_class):
+    select, prefetch = [], []
+    _collect(serializer_class(), serializer_class.Meta.model, '', select, prefetch)
+    return tuple(select), tuple(prefetch)
+
+
+def _collect(serializer, model, prefix, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        path, relation = _resolve(model, field.source_attrs)
+        if relation is None:
+            continue
+        lookup = prefix + '__'.join(path)
+        if relation.many_to_many or relation.one_to_many:
+            prefetch.append(lookup)
+            if isinstance(field, serializers.ListSerializer):
+                # Everything below a to-many relation has to be prefetched too
+                _collect(field.child, relation.related_model, lookup + '__', prefetch, prefetch)
+        elif isinstance(field, serializers.BaseSerializer):
+            select.append(lookup)
+            _collect(field, relation.related_model, lookup + '__', select, prefetch)
+        elif isinstance(field, serializers.RelatedField):
+            # Primary keys are read from the local `<name>_id` column
+            if field.use_pk_only_optimization() and len(path) == 1:
+                continue
+            select.append(lookup)
+
+
+def _resolve(model, attrs):
+    """
+    Follows a dotted serializer source through the model relations and
+    returns the path and the last relation, or None for plain attributes.
+    """
+    path, relation = [], None
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return path, relation
+        if not field.is_relation:
+            return path, relation
+        path.append(attr)
+        relation = field
+        model = field.related_model
+    return path, relation
+
+
+class RelationAwareQuerysetMixin:
+    """
+    Builds the viewset queryset with the select_related and prefetch_related
+    lookups its serializer needs, so list endpoints run a fixed number of
+    queries whatever the number of rows.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select, prefetch = relation_lookups(self.get_serializer_class())
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
@@ -25,12 +27,25 @@ JOB_TYPE_CHOICES = (
 class Company(models.Model):
     name = models.CharField(max_length=100)
     location = models.CharField(max_length=100)
+    # Resolved from the location by jobseek/places.py
+    place_id = models.CharField(max_length=50, blank=True, default='', editable=False)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
     description = models.TextField()
     website = models.URLField(blank=True, null=True)
     company_logo = models.ImageField(upload_to='company_logo/', blank=True, null=True)
+    company_logo_digest = models.CharField(max_length=64, blank=True, default='', editable=False)  # Of the rendered derivatives
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='company_created_id_idx'),
+            models.Index(fields=['geohash'], name='company_geohash_idx'),
+            models.Index(fields=['place_id'], name='company_place_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -51,6 +66,11 @@ class Job(models.Model):
     description = models.TextField()
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     location = models.CharField(max_length=100)
+    # Resolved from the location by jobseek/places.py
+    place_id = models.CharField(max_length=50, blank=True, default='', editable=False)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
     job_type = models.IntegerField(choices=JOB_TYPE_CHOICES)
     experience_level = models.IntegerField(choices=EXPERIENCE_LEVEL_CHOICES)
     # skills = models.ManyToManyField(Skill, through='JobSkill')
@@ -59,6 +79,13 @@ class Job(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='job_created_id_idx'),
+            models.Index(fields=['geohash'], name='job_geohash_idx'),
+            models.Index(fields=['place_id'], name='job_place_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -71,29 +98,296 @@ class JobSkill(models.Model):
     def __str__(self):
         return self.job.title
 
+
+# Job search document
+class JobSearchDocument(models.Model):
+    """
+    Denormalized text of a job kept in sync by signals and indexed by the
+    database full-text engine (tsvector/GIN on PostgreSQL, FTS5 on SQLite).
+    """
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.CharField(max_length=100)
+    skills = models.TextField(blank=True)
+    company = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=100, blank=True)
+    description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+# Facet count model
+class FacetCount(models.Model):
+    """
+    Number of active jobs per facet value, maintained incrementally by
+    signals so browsing facets never needs a GROUP BY over the job table.
+    """
+    FACETS = (
+        ('job_type', 'Job type'),
+        ('experience_level', 'Experience level'),
+        ('location', 'Location'),
+        ('skill', 'Skill'),
+    )
+
+    facet = models.CharField(max_length=20, choices=FACETS)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_facet_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+
+class SalaryBucket(models.Model):
+    """
+    Number and sum of the salaries of active jobs falling in one logarithmic
+    bucket, per group, maintained incrementally by signals so the salary
+    percentiles never need a sort over the job table; see jobseek/salaries.py.
+    """
+    FACETS = (
+        ('all', 'All jobs'),
+        ('job_type', 'Job type'),
+        ('experience_level', 'Experience level'),
+        ('location', 'Location'),
+        ('skill', 'Skill'),
+    )
+
+    facet = models.CharField(max_length=20, choices=FACETS)
+    value = models.CharField(max_length=100, blank=True)
+    bucket = models.IntegerField()
+    count = models.IntegerField(default=0)
+    total = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value', 'bucket'], name='unique_salary_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value} #{self.bucket}: {self.count}"
+
 # Application model
 class Application(models.Model):
     job = models.ForeignKey(Job, on_delete=models.CASCADE)
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     applicant_name = models.CharField(max_length=100)
     applicant_email = models.EmailField()
-    resume = models.FileField(upload_to='applications/')
+    resume = models.FileField(upload_to='applications/', blank=True)  # Blank until a resume upload is finalized
     cover_letter = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='application_created_id_idx'),
+            models.Index(fields=['applicant_email', 'created_at', 'id'], name='application_email_created_idx'),
+        ]
+
     def __str__(self):
         return self.applicant_name
 
+# Resume search document
+class ResumeDocument(models.Model):
+    """
+    Text extracted from the resume of an application by the background
+    worker, with the skills it mentions, indexed by the database full-text
+    engine like JobSearchDocument.
+    """
+    application = models.OneToOneField(
+        Application, on_delete=models.CASCADE, primary_key=True, related_name='resume_document'
+    )
+    source = models.CharField(max_length=100, blank=True)  # Name of the resume file the text was extracted from
+    applicant = models.CharField(max_length=255, blank=True)
+    skills = models.TextField(blank=True)
+    cover_letter = models.TextField(blank=True)
+    text = models.TextField(blank=True)
+    matched_skills = models.ManyToManyField(Skill, blank=True, related_name='resume_documents')
+    error = models.CharField(max_length=255, blank=True)  # Why no text could be extracted
+    extracted_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.applicant
+
+# Resume upload models, a resume sent in chunks that can be resumed after a failure
+class ResumeUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='resume_uploads')
+    filename = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    chunk_size = models.PositiveIntegerField()
+    completed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def expected_chunk_size(self, index):
+        """Returns the length chunk `index` must have, the last one holding the remainder."""
+        if index < self.chunk_count - 1:
+            return self.chunk_size
+        return self.size - self.chunk_size * (self.chunk_count - 1)
+
+    def __str__(self):
+        return f"{self.filename} ({self.size} bytes)"
+
+
+class ResumeUploadChunk(models.Model):
+    upload = models.ForeignKey(ResumeUpload, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    name = models.CharField(max_length=255)  # Storage name of the chunk
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'index'], name='unique_upload_chunk'),
+        ]
+
+    def __str__(self):
+        return f"{self.upload_id} #{self.index}"
+
 # Custom User model
 class CustomUser(AbstractUser):
     phone_number = models.CharField(max_length=11, unique=True)
     dob = models.DateField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    profile_picture_digest = models.CharField(max_length=64, blank=True, default='', editable=False)  # Of the rendered derivatives
     bio = models.TextField(blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='user_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.username
+
+
+class ClaimsUser(CustomUser):
+    """
+    The user of a request, built from the signed claims of its access token
+    without reading the row. The other fields are deferred and loaded all at
+    once, from a short-lived per-process cache of user rows, on first access.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, values):
+        """Builds the user from a dict of the field values carried by the token."""
+        names = [field.attname for field in cls._meta.concrete_fields if field.attname in values]
+        return cls.from_db(None, names, [values[name] for name in names])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is None or from_queryset is not None or not deferred.issuperset(fields):
+            return super().refresh_from_db(using, fields, from_queryset)
+        from .authentication import cached_user_row
+        row = cached_user_row(self.pk)
+        if row is None:
+            raise self.DoesNotExist(f'User {self.pk} does not exist')
+        for name in deferred:
+            self.__dict__[name] = row[name]
+
+class JobRecommendation(models.Model):
+    """
+    The best matching active jobs for a user, computed offline by `manage.py
+    recommend_jobs` and read with one primary key lookup; see
+    jobseek/recommendations.py.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='job_recommendation')
+    jobs = models.JSONField(default=list)  # [job id, score] pairs, best first
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id}: {len(self.jobs)} jobs"
+
+
+class Change(models.Model):
+    """
+    One row per insert, update or delete of a job or company, written by
+    database triggers in the statement making the change, so bulk writes and
+    cascades are logged too and a rolled back change never is; see
+    jobseek/changes.py.
+    """
+    MODELS = (
+        ('job', 'Job'),
+        ('company', 'Company'),
+    )
+    ACTIONS = (
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+        ('pruned', 'Pruned'),  # Marks where the pruned history ends
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    # Id of the writing transaction on PostgreSQL, where ids are not handed out in commit order; 0 on SQLite
+    transaction_id = models.BigIntegerField(default=0)
+    model = models.CharField(max_length=10, choices=MODELS)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['transaction_id', 'id'], name='change_position_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} {self.action}"
+
+# Background task models, a queue of work done outside the request by `manage.py run_worker`
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    queue = models.CharField(max_length=50, default='default')
+    name = models.CharField(max_length=200)  # Registered task function
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    finished_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at', 'id'], name='task_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.status}]"
+
+
+class TaskQueue(models.Model):
+    # One row per queue, updated to serialize the claims of the workers on it
+    name = models.CharField(max_length=50, primary_key=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return self.name
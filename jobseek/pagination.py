@@ -0,0 +1,180 @@
+import json
+import operator
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite key, `(created_at, id)` by default.
+
+    Unlike DRF's CursorPagination, which positions on the first ordering field
+    and skips ties with an offset, the cursor stores the value of every
+    ordering field, so each page is a single index range scan whatever its
+    depth. The ordering of the queryset is used when it has one, which lets
+    ranked querysets page on `(rank, id)`.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE or 20
+
+    def get_cursor(self, request, queryset):
+        """
+        Reads the page size and cursor of a request for a queryset.
+
+        Returns:
+            tuple: The cursor position (None on the first page) and whether
+            the page is fetched backwards.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        return self.decode_cursor(request, queryset.model)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """Async counterpart of paginate_queryset, for views using the async ORM."""
+        return self.finish([instance async for instance in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """Returns the queryset of the requested page plus one row to detect more."""
+        position, reverse = self.get_cursor(request, queryset)
+        self.position, self.reverse = position, reverse
+
+        ordering = [(name, not descending) for name, descending in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*[('-' if descending else '') + name for name, descending in ordering])
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        return queryset[:self.page_size + 1]
+
+    def finish(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+        Returns the ordering as `(field name, descending)` pairs, always ending
+        with the primary key so that positions are unique.
+        """
+        ordering = [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in (queryset.query.order_by or self.ordering)
+            if isinstance(name, str)
+        ]
+        if not ordering:
+            ordering = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        if ordering[-1][0] not in ('id', 'pk'):
+            ordering.append(('id', ordering[-1][1]))
+        return ordering
+
+    @staticmethod
+    def after(ordering, position):
+        """
+        Builds the filter selecting the rows that come strictly after a
+        position, i.e. `(a, b) < (x, y)` for a descending ordering.
+
+        The expansion is `a <= x AND (a < x OR (a = x AND b < y))`; the leading
+        bound lets the database seek into the composite index instead of
+        walking it from the start.
+        """
+        name, descending = ordering[0]
+        bound = Q(**{f'{name}__{"lte" if descending else "gte"}': position[0]})
+        conditions = []
+        for index, (name, descending) in enumerate(ordering):
+            lookup = Q(**{f'{name}__{"lt" if descending else "gt"}': position[index]})
+            for earlier in range(index):
+                lookup &= Q(**{ordering[earlier][0]: position[earlier]})
+            conditions.append(lookup)
+        return bound & reduce(operator.or_, conditions)
+
+    def get_position(self, instance):
+        # isoformat() keeps the microseconds that DjangoJSONEncoder would drop
+        values = (getattr(instance, name) for name, _ in self.ordering)
+        return [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+
+    def encode_cursor(self, position, reverse=False):
+        payload = json.dumps({'p': position, 'r': int(reverse)})
+        cursor = urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            values, reverse = payload['p'], bool(payload['r'])
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [self.to_python(model, name, value) for (name, _), value in zip(self.ordering, values)]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    @staticmethod
+    def to_python(model, name, value):
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # Annotations such as a search rank are plain JSON numbers
+            return value
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,349 @@
+"""
+Free text locations resolved to the places of an offline gazetteer.
+
+data/gazetteer.tsv lists countries, Nigerian states, cities and districts
+with their coordinates and other names. A location is split on commas and
+every run of words matching a place name is a mention; the place resolved
+is the most specific mention whose other mentions are its ancestors, so
+"Ikeja, Lagos State" is Ikeja and "Lekki Phase 1, Lagos" is Lekki. Jobs
+and companies store the id, coordinates and geohash of their place.
+
+Searching by location matches the place and everything under it, the
+broadest place when a name is ambiguous, so "Lagos" finds the jobs in
+Ikeja. Radius and bounding box queries cover the area with geohash cells,
+read as index range scans; cells wholly inside are taken as they are and
+for the cells on the edge the distance is computed once per distinct
+geohash, not per row.
+"""
+import math
+import operator
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache, reduce
+
+from django.db.models import Q
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'gazetteer.tsv')
+
+# Least to most specific
+KINDS = ('country', 'state', 'city', 'district')
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# About 5 meters, stored for every located row
+PRECISION = 9
+
+# Most cells read by one area query; larger areas are covered by larger cells
+MAX_CELLS = 32
+
+MAX_RADIUS_KM = 1000
+
+POINT_RE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$')
+
+
+class PlaceQueryError(ValueError):
+    """Raised for an area query that cannot be understood."""
+    pass
+
+
+@dataclass(frozen=True)
+class Place:
+    id: str
+    parent: str  # Empty for countries
+    kind: str
+    name: str
+    latitude: float
+    longitude: float
+
+
+def normalize(text):
+    """Lowercase words without accents or punctuation, hyphens as spaces."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+
+
+class Gazetteer:
+    def __init__(self, path=GAZETTEER_PATH):
+        self.places = {}
+        self.children = {}
+        self.names = {}  # Normalized name to places
+        with open(path, encoding='utf-8') as lines:
+            rows = [line.rstrip('\n').split('\t') for line in lines if line.strip() and not line.startswith('#')]
+        for row in rows[1:]:
+            place_id, parent, kind, name, latitude, longitude = row[:6]
+            if parent and parent not in self.places:
+                raise ValueError(f'Place {place_id} is listed before its parent {parent}')
+            place = Place(place_id, parent, kind, name, float(latitude), float(longitude))
+            self.places[place_id] = place
+            self.children.setdefault(parent, []).append(place_id)
+            aliases = row[6].split('|') if len(row) > 6 and row[6] else []
+            for alias in [name, *aliases]:
+                places = self.names.setdefault(normalize(alias), [])
+                if place not in places:
+                    places.append(place)
+        self.longest = max(len(name.split()) for name in self.names)
+
+    def ancestors(self, place):
+        while place.parent:
+            place = self.places[place.parent]
+            yield place
+
+    def within(self, place):
+        """Ids of the place and of every place under it."""
+        ids, pending = [], [place.id]
+        while pending:
+            place_id = pending.pop()
+            ids.append(place_id)
+            pending.extend(self.children.get(place_id, ()))
+        return ids
+
+    def mentions(self, text):
+        """The places of every longest run of words naming one, per comma separated part."""
+        found = []
+        for part in text.split(','):
+            words = normalize(part).split()
+            start = 0
+            while start < len(words):
+                for length in range(min(self.longest, len(words) - start), 0, -1):
+                    places = self.names.get(' '.join(words[start:start + length]))
+                    if places:
+                        found.append(places)
+                        start += length
+                        break
+                else:
+                    start += 1
+        return found
+
+    def resolve(self, text, broad=False):
+        """
+        Returns the place of a free text location, None when nothing in it
+        names one.
+
+        Args:
+            text (str): The location.
+            broad (bool, optional): Between places of the same name with
+                the same support from the rest of the text, prefer the least
+                specific instead of the most.
+        """
+        mentions = self.mentions(text)
+        best, best_key = None, None
+        for index, places in enumerate(mentions):
+            for place in places:
+                ancestors = {ancestor.id for ancestor in self.ancestors(place)}
+                support = sum(
+                    1 for other, others in enumerate(mentions)
+                    if other != index and any(candidate.id in ancestors for candidate in others)
+                )
+                specific = KINDS.index(place.kind)
+                key = (support, -specific if broad else specific, -index)
+                if best_key is None or key > best_key:
+                    best, best_key = place, key
+        return best
+
+
+@lru_cache(maxsize=None)
+def gazetteer():
+    return Gazetteer()
+
+
+@lru_cache(maxsize=10_000)
+def resolve(text, broad=False):
+    return gazetteer().resolve(text, broad)
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """The geohash of a point."""
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            middle = (west + east) / 2
+            value = value << 1 | (longitude >= middle)
+            west, east = (middle, east) if longitude >= middle else (west, middle)
+        else:
+            middle = (south + north) / 2
+            value = value << 1 | (latitude >= middle)
+            south, north = (middle, north) if latitude >= middle else (south, middle)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """The `(south, west, north, east)` bounds of a geohash cell."""
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = value >> shift & 1
+            if even:
+                middle = (west + east) / 2
+                west, east = (middle, east) if bit else (west, middle)
+            else:
+                middle = (south + north) / 2
+                south, north = (middle, north) if bit else (south, middle)
+            even = not even
+    return south, west, north, east
+
+
+def decode(geohash):
+    """The centre of a geohash cell."""
+    south, west, north, east = bounds(geohash)
+    return (south + north) / 2, (west + east) / 2
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """Great circle distance between two points."""
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    half = (
+        math.sin((other_phi - phi) / 2) ** 2
+        + math.cos(phi) * math.cos(other_phi) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(half)))
+
+
+def location_fields(text):
+    """The place fields of a row with the given location, empty when it resolves to no place."""
+    place = resolve(text or '')
+    if place is None:
+        return {'place_id': '', 'latitude': None, 'longitude': None, 'geohash': ''}
+    return {
+        'place_id': place.id,
+        'latitude': place.latitude,
+        'longitude': place.longitude,
+        'geohash': encode(place.latitude, place.longitude),
+    }
+
+
+def locate(instance):
+    """Sets the place fields of a Job or Company from its location, returns whether they changed."""
+    fields = location_fields(instance.location)
+    changed = any(getattr(instance, name) != value for name, value in fields.items())
+    for name, value in fields.items():
+        setattr(instance, name, value)
+    return changed
+
+
+def cells(south, west, north, east):
+    """
+    The geohash cells covering a box, as long as there are at most MAX_CELLS
+    of them; boxes crossing the antimeridian are not supported.
+    """
+    for precision in range(PRECISION, 0, -1):
+        lon_bits = (5 * precision + 1) // 2
+        width, height = 360 / 2 ** lon_bits, 180 / 2 ** (5 * precision - lon_bits)
+        columns = range(int((west + 180) // width), int((min(east, 179.999999) + 180) // width) + 1)
+        rows = range(int((south + 90) // height), int((min(north, 89.999999) + 90) // height) + 1)
+        if len(columns) * len(rows) <= MAX_CELLS or precision == 1:
+            return [
+                encode(-90 + (row + 0.5) * height, -180 + (column + 0.5) * width, precision)
+                for row in rows for column in columns
+            ]
+
+
+def cell_filter(cells):
+    # Geohashes sort by prefix, '{' follows every base32 character
+    return reduce(operator.or_, (Q(geohash__gte=cell, geohash__lt=cell + '{') for cell in cells))
+
+
+def within_area(queryset, box, contains):
+    """
+    Narrows a Job or Company queryset to the rows whose point is in an area.
+
+    Args:
+        box (tuple): `(south, west, north, east)` bounds of the area.
+        contains (callable): Whether a `(latitude, longitude)` point is in
+            the area.
+    """
+    inside, edge = [], []
+    for cell in cells(*box):
+        south, west, north, east = bounds(cell)
+        corners = ((south, west), (south, east), (north, west), (north, east))
+        (inside if all(contains(*corner) for corner in corners) else edge).append(cell)
+    conditions = [cell_filter(inside)] if inside else []
+    if edge:
+        geohashes = (
+            queryset.model.objects.filter(cell_filter(edge)).exclude(geohash='')
+            .order_by().values_list('geohash', flat=True).distinct()
+        )
+        conditions.append(Q(geohash__in=[geohash for geohash in geohashes if contains(*decode(geohash))]))
+    return queryset.filter(reduce(operator.or_, conditions)) if conditions else queryset.none()
+
+
+def within_box(queryset, south, west, north, east):
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise PlaceQueryError('Expected south,west,north,east with south <= north and west <= east.')
+    return within_area(
+        queryset, (south, west, north, east),
+        lambda latitude, longitude: south <= latitude <= north and west <= longitude <= east,
+    )
+
+
+def within_radius(queryset, latitude, longitude, km):
+    if not 0 < km <= MAX_RADIUS_KM:
+        raise PlaceQueryError(f'The radius must be more than 0 and at most {MAX_RADIUS_KM} km.')
+    degrees = km / KM_PER_DEGREE
+    spread = degrees / max(math.cos(math.radians(latitude)), 0.01)
+    box = (max(latitude - degrees, -90.0), max(longitude - spread, -180.0),
+           min(latitude + degrees, 90.0), min(longitude + spread, 180.0))
+    return within_area(
+        queryset, box,
+        lambda other_latitude, other_longitude: distance_km(latitude, longitude, other_latitude, other_longitude) <= km,
+    )
+
+
+def in_place(queryset, place):
+    """Narrows a queryset to the rows located in a place or any place under it."""
+    return queryset.filter(place_id__in=gazetteer().within(place))
+
+
+def point(text):
+    """
+    Returns the `(latitude, longitude)` of "lat,lon" or of a place name.
+    """
+    match = POINT_RE.match(text)
+    if match:
+        latitude, longitude = float(match.group(1)), float(match.group(2))
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise PlaceQueryError('Latitude or longitude out of range.')
+        return latitude, longitude
+    place = resolve(text)
+    if place is None:
+        raise PlaceQueryError(f'Unknown place "{text}".')
+    return place.latitude, place.longitude
+
+
+def filter_area(queryset, near=None, radius=None, bbox=None):
+    """
+    Applies the area parameters of a request.
+
+    Args:
+        near (str, optional): "lat,lon" or a place name, the centre of the radius.
+        radius (str, optional): In kilometers, 50 by default.
+        bbox (str, optional): "south,west,north,east" in degrees.
+
+    Raises:
+        PlaceQueryError: For parameters that cannot be understood.
+    """
+    if near:
+        try:
+            km = float(radius) if radius else 50.0
+        except ValueError:
+            raise PlaceQueryError('The radius must be a number of kilometers.')
+        queryset = within_radius(queryset, *point(near), km)
+    if bbox:
+        try:
+            south, west, north, east = (float(value) for value in bbox.split(','))
+        except ValueError:
+            raise PlaceQueryError('Expected bbox=south,west,north,east in degrees.')
+        queryset = within_box(queryset, south, west, north, east)
+    return queryset
@@ -0,0 +1,393 @@
+"""
+Captures the SQL of the read endpoints of every viewset, explains it, flags
+full table scans, sorts and nested loops over scans, and proposes the
+indexes that fix them, checked by explaining again with the index created
+in a rolled back transaction.
+
+Plans come from EXPLAIN QUERY PLAN on SQLite and EXPLAIN (FORMAT JSON) on
+PostgreSQL. SQLite plans carry no cost, so their cost is the measured time
+of the statement in milliseconds; PostgreSQL costs are the planner's.
+"""
+import re
+import time
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import connection, models, transaction
+from django.db.models.functions import Upper
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+# Query parameters of the custom actions that need some, formatted with sample ids
+ACTION_PARAMS = {
+    'job-search': {'q': 'engineer'},
+    'job-match': {'skills': 'Python'},
+    'job-facets': {'q': 'engineer'},
+    'application-search': {'company': '{company}', 'q': 'python'},
+    'transaction-statement': {'output': 'ndjson'},
+}
+
+# Smallest cost saving worth an index when it resolves no finding
+MIN_SAVING = 1.0
+
+# Inner loops of a nested loop join over more rows than this are flagged on PostgreSQL
+NESTED_LOOP_ROWS = 100_000
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+PREDICATE = re.compile(
+    r'(?:UPPER\()?(?:"?(?P<alias>\w+)"?\.)"(?P<column>\w+)"(?:::text)?\)?\s*'
+    r'(?P<operator>=|IN\b|IS\b|LIKE\b|BETWEEN\b|>=|<=|>|<)\s*(?:UPPER\()?(?P<value>\'[^\']*\'|\S+)?'
+)
+# A boolean column tested on its own, `"jobseek_job"."is_active" AND ...`
+FLAG = re.compile(r'(?:"?(?P<alias>\w+)"?\.)"(?P<column>\w+)"(?=\s*(?:AND\b|OR\b|ORDER\b|LIMIT\b|\)|$))')
+ORDERING = re.compile(r'(?:"?(?P<alias>\w+)"?\.)"(?P<column>\w+)"\s*(?P<direction>ASC|DESC)')
+TABLE_ALIAS = re.compile(r'(?:FROM|JOIN)\s+"(?P<table>\w+)"(?:\s+(?:AS\s+)?(?P<alias>[A-Z]\d+))?')
+
+
+@dataclass
+class Finding:
+    kind: str  # scan, sort or nested-loop
+    table: str
+    detail: str
+
+
+@dataclass
+class Plan:
+    lines: list
+    cost: float
+    findings: list
+
+
+@dataclass
+class Statement:
+    sql: str
+    endpoints: set = field(default_factory=set)
+    plan: Plan = None
+
+
+@dataclass
+class Recommendation:
+    model: type
+    index: models.Index
+    statements: list
+    before: float = 0.0
+    after: float = 0.0
+    resolved: int = 0  # Findings that disappear with the index
+    trigram: bool = False
+
+    @property
+    def useful(self):
+        saving = self.before - self.after
+        return self.resolved > 0 or (saving > self.before * 0.2 and saving >= MIN_SAVING)
+
+
+def table_models():
+    return {model._meta.db_table: model for model in apps.get_models()}
+
+
+# Capture
+
+def iter_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def sample_ids():
+    """A row from the middle of each table, what detail endpoints and filters are called with."""
+    ids = {}
+    for table, model in table_models().items():
+        bounds = model.objects.aggregate(low=models.Min('pk'), high=models.Max('pk'))
+        if bounds['low'] is None or not isinstance(bounds['low'], int):
+            continue
+        middle = (bounds['low'] + bounds['high']) // 2
+        ids[model._meta.model_name] = model.objects.filter(pk__gte=middle).order_by('pk').values_list('pk', flat=True).first()
+    return ids
+
+
+def read_endpoints(only=None):
+    """
+    Yields `(name, viewset, action, path)` for the GET actions of the
+    routed viewsets, detail ones with the id of a row from the middle of
+    the table.
+    """
+    ids = sample_ids()
+    seen = set()
+    for pattern in iter_patterns(get_resolver().url_patterns):
+        view = pattern.callback
+        viewset, actions = getattr(view, 'cls', None), getattr(view, 'actions', None)
+        if viewset is None or not actions or 'get' not in actions or pattern.name in seen:
+            continue
+        if only and not any(name in pattern.name for name in only):
+            continue
+        kwargs = set(pattern.pattern.regex.groupindex)
+        if kwargs - {'pk', 'format'} or 'format' in kwargs:
+            continue
+        seen.add(pattern.name)
+        if 'pk' in kwargs:
+            model = getattr(viewset.queryset, 'model', None)
+            if model is None or model._meta.model_name not in ids:
+                continue
+            path = reverse(pattern.name, kwargs={'pk': ids[model._meta.model_name]})
+        else:
+            path = reverse(pattern.name)
+        params = {key: value.format(**ids) for key, value in ACTION_PARAMS.get(pattern.name, {}).items()}
+        yield pattern.name, view, path, params
+
+
+def capture(user, only=None):
+    """
+    Calls every read endpoint as `user`, with the response cache off, and
+    returns the distinct SELECT statements they ran, with the endpoints
+    running each.
+    """
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    statements, endpoints = {}, []
+    with override_settings(CACHES=NO_CACHE):
+        for name, view, path, params in read_endpoints(only):
+            request = factory.get(path, params)
+            force_authenticate(request, user)
+            match = get_resolver().resolve(path)
+            with CaptureQueriesContext(connection) as queries:
+                try:
+                    response = view(request, **match.kwargs)
+                    if getattr(response, 'streaming', False):
+                        for _ in response.streaming_content:
+                            pass
+                    elif hasattr(response, 'render'):
+                        response.render()
+                    outcome = response.status_code
+                except Exception as error:
+                    outcome = f'{type(error).__name__}: {error}'
+            selects = [query['sql'] for query in queries if query['sql'].lstrip().upper().startswith('SELECT')]
+            endpoints.append((name, path, outcome, len(queries)))
+            for sql in selects:
+                statements.setdefault(sql, Statement(sql)).endpoints.add(name)
+    return endpoints, list(statements.values())
+
+
+# Plans
+
+def aliases(sql):
+    """Maps the table names and aliases of a statement to table names."""
+    names = {}
+    for match in TABLE_ALIAS.finditer(sql):
+        names[match['table']] = match['table']
+        if match['alias']:
+            names[match['alias']] = match['table']
+    return names
+
+
+def top_n(sql):
+    return ' WHERE ' not in sql and re.search(r' LIMIT \d+$', sql) is not None
+
+
+def ordered_table(sql):
+    """The table of the first column of the outermost ORDER BY, '' if there is none."""
+    if ' ORDER BY ' not in sql:
+        return ''
+    match = ORDERING.search(sql.rsplit(' ORDER BY ', 1)[1])
+    return aliases(sql).get(match['alias'], '') if match else ''
+
+
+class Explainer:
+    def __init__(self, min_rows=1000):
+        self.min_rows = min_rows
+        self.row_counts = {}
+
+    def rows(self, table):
+        if table not in self.row_counts:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                self.row_counts[table] = cursor.fetchone()[0]
+        return self.row_counts[table]
+
+    def large(self, table):
+        return table in table_models() and self.rows(table) >= self.min_rows
+
+    def explain(self, sql):
+        if connection.vendor == 'postgresql':
+            return self.explain_postgresql(sql)
+        return self.explain_sqlite(sql)
+
+    def explain_sqlite(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            rows = cursor.fetchall()
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                cursor.execute(sql)
+                cursor.fetchall()
+                timings.append(time.perf_counter() - started)
+
+        names = aliases(sql)
+        depth, children, findings, lines = {0: -1}, {}, [], []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+            words = detail.split()
+            if words[0] in ('SCAN', 'SEARCH') and len(words) > 1:
+                # Later loops of a join run once per row of the earlier ones
+                position = children.setdefault(parent, 0)
+                children[parent] += 1
+                table = names.get(words[1], words[1])
+                if words[0] == 'SCAN' and 'USING' not in words and 'VIRTUAL' not in words and self.large(table):
+                    kind = 'nested-loop' if position > 0 else 'scan'
+                    findings.append(Finding(kind, table, detail))
+            elif detail.startswith('USE TEMP B-TREE FOR ORDER BY'):
+                findings.append(Finding('sort', ordered_table(sql), detail))
+        if top_n(sql) and not any(finding.kind == 'sort' for finding in findings):
+            # An unfiltered scan in key order stops after the page
+            findings = [finding for finding in findings if finding.kind != 'scan']
+        return Plan(lines, round(min(timings) * 1000, 2), findings)
+
+    def explain_postgresql(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            document = cursor.fetchone()[0]
+        root = document[0]['Plan']
+        findings, lines = [], []
+
+        def walk(node, depth):
+            kind = node['Node Type']
+            relation = node.get('Relation Name', '')
+            lines.append(f'{"  " * depth}{kind} {relation} (cost={node["Total Cost"]} rows={node["Plan Rows"]})'.replace('  (', ' ('))
+            if kind == 'Seq Scan' and self.large(relation):
+                findings.append(Finding('scan', relation, f'Seq Scan on {relation}'))
+            elif kind in ('Sort', 'Incremental Sort'):
+                findings.append(Finding('sort', ordered_table(sql), f'Sort on {", ".join(node.get("Sort Key", []))}'))
+            elif kind == 'Nested Loop' and len(node.get('Plans', [])) == 2:
+                outer, inner = node['Plans']
+                if outer['Plan Rows'] * inner['Plan Rows'] > NESTED_LOOP_ROWS and 'Index' not in inner['Node Type']:
+                    findings.append(Finding(
+                        'nested-loop', inner.get('Relation Name', ''),
+                        f'Nested Loop of {outer["Plan Rows"]} x {inner["Plan Rows"]} rows',
+                    ))
+            for child in node.get('Plans', []):
+                walk(child, depth + 1)
+
+        walk(root, 0)
+        return Plan(lines, root['Total Cost'], findings)
+
+
+# Recommendations
+
+def existing_prefixes(model):
+    """The leading fields of the indexes the table already has."""
+    prefixes = [tuple(index.fields) for index in model._meta.indexes]
+    prefixes += [(model._meta.pk.name,)]
+    for model_field in model._meta.concrete_fields:
+        if model_field.db_index or model_field.unique or model_field.is_relation:
+            prefixes.append((model_field.name,))
+    for constraint in model._meta.constraints:
+        if isinstance(constraint, models.UniqueConstraint) and constraint.fields:
+            prefixes.append(tuple(constraint.fields))
+    return [tuple(name.lstrip('-') for name in prefix) for prefix in prefixes]
+
+
+def candidate(sql, table, model):
+    """
+    Proposes an index for the filters and ordering of a statement on one
+    table: equality columns first, then one range column, then the ordering
+    when the statement orders by that table only. Returns `(fields,
+    trigram)`, `trigram` for a contains filter that only a trigram index
+    serves, or None.
+    """
+    names = {alias for alias, name in aliases(sql).items() if name == table} | {table}
+    columns = {model_field.column: model_field.name for model_field in model._meta.concrete_fields}
+    where = re.split(r'\bORDER BY\b', sql.split(' WHERE ', 1)[1], maxsplit=1)[0] if ' WHERE ' in sql else ''
+    if ' OR ' in where:
+        return None  # Each side of an OR needs its own index
+    equal, ranges, contains = [], [], []
+    for match in PREDICATE.finditer(where):
+        if match['alias'] not in names or match['column'] not in columns:
+            continue
+        name, operator, value = columns[match['column']], match['operator'], match['value'] or ''
+        if value.startswith('"'):
+            continue  # A join condition, served by the index of the other side
+        if operator == 'LIKE':
+            (contains if value.startswith("'%") else ranges).append(name)
+        elif operator in ('=', 'IN', 'IS'):
+            equal.append(name)
+        else:
+            ranges.append(name)
+    flags = {
+        model_field.column for model_field in model._meta.concrete_fields if isinstance(model_field, models.BooleanField)
+    }
+    for match in FLAG.finditer(where):
+        if match['alias'] in names and match['column'] in flags:
+            equal.append(columns[match['column']])
+
+    ordering = [(match['alias'], match['column'], match['direction'])
+                for match in ORDERING.finditer(sql.rsplit(' ORDER BY ', 1)[1] if ' ORDER BY ' in sql else '')]
+    order_fields = []
+    if ordering and all(alias in names and column in columns for alias, column, _ in ordering):
+        order_fields = [columns[column] for _, column, _ in ordering]
+
+    fields = list(dict.fromkeys(equal))
+    if ranges and ranges[0] not in fields:
+        fields.append(ranges[0])
+    elif not ranges:
+        fields += [name for name in order_fields if name not in fields]
+    if not fields and contains:
+        return (contains[0],), True
+    return (tuple(fields), False) if fields else None
+
+
+def recommend(statements, explainer):
+    """
+    Groups the proposed indexes of the flagged statements and measures each
+    by explaining its statements again with the index created in a rolled
+    back transaction.
+    """
+    models_by_table = table_models()
+    proposals = {}
+    for statement in statements:
+        for finding in statement.plan.findings:
+            model = models_by_table.get(finding.table)
+            proposal = candidate(statement.sql, finding.table, model) if model else None
+            if proposal is None:
+                continue
+            fields, trigram = proposal
+            if trigram and connection.vendor != 'postgresql':
+                continue  # SQLite cannot index a contains filter, the full-text index serves those
+            if not trigram and any(prefix[:len(fields)] == fields for prefix in existing_prefixes(model)):
+                continue
+            key = (model, fields, trigram)
+            if statement not in proposals.setdefault(key, []):
+                proposals[key].append(statement)
+
+    recommendations = []
+    for (model, fields, trigram), flagged in proposals.items():
+        index = trigram_index(model, fields) if trigram else models.Index(fields=list(fields), name='')
+        if not trigram:
+            index.set_name_with_model(model)
+        recommendation = Recommendation(model, index, flagged, trigram=trigram)
+        recommendation.before = sum(statement.plan.cost for statement in flagged)
+        before_findings = sum(len(statement.plan.findings) for statement in flagged)
+        after_findings = 0
+        # Not entered: the SQLite schema editor refuses to run in a transaction
+        editor = connection.schema_editor(collect_sql=True)
+        with transaction.atomic(), connection.cursor() as cursor:
+            if trigram:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(str(index.create_sql(model, editor)))
+            for statement in flagged:
+                plan = explainer.explain(statement.sql)
+                recommendation.after += plan.cost
+                after_findings += len(plan.findings)
+            transaction.set_rollback(True)
+        recommendation.resolved = before_findings - after_findings
+        recommendations.append(recommendation)
+    return recommendations
+
+
+def trigram_index(model, fields):
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    name = f'{model._meta.db_table[:16]}_{fields[0][:6]}_trgm'[:30]
+    return GinIndex(OpClass(Upper(fields[0]), name='gin_trgm_ops'), name=name)
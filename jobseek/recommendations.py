@@ -0,0 +1,276 @@
+"""
+Job recommendations from the skills of the jobs a user applied to.
+
+Jobs are sparse vectors over skills, each skill weighted by its inverse
+document frequency among active jobs and every vector scaled to unit
+length, so rare skills count more than the ones every job lists. A user's
+profile is the normalized sum of the vectors of the jobs they applied to,
+and the recommendations are the active jobs with the highest cosine
+similarity to it, leaving out the ones already applied to.
+
+`manage.py recommend_jobs` holds the matrix of all active jobs in flat
+arrays and stores the top jobs of every user with applications in one row,
+so serving them is a primary key lookup. With a few dozen skills per
+profile and a few per job, scoring every job sharing a skill with a profile
+would read most of the matrix for every user; the search in
+SkillMatrix.top visits the skill sets that can still beat the jobs found
+instead, and `manage.py bench_recommendations` measures it against scoring
+every job.
+
+Users without stored recommendations, new users or ones who applied since
+the last run, are scored on the fly against the newest active jobs sharing
+their strongest skills, with the document frequencies of the facet counts.
+"""
+import heapq
+import math
+from array import array
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Sum
+
+from .models import Application, FacetCount, JobRecommendation, JobSkill
+
+
+def idf(total, frequency):
+    """Smoothed inverse document frequency, positive even for skills every job has."""
+    return math.log((1 + total) / (1 + frequency)) + 1
+
+
+def profile_vector(skill_lists, weight):
+    """
+    Returns the unit profile vector, `{skill id: weight}`, of a user.
+
+    Args:
+        skill_lists (iterable): The skill ids of every job the user applied to.
+        weight (callable): Returns the idf of a skill id.
+    """
+    profile = {}
+    for skills in skill_lists:
+        skills = set(skills)
+        norm = math.sqrt(sum(weight(skill) ** 2 for skill in skills))
+        for skill in skills:
+            profile[skill] = profile.get(skill, 0.0) + weight(skill) / norm
+    length = math.sqrt(sum(value * value for value in profile.values()))
+    return {skill: value / length for skill, value in profile.items()} if length else {}
+
+
+def user_profiles(emails):
+    """
+    Reads what the users with the given emails applied to in one query.
+
+    Returns:
+        dict: `{email: (applied job ids, [skill ids of each application])}`,
+            only for the emails with applications.
+    """
+    rows = (
+        Application.objects.filter(applicant_email__in=emails)
+        .order_by('applicant_email', 'id')
+        .values_list('applicant_email', 'id', 'job_id', 'job__jobskill__skills_id')
+    )
+    profiles = {}
+    for (email, _, job_id), skills in groupby(rows, key=lambda row: row[:3]):
+        applied, skill_lists = profiles.setdefault(email, (set(), []))
+        applied.add(job_id)
+        skill_lists.append([row[3] for row in skills if row[3] is not None])
+    return profiles
+
+
+class SkillMatrix:
+    """
+    The skills of all active jobs, held in flat arrays, with the jobs grouped
+    by skill set: jobs with the same skills have the same score, so the
+    search is over the skill sets a profile could match rather than the jobs.
+    """
+
+    def __init__(self, jobs):
+        """
+        Args:
+            jobs (iterable): `(job id, skill ids)` pairs, once per job, in
+                ascending job id order.
+        """
+        self.job_ids = array('q')
+        self.offsets = array('i', [0])
+        self.skills = array('q')
+        self.bits = {}  # Bit of each skill in the skill set masks
+        self.signatures = {}  # Job ids by skill set mask
+        self.postings = {}  # Rows by skill
+        self.largest = 0  # Most skills of a job
+        for job_id, skill_ids in jobs:
+            skill_ids = set(skill_ids)
+            if not skill_ids:
+                continue
+            row = len(self.job_ids)
+            mask = 0
+            for skill in skill_ids:
+                if skill not in self.bits:
+                    self.bits[skill] = 1 << len(self.bits)
+                    self.postings[skill] = array('i')
+                mask |= self.bits[skill]
+                self.postings[skill].append(row)
+            self.signatures.setdefault(mask, array('q')).append(job_id)
+            self.job_ids.append(job_id)
+            self.skills.extend(skill_ids)
+            self.offsets.append(len(self.skills))
+            self.largest = max(self.largest, len(skill_ids))
+        total = len(self.job_ids)
+        self.weights = {skill: idf(total, len(rows)) for skill, rows in self.postings.items()}
+        self.unknown_weight = idf(total, 0)
+
+    @classmethod
+    def load(cls, chunk_size=10_000):
+        """Reads the skills of every active job, streaming them in job order."""
+        rows = (
+            JobSkill.objects.filter(job__is_active=True).order_by('job_id')
+            .values_list('job_id', 'skills_id').iterator(chunk_size=chunk_size)
+        )
+        return cls((job_id, [row[1] for row in group]) for job_id, group in groupby(rows, key=lambda row: row[0]))
+
+    def __len__(self):
+        return len(self.job_ids)
+
+    def weight(self, skill):
+        return self.weights.get(skill, self.unknown_weight)
+
+    def score(self, row, profile):
+        """The cosine similarity of the job in a row with a profile."""
+        dot = norm = 0.0
+        for skill in self.skills[self.offsets[row]:self.offsets[row + 1]]:
+            weight = self.weights[skill]
+            dot += profile.get(skill, 0.0) * weight
+            norm += weight * weight
+        return dot / math.sqrt(norm)
+
+    def top(self, profile, k, exclude=(), max_skill_sets=None):
+        """
+        Returns the `k` active jobs most similar to a profile, as `(job id,
+        score)` pairs best first, newest first among equal scores.
+
+        The skill sets made of profile skills are searched depth first,
+        strongest skills first. A set with cosine `c` extended by skills
+        whose profile weights square to `m` scores at most `sqrt(c² + m)`, so
+        a branch is dropped once that bound cannot beat the `k`th job found.
+        Jobs with a skill the profile lacks are not searched: the extra skill
+        only lengthens them. Profiles too narrow to fill the list are
+        completed with the newest jobs sharing their strongest skills.
+
+        Args:
+            profile (dict): A unit profile vector.
+            k (int): How many jobs to return.
+            exclude (set, optional): Job ids to leave out.
+            max_skill_sets (int, optional): Skill sets visited at most, after
+                which the best jobs found are returned.
+        """
+        max_skill_sets = max_skill_sets or settings.RECOMMENDATIONS_MAX_SKILL_SETS
+        ranked = sorted((skill for skill in profile if skill in self.bits), key=profile.get, reverse=True)
+        values = [profile[skill] for skill in ranked]
+        weights = [self.weights[skill] for skill in ranked]
+        bits = [self.bits[skill] for skill in ranked]
+        # Profile weights squared, summed up to each rank
+        mass = [0.0]
+        for value in values:
+            mass.append(mass[-1] + value * value)
+        count, largest, signatures = len(ranked), self.largest, self.signatures
+        best = []
+        visited = 0
+
+        def search(start, mask, dot, norm, size):
+            nonlocal visited
+            squared = dot * dot / norm if norm else 0.0  # Cosine of the set, squared
+            room = largest - size
+            for index in range(start, count):
+                floor = best[0][0] if len(best) == k else 0.0
+                if visited >= max_skill_sets or squared + mass[min(index + room, count)] - mass[index] <= floor * floor:
+                    return
+                visited += 1
+                subset = mask | bits[index]
+                subset_dot = dot + values[index] * weights[index]
+                subset_norm = norm + weights[index] * weights[index]
+                score = subset_dot / math.sqrt(subset_norm)
+                if score > floor:
+                    for job_id in reversed(signatures.get(subset, ())):
+                        if job_id in exclude:
+                            continue
+                        if len(best) < k:
+                            heapq.heappush(best, (score, job_id))
+                        elif (score, job_id) > best[0]:
+                            heapq.heapreplace(best, (score, job_id))
+                        else:
+                            break
+                if room > 1:
+                    search(index + 1, subset, subset_dot, subset_norm, size + 1)
+
+        search(0, 0, 0.0, 0.0, 0)
+        if len(best) < k:
+            taken = {job_id for _, job_id in best}
+            for skill in ranked:
+                for row in reversed(self.postings[skill]):
+                    if len(best) == k:
+                        break
+                    job_id = self.job_ids[row]
+                    if job_id not in taken and job_id not in exclude:
+                        taken.add(job_id)
+                        heapq.heappush(best, (self.score(row, profile), job_id))
+        return [(job_id, score) for score, job_id in sorted(best, reverse=True)]
+
+
+def live_recommendations(email, k, candidates=None):
+    """
+    Scores the newest active jobs sharing a skill with the strongest ones of a
+    user's profile, for users without stored recommendations. The document
+    frequencies come from the facet counts.
+
+    Returns:
+        list: `(job id, score)` pairs best first, empty without applications.
+    """
+    candidates = candidates or settings.RECOMMENDATIONS_LIVE_CANDIDATES
+    applied, skill_lists = user_profiles([email]).get(email, ((), ()))
+    if not skill_lists:
+        return []
+    total = FacetCount.objects.filter(facet='job_type').aggregate(total=Sum('count'))['total'] or 0
+    frequencies = {
+        int(value): count
+        for value, count in FacetCount.objects.filter(facet='skill').values_list('value', 'count')
+    }
+
+    def weight(skill):
+        return idf(total, frequencies.get(skill, 0))
+
+    profile = profile_vector(skill_lists, weight)
+    strongest = sorted(profile, key=profile.get, reverse=True)[:3]
+    job_ids = list(
+        JobSkill.objects.filter(skills_id__in=strongest, job__is_active=True)
+        .exclude(job_id__in=applied).order_by('-job_id')
+        .values_list('job_id', flat=True).distinct()[:candidates]
+    )
+    rows = JobSkill.objects.filter(job_id__in=job_ids).order_by('job_id').values_list('job_id', 'skills_id')
+    scored = []
+    for job_id, group in groupby(rows, key=lambda row: row[0]):
+        skills = {row[1] for row in group}
+        norm = math.sqrt(sum(weight(skill) ** 2 for skill in skills))
+        scored.append((sum(profile.get(skill, 0.0) * weight(skill) for skill in skills) / norm, job_id))
+    return [(job_id, score) for score, job_id in heapq.nlargest(k, scored)]
+
+
+def recommendations_for(user, k=None):
+    """
+    Returns `(source, computed_at, [(job id, score)])` for a user: the stored
+    recommendations when there are some, else ones scored on the fly.
+    """
+    k = k or settings.RECOMMENDATIONS_TOP_K
+    stored = JobRecommendation.objects.filter(user_id=user.pk).values_list('jobs', 'computed_at').first()
+    if stored is not None:
+        return 'stored', stored[1], [tuple(pair) for pair in stored[0][:k]]
+    return 'live', None, live_recommendations(user.email, k)
+
+
+def active_jobs(queryset, scored):
+    """The jobs of `(job id, score)` pairs still active, in order, with a `score` attribute."""
+    jobs = queryset.filter(id__in=[job_id for job_id, _ in scored], is_active=True).in_bulk()
+    result = []
+    for job_id, score in scored:
+        job = jobs.get(job_id)
+        if job is not None:
+            job.score = round(score, 4)
+            result.append(job)
+    return result
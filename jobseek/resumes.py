@@ -0,0 +1,244 @@
+"""
+Text extraction from uploaded resumes, run by the background workers so
+recruiters can search applications by what their resumes say.
+
+DOCX and plain text resumes are read with the standard library, DOCX being
+a zip of WordprocessingML. PDFs are read with pypdf, which decodes the
+stream filters and font encodings a page can use.
+"""
+import codecs
+import re
+import unicodedata
+import zipfile
+from io import BytesIO
+from xml.etree import ElementTree
+
+import pypdf
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Application, ResumeDocument, Skill
+from .tasks import task
+
+
+class ExtractionError(Exception):
+    """Raised for a resume whose text cannot be read."""
+    pass
+
+
+# Plain text
+
+def extract_txt(data):
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return data.decode('utf-16', errors='replace')
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('cp1252', errors='replace')
+
+
+# DOCX
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCX_PARTS = re.compile(r'word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml')
+
+
+def extract_docx(data):
+    try:
+        archive = zipfile.ZipFile(BytesIO(data))
+    except zipfile.BadZipFile as error:
+        raise ExtractionError('Not a DOCX file') from error
+    parts = [info for info in archive.infolist() if DOCX_PARTS.fullmatch(info.filename)]
+    if not parts:
+        raise ExtractionError('DOCX file without a document')
+    text = []
+    for info in parts:
+        # The declared sizes guard against zip bombs before anything is inflated
+        if info.file_size > settings.RESUME_TEXT_MAX_INPUT:
+            raise ExtractionError('DOCX document too large')
+        with archive.open(info) as part:
+            try:
+                for _, element in ElementTree.iterparse(part):
+                    if element.tag == WORD_NAMESPACE + 't':
+                        text.append(element.text or '')
+                    elif element.tag == WORD_NAMESPACE + 'tab':
+                        text.append('\t')
+                    elif element.tag in (WORD_NAMESPACE + 'br', WORD_NAMESPACE + 'cr', WORD_NAMESPACE + 'p'):
+                        text.append('\n')
+                        element.clear()
+            except ElementTree.ParseError as error:
+                raise ExtractionError('Malformed DOCX document') from error
+    return ''.join(text)
+
+
+# PDF
+
+def extract_pdf(data):
+    if not data.startswith(b'%PDF'):
+        raise ExtractionError('Not a PDF file')
+    try:
+        reader = pypdf.PdfReader(BytesIO(data))
+        if reader.is_encrypted:
+            raise ExtractionError('Encrypted PDF file')
+        return '\n'.join(page.extract_text() or '' for page in reader.pages)
+    except pypdf.errors.PyPdfError as error:
+        raise ExtractionError('Malformed PDF file') from error
+
+
+EXTRACTORS = {
+    'pdf': extract_pdf,
+    'docx': extract_docx,
+    'txt': extract_txt,
+}
+
+
+def extract_text(name, data):
+    """
+    Returns the normalized text of a resume.
+
+    Args:
+        name (str): File name, its extension picks the format.
+        data (bytes): Content of the file.
+
+    Raises:
+        ExtractionError: For an unsupported or unreadable file.
+    """
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    extractor = EXTRACTORS.get(extension)
+    if extractor is None:
+        raise ExtractionError(f'Unsupported resume format {extension or name}')
+    return normalize(extractor(data))
+
+
+# Normalization and skill matching
+
+SPACES_RE = re.compile(r'[^\S\n]+')
+BLANK_LINES_RE = re.compile(r'\n\s*\n\s*')
+SKILL_TOKEN_RE = re.compile(r'\w[\w+#]*(?:[.\-]\w[\w+#]*)*')
+
+
+def normalize(text):
+    """
+    NFKC normalizes the text, drops control characters and collapses runs
+    of whitespace, capped at RESUME_TEXT_MAX_LENGTH characters.
+    """
+    text = unicodedata.normalize('NFKC', text)
+    text = ''.join(
+        character for character in text
+        if character in '\n\t' or unicodedata.category(character)[0] != 'C'
+    )
+    text = SPACES_RE.sub(' ', text)
+    text = BLANK_LINES_RE.sub('\n\n', text)
+    return '\n'.join(line.strip() for line in text.split('\n')).strip()[:settings.RESUME_TEXT_MAX_LENGTH]
+
+
+def skill_tokens(text):
+    return tuple(token.lower() for token in SKILL_TOKEN_RE.findall(text))
+
+
+def match_skills(text, skills):
+    """
+    Returns the ids of the skills whose name appears in the text as whole
+    words, e.g. "Go" in "Go, Python" but not in "Google".
+
+    Args:
+        text (str): Normalized resume text.
+        skills (iterable): `(id, name)` pairs.
+    """
+    phrases = {}
+    for skill_id, name in skills:
+        tokens = skill_tokens(name)
+        if tokens:
+            phrases.setdefault(tokens, []).append(skill_id)
+    if not phrases:
+        return []
+    longest = max(len(tokens) for tokens in phrases)
+    words = skill_tokens(text)
+    found = set()
+    for start in range(len(words)):
+        for length in range(1, min(longest, len(words) - start) + 1):
+            found.update(phrases.get(words[start:start + length], ()))
+    return sorted(found)
+
+
+# Documents
+
+def write_document(application, text='', source='', error='', skills=()):
+    """
+    Creates or replaces the search document of an application.
+
+    Args:
+        application (Application): The application.
+        text (str, optional): Normalized resume text.
+        source (str, optional): Name of the resume the text comes from.
+        error (str, optional): Why no text could be extracted.
+        skills (iterable, optional): `(id, name)` pairs of the skills found.
+    """
+    skills = list(skills)
+    now = timezone.now()
+    document = ResumeDocument(
+        application=application,
+        source=source,
+        applicant=f'{application.applicant_name} {application.applicant_email}',
+        skills=' '.join(name for _, name in skills),
+        cover_letter=application.cover_letter,
+        text=text,
+        error=error[:255],
+        extracted_at=now if source else None,
+        updated_at=now,
+    )
+    with transaction.atomic():
+        # An upsert, so the transaction starts with a write
+        ResumeDocument.objects.bulk_create(
+            [document], update_conflicts=True, unique_fields=['application'],
+            update_fields=['source', 'applicant', 'skills', 'cover_letter', 'text', 'error', 'extracted_at',
+                           'updated_at'],
+        )
+        document.matched_skills.set([skill_id for skill_id, _ in skills])
+    return document
+
+
+def refresh_fields(application):
+    """
+    Copies the applicant and cover letter of an application to its search
+    document, without extracting the resume again.
+
+    Returns:
+        bool: Whether the application has a document.
+    """
+    return bool(ResumeDocument.objects.filter(application=application).update(
+        applicant=f'{application.applicant_name} {application.applicant_email}',
+        cover_letter=application.cover_letter,
+        updated_at=timezone.now(),
+    ))
+
+
+def index_application(application):
+    """
+    Extracts the resume of an application and writes its search document.
+    A resume that cannot be read is indexed without text and the reason is
+    recorded; storage errors are raised so the task is retried.
+    """
+    name = application.resume.name
+    text, error = '', ''
+    if name:
+        with application.resume.storage.open(name, 'rb') as resume:
+            data = resume.read(settings.RESUME_UPLOAD_MAX_SIZE + 1)
+        try:
+            if len(data) > settings.RESUME_UPLOAD_MAX_SIZE:
+                raise ExtractionError('Resume too large')
+            text = extract_text(name, data)
+        except ExtractionError as exception:
+            error = str(exception)
+    names = dict(Skill.objects.values_list('id', 'name'))
+    skills = [(skill_id, names[skill_id]) for skill_id in match_skills(text, names.items())]
+    return write_document(application, text=text, source=name, error=error, skills=skills)
+
+
+@task(queue='resumes')
+def extract_resume(application_id):
+    application = Application.objects.filter(pk=application_id).first()
+    if application is None:
+        return  # Withdrawn before the task ran
+    index_application(application)
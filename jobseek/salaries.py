@@ -0,0 +1,313 @@
+"""
+Salary percentiles and averages of the active jobs, overall and per skill,
+experience level, job type and location, without reading the job table.
+
+Every group keeps a histogram of its salaries in logarithmic buckets,
+bucket `i` holding the salaries in `(γ^(i-1), γ^i]` with `γ = (1 + α) /
+(1 - α)`, as the number and the sum of the salaries in each bucket. These
+are the SalaryBucket rows. The signals add the salary of a job to its
+groups and take it back out when the job is edited, deactivated or deleted;
+histograms add up, so `manage.py rebuild_salaries` reads the jobs in chunks
+and merges the histogram of every chunk. The location groups are the place
+of a job and every place above it, so Lagos State includes Ikeja.
+
+Accuracy: counts and averages are exact. A percentile is the salary at its
+nearest rank, estimated by the centre `2γ^i / (γ + 1)` of the bucket holding
+that rank, which is within the relative error α of the actual salary
+whatever the distribution: with SALARY_ACCURACY at 0.01, a median of
+500,000 is reported between 495,000 and 505,000. The minimum and maximum
+have the same bound. Salaries of zero or less share a bucket reported as 0.
+`manage.py bench_salaries` measures the latency and the error against
+sorting the jobs.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from . import caching, places
+from .models import EXPERIENCE_LEVEL_CHOICES, JOB_TYPE_CHOICES, Job, JobSkill, SalaryBucket, Skill
+
+CACHE_PREFIX = 'jobseek:salaries:'
+CACHE_TIMEOUT = 60 * 60
+
+# Bucket of the salaries of zero or less
+ZERO_BUCKET = -(2 ** 31)
+
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+
+# Groups by facet, the order of the filters of the API
+FACETS = ('skill', 'experience_level', 'job_type', 'location')
+
+CHOICE_LABELS = {
+    'job_type': dict(JOB_TYPE_CHOICES),
+    'experience_level': dict(EXPERIENCE_LEVEL_CHOICES),
+}
+
+
+class SalaryQueryError(ValueError):
+    """Raised for salary analytics parameters that cannot be understood."""
+    pass
+
+
+def gamma():
+    accuracy = settings.SALARY_ACCURACY
+    return (1 + accuracy) / (1 - accuracy)
+
+
+def bucket(salary, log_gamma=None):
+    """The histogram bucket of a salary."""
+    if salary <= 0:
+        return ZERO_BUCKET
+    return math.ceil(math.log(salary) / (log_gamma or math.log(gamma())))
+
+
+def estimate(index):
+    """The salary reported for a bucket, within the accuracy of all its salaries."""
+    if index == ZERO_BUCKET:
+        return 0.0
+    ratio = gamma()
+    return 2 * ratio ** index / (ratio + 1)
+
+
+def job_groups(job, skill_ids=()):
+    """
+    Returns the `(facet, value)` groups the salary of a job is counted in.
+    Only active jobs are counted.
+
+    Args:
+        job: A Job, or any object with its attributes.
+        skill_ids (iterable, optional): Skill ids of the job to include.
+    """
+    if not job.is_active:
+        return []
+    groups = [
+        ('all', ''),
+        ('job_type', str(job.job_type)),
+        ('experience_level', str(job.experience_level)),
+    ]
+    place = places.gazetteer().places.get(job.place_id) if job.place_id else None
+    if place is not None:
+        groups.append(('location', place.id))
+        groups.extend(('location', ancestor.id) for ancestor in places.gazetteer().ancestors(place))
+    groups.extend(('skill', str(skill_id)) for skill_id in skill_ids)
+    return groups
+
+
+def job_entries(job, skill_ids=()):
+    """The `(facet, value, salary)` entries a job adds to the histograms."""
+    return [(facet, value, job.salary) for facet, value in job_groups(job, skill_ids)]
+
+
+def active_salary(job_id):
+    """The salary of a job, None unless it is active."""
+    return Job.objects.filter(pk=job_id, is_active=True).values_list('salary', flat=True).first()
+
+
+def apply_changes(added=(), removed=()):
+    """
+    Adds the `(facet, value, salary)` entries of `added` to the histograms and
+    takes out the ones of `removed`, with atomic `count = count + delta`
+    updates. Entries added and removed at once cancel out.
+    """
+    log_gamma = math.log(gamma())
+    deltas = defaultdict(lambda: [0, 0.0])
+    for sign, entries in ((1, added), (-1, removed)):
+        for facet, value, salary in entries:
+            delta = deltas[facet, value, bucket(salary, log_gamma)]
+            delta[0] += sign
+            delta[1] += sign * salary
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for (facet, value, index), (count, total) in deltas.items():
+            rows = SalaryBucket.objects.filter(facet=facet, value=value, bucket=index)
+            if not rows.update(count=F('count') + count, total=F('total') + total):
+                SalaryBucket.objects.get_or_create(facet=facet, value=value, bucket=index)
+                rows.update(count=F('count') + count, total=F('total') + total)
+    caching.invalidate('salary')
+
+
+def rebuild(chunk_size=20_000):
+    """
+    Recomputes every histogram from the job tables, reading the active jobs
+    and their skills in primary key chunks, to fill the store after bulk
+    loads that bypass the signals.
+
+    Returns:
+        tuple: The number of jobs read and of buckets stored.
+    """
+    log_gamma = math.log(gamma())
+    histograms = defaultdict(lambda: [0, 0.0])
+
+    def merge(entries):
+        for facet, value, salary in entries:
+            histogram = histograms[facet, value, bucket(salary, log_gamma)]
+            histogram[0] += 1
+            histogram[1] += salary
+
+    jobs = 0
+    last_id = 0
+    while True:
+        chunk = [
+            Job(pk=pk, salary=salary, job_type=job_type, experience_level=level, place_id=place_id, is_active=True)
+            for pk, salary, job_type, level, place_id in Job.objects.filter(pk__gt=last_id, is_active=True)
+            .order_by('pk').values_list('pk', 'salary', 'job_type', 'experience_level', 'place_id')[:chunk_size]
+        ]
+        if not chunk:
+            break
+        last_id = chunk[-1].pk
+        jobs += len(chunk)
+        merge(entry for job in chunk for entry in job_entries(job))
+
+    last_id = 0
+    while True:
+        chunk = list(
+            JobSkill.objects.filter(pk__gt=last_id, job__is_active=True).order_by('pk')
+            .values_list('pk', 'skills_id', 'job__salary')[:chunk_size]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        merge(('skill', str(skill_id), salary) for _, skill_id, salary in chunk)
+
+    rows = [
+        SalaryBucket(facet=facet, value=value, bucket=index, count=count, total=total)
+        for (facet, value, index), (count, total) in histograms.items()
+    ]
+    with transaction.atomic():
+        SalaryBucket.objects.all().delete()
+        SalaryBucket.objects.bulk_create(rows, batch_size=1000)
+    caching.invalidate('salary')
+    return jobs, len(rows)
+
+
+def summarize(buckets, percentiles=DEFAULT_PERCENTILES):
+    """
+    Returns the count, mean, minimum, maximum and percentiles of a histogram.
+
+    Args:
+        buckets (iterable): `(bucket, count, total)` rows of one group.
+        percentiles (iterable, optional): Percentiles in (0, 100].
+    """
+    buckets = sorted((index, count, total) for index, count, total in buckets if count > 0)
+    count = sum(row[1] for row in buckets)
+    summary = {'count': count, 'mean': None, 'min': None, 'max': None,
+               'percentiles': {f'p{percentile:g}': None for percentile in percentiles}}
+    if not count:
+        return summary
+    summary['mean'] = round(sum(row[2] for row in buckets) / count, 2)
+    summary['min'] = round(estimate(buckets[0][0]), 2)
+    summary['max'] = round(estimate(buckets[-1][0]), 2)
+    for percentile in percentiles:
+        rank = max(1, math.ceil(percentile / 100 * count))
+        seen = 0
+        for index, bucket_count, _ in buckets:
+            seen += bucket_count
+            if seen >= rank:
+                summary['percentiles'][f'p{percentile:g}'] = round(estimate(index), 2)
+                break
+    return summary
+
+
+def labels(facet, values):
+    """The labels of the groups of a facet, by value."""
+    if facet in CHOICE_LABELS:
+        return {value: CHOICE_LABELS[facet].get(int(value), '') for value in values}
+    if facet == 'location':
+        gazetteer = places.gazetteer()
+        return {value: gazetteer.places[value].name if value in gazetteer.places else '' for value in values}
+    if facet == 'skill':
+        names = dict(Skill.objects.filter(pk__in=[int(value) for value in values]).values_list('id', 'name'))
+        return {value: names.get(int(value), '') for value in values}
+    return {value: 'All jobs' for value in values}
+
+
+def parse_percentiles(text):
+    if not text:
+        return DEFAULT_PERCENTILES
+    try:
+        percentiles = tuple(float(value) for value in text.split(','))
+    except ValueError:
+        raise SalaryQueryError('Expected percentiles as comma separated numbers.')
+    if not all(0 < percentile <= 100 for percentile in percentiles):
+        raise SalaryQueryError('Percentiles must be more than 0 and at most 100.')
+    return percentiles
+
+
+def group_value(facet, text):
+    """The stored value of a group from the text of its filter."""
+    if facet in CHOICE_LABELS:
+        try:
+            value = int(text)
+        except ValueError:
+            value = None
+        if value not in CHOICE_LABELS[facet]:
+            raise SalaryQueryError(f'Unknown {facet} "{text}".')
+        return str(value)
+    if facet == 'location':
+        place = places.resolve(text, broad=True)
+        if place is None:
+            raise SalaryQueryError(f'Unknown place "{text}".')
+        return place.id
+    skill_id = (
+        Skill.objects.filter(pk=int(text)) if text.isdigit() else Skill.objects.filter(name__iexact=text)
+    ).order_by('id').values_list('id', flat=True).first()
+    if skill_id is None:
+        raise SalaryQueryError(f'Unknown skill "{text}".')
+    return str(skill_id)
+
+
+def report(params):
+    """
+    Returns the salary statistics asked for by the query parameters of the
+    salaries endpoint, cached until the next change.
+
+    Args:
+        params (dict): At most one of `skill` (name or id), `experience_level`,
+            `job_type` or `location` (place name) for one group, or `by` with
+            one of these facets for every group of it, largest first; all
+            active jobs otherwise. `percentiles` lists the percentiles.
+
+    Raises:
+        SalaryQueryError: For parameters that cannot be understood.
+    """
+    percentiles = parse_percentiles(params.get('percentiles'))
+    filters = [facet for facet in FACETS if params.get(facet)]
+    by = params.get('by')
+    if len(filters) + bool(by) > 1:
+        raise SalaryQueryError('The statistics are kept per facet, filter by one of them or group by one.')
+    if by and by not in FACETS:
+        raise SalaryQueryError(f'Expected by to be one of {", ".join(FACETS)}.')
+    facet, value = (filters[0], group_value(filters[0], params[filters[0]])) if filters else ('all', '')
+
+    listed = ','.join(f'{percentile:g}' for percentile in percentiles)
+    key = f'{CACHE_PREFIX}{caching.generation("salary")}:{by or facet}:{"" if by else value}:{listed}'
+    result = cache.get(key)
+    if result is None:
+        result = statistics(by, facet, value, percentiles)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def statistics(by=None, facet='all', value='', percentiles=DEFAULT_PERCENTILES):
+    """Reads and summarizes the histograms of every group of `by`, or of one group."""
+    if not by:
+        buckets = SalaryBucket.objects.filter(facet=facet, value=value).values_list('bucket', 'count', 'total')
+        return {'facet': facet, 'value': value, 'label': labels(facet, [value])[value],
+                'accuracy': settings.SALARY_ACCURACY, **summarize(buckets, percentiles)}
+    groups = defaultdict(list)
+    for value, index, count, total in SalaryBucket.objects.filter(facet=by).values_list('value', 'bucket', 'count', 'total'):
+        groups[value].append((index, count, total))
+    names = labels(by, list(groups))
+    results = [
+        {'value': value, 'label': names[value], **summarize(buckets, percentiles)}
+        for value, buckets in groups.items()
+    ]
+    results = [row for row in results if row['count']]
+    results.sort(key=lambda row: (-row['count'], row['value']))
+    return {'facet': by, 'accuracy': settings.SALARY_ACCURACY, 'results': results}
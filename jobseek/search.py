@@ -0,0 +1,302 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from . import places
+from .models import Application, Job, JobSkill, JobSearchDocument, ResumeDocument
+
+DOCUMENT_TABLE = JobSearchDocument._meta.db_table
+FTS_TABLE = 'jobseek_jobsearch_fts'
+
+# Column weights used for ranking: title, skills, company, location, description
+FTS_WEIGHTS = (10.0, 4.0, 2.0, 2.0, 1.0)
+
+RESUME_TABLE = ResumeDocument._meta.db_table
+RESUME_FTS_TABLE = 'jobseek_resume_fts'
+
+# Column weights used for ranking applications: applicant, skills, cover letter, resume text
+RESUME_FTS_WEIGHTS = (2.0, 6.0, 1.0, 2.0)
+
+DOCUMENT_FIELDS = ['title', 'skills', 'company', 'location', 'description', 'updated_at']
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_document(job, skill_names=None):
+    """
+    Returns the field values of the search document for a job.
+
+    Args:
+        job (Job): The job, ideally fetched with its company.
+        skill_names (list, optional): Skill names already loaded for the job.
+
+    Returns:
+        dict: Values for the JobSearchDocument columns.
+    """
+    if skill_names is None:
+        skill_names = JobSkill.objects.filter(job=job).values_list('skills__name', flat=True)
+    return {
+        'title': job.title,
+        'skills': ' '.join(skill_names),
+        'company': job.company.name,
+        'location': job.location,
+        'description': job.description,
+    }
+
+
+def refresh_documents(job_ids, create=True):
+    """
+    Rebuilds the search documents of the given jobs with a fixed number of
+    queries, whatever the number of jobs.
+
+    Args:
+        job_ids (iterable): Ids of the jobs to reindex.
+        create (bool, optional): Whether missing documents are created. Passed
+            as False while rows are being deleted so a cascade does not bring
+            back the document of a job that is going away.
+    """
+    job_ids = list(job_ids)
+    if not job_ids:
+        return
+    skills = {}
+    for job_id, name in JobSkill.objects.filter(job_id__in=job_ids).values_list('job_id', 'skills__name'):
+        skills.setdefault(job_id, []).append(name)
+    existing = set(JobSearchDocument.objects.filter(job_id__in=job_ids).values_list('job_id', flat=True))
+    updated, created = [], []
+    now = timezone.now()
+    for job in Job.objects.filter(id__in=job_ids).select_related('company'):
+        document = JobSearchDocument(job=job, updated_at=now, **build_document(job, skills.get(job.id, [])))
+        if job.id in existing:
+            updated.append(document)
+        elif create:
+            created.append(document)
+    if updated:
+        JobSearchDocument.objects.bulk_update(updated, DOCUMENT_FIELDS)
+    if created:
+        JobSearchDocument.objects.bulk_create(created)
+
+
+def rebuild_all(batch_size=1000):
+    """
+    Rebuilds every search document in batches and returns the number of jobs
+    indexed.
+    """
+    total = 0
+    job_ids = Job.objects.order_by('id').values_list('id', flat=True)
+    batch = []
+    for job_id in job_ids.iterator(chunk_size=batch_size):
+        batch.append(job_id)
+        if len(batch) >= batch_size:
+            refresh_documents(batch)
+            total += len(batch)
+            batch = []
+    refresh_documents(batch)
+    return total + len(batch)
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+class SearchBackend:
+    """
+    Narrows a Job queryset with the full-text index. Subclasses implement the
+    vendor specific SQL; this base class is the icontains fallback used for
+    databases without a full-text engine.
+    """
+    vendor = None
+
+    def filter(self, queryset, query=None, location=None, skill=None):
+        """
+        Args:
+            queryset (QuerySet): The Job queryset to narrow.
+            query (str, optional): Free text matched against the whole document.
+            location (str, optional): Text matched against the location only.
+            skill (str, optional): Text matched against the skill names only.
+
+        Returns:
+            QuerySet: The matching jobs, ordered by relevance when a free text
+            query is given.
+        """
+        if query:
+            for token in tokenize(query):
+                documents = JobSearchDocument.objects.filter(
+                    Q(title__icontains=token) | Q(skills__icontains=token) | Q(company__icontains=token)
+                    | Q(location__icontains=token) | Q(description__icontains=token)
+                )
+                queryset = queryset.filter(id__in=documents.values('job_id'))
+        if location:
+            queryset = queryset.filter(search_document__location__icontains=location)
+        if skill:
+            queryset = queryset.filter(search_document__skills__icontains=skill)
+        return queryset
+
+    def filter_applications(self, queryset, query=None, skill=None):
+        """
+        Args:
+            queryset (QuerySet): The Application queryset to narrow.
+            query (str, optional): Free text matched against the applicant,
+                cover letter, resume text and resume skills.
+            skill (str, optional): Text matched against the resume skills only.
+
+        Returns:
+            QuerySet: The matching applications, ordered by relevance when a
+            free text query is given.
+        """
+        for token in tokenize(query):
+            documents = ResumeDocument.objects.filter(
+                Q(applicant__icontains=token) | Q(skills__icontains=token) | Q(cover_letter__icontains=token)
+                | Q(text__icontains=token)
+            )
+            queryset = queryset.filter(id__in=documents.values('application_id'))
+        if skill:
+            queryset = queryset.filter(resume_document__skills__icontains=skill)
+        return queryset
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """SQLite FTS5 backend, ranked with bm25()."""
+    vendor = 'sqlite'
+
+    @staticmethod
+    def match_expression(query=None, location=None, skill=None):
+        clauses = []
+        for column, text in ((None, query), ('location', location), ('skills', skill)):
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            terms = ' '.join('"%s"*' % token for token in tokens)
+            clauses.append('{%s} : (%s)' % (column, terms) if column else '(%s)' % terms)
+        return ' AND '.join(clauses)
+
+    def filter(self, queryset, query=None, location=None, skill=None):
+        match = self.match_expression(query, location, skill)
+        if not match:
+            return queryset
+        if not tokenize(query):
+            return queryset.filter(id__in=RawSQL(
+                'SELECT rowid FROM %s WHERE %s MATCH %%s' % (FTS_TABLE, FTS_TABLE),
+                [match],
+            ))
+        # Join the FTS table so bm25() is computed once per match; a correlated
+        # subquery would run the MATCH again for every row. bm25() is lower for
+        # better matches, negate it so a higher rank is better.
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=['%s MATCH %%s' % FTS_TABLE, '%s.rowid = %s.id' % (FTS_TABLE, Job._meta.db_table)],
+            params=[match],
+        )
+        rank = RawSQL('-bm25(%s, %s)' % (FTS_TABLE, weights), ())
+        return queryset.annotate(rank=rank).order_by('-rank', '-id')
+
+    def filter_applications(self, queryset, query=None, skill=None):
+        match = self.match_expression(query, skill=skill)
+        if not match:
+            return queryset
+        if not tokenize(query):
+            return queryset.filter(id__in=RawSQL(
+                'SELECT rowid FROM %s WHERE %s MATCH %%s' % (RESUME_FTS_TABLE, RESUME_FTS_TABLE),
+                [match],
+            ))
+        weights = ', '.join(str(weight) for weight in RESUME_FTS_WEIGHTS)
+        queryset = queryset.extra(
+            tables=[RESUME_FTS_TABLE],
+            where=[
+                '%s MATCH %%s' % RESUME_FTS_TABLE,
+                '%s.rowid = %s.id' % (RESUME_FTS_TABLE, Application._meta.db_table),
+            ],
+            params=[match],
+        )
+        rank = RawSQL('-bm25(%s, %s)' % (RESUME_FTS_TABLE, weights), ())
+        return queryset.annotate(rank=rank).order_by('-rank', '-id')
+
+
+class PostgresSearchBackend(SearchBackend):
+    """PostgreSQL tsvector backend using the GIN indexed generated columns."""
+    vendor = 'postgresql'
+
+    @staticmethod
+    def prefix_query(text):
+        tokens = tokenize(text)
+        return ' & '.join('%s:*' % token for token in tokens)
+
+    def filter(self, queryset, query=None, location=None, skill=None):
+        for column, text in (('search_vector', query), ('location_vector', location), ('skills_vector', skill)):
+            tsquery = self.prefix_query(text)
+            if not tsquery:
+                continue
+            queryset = queryset.filter(id__in=RawSQL(
+                "SELECT job_id FROM %s WHERE %s @@ to_tsquery('english', %%s)" % (DOCUMENT_TABLE, column),
+                [tsquery],
+            ))
+        tsquery = self.prefix_query(query)
+        if not tsquery:
+            return queryset
+        rank = RawSQL(
+            "SELECT ts_rank_cd(search_vector, to_tsquery('english', %%s)) FROM %s WHERE job_id = %s.id"
+            % (DOCUMENT_TABLE, Job._meta.db_table),
+            [tsquery],
+        )
+        return queryset.annotate(rank=rank).order_by('-rank', '-id')
+
+    def filter_applications(self, queryset, query=None, skill=None):
+        for column, text in (('search_vector', query), ('skills_vector', skill)):
+            tsquery = self.prefix_query(text)
+            if not tsquery:
+                continue
+            queryset = queryset.filter(id__in=RawSQL(
+                "SELECT application_id FROM %s WHERE %s @@ to_tsquery('english', %%s)" % (RESUME_TABLE, column),
+                [tsquery],
+            ))
+        tsquery = self.prefix_query(query)
+        if not tsquery:
+            return queryset
+        rank = RawSQL(
+            "SELECT ts_rank_cd(search_vector, to_tsquery('english', %%s)) FROM %s WHERE application_id = %s.id"
+            % (RESUME_TABLE, Application._meta.db_table),
+            [tsquery],
+        )
+        return queryset.annotate(rank=rank).order_by('-rank', '-id')
+
+
+BACKENDS = {
+    backend.vendor: backend for backend in (SQLiteSearchBackend(), PostgresSearchBackend())
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, SearchBackend())
+
+
+def search_jobs(queryset, query=None, location=None, skill=None):
+    """
+    Filters and ranks a Job queryset with the backend of the active database.
+    A location naming a gazetteer place matches the jobs located in it or in
+    a place under it, other locations are matched as text.
+    """
+    place = places.resolve(location, broad=True) if location else None
+    if place is not None:
+        queryset, location = places.in_place(queryset, place), None
+    return get_backend().filter(queryset, query=query, location=location, skill=skill)
+
+
+def search_job_params(queryset, params):
+    """
+    Applies the job search query parameters, shared by the sync and async
+    endpoints: `q`, `location` and `skill`, within `near=<place or lat,lon>`
+    and `radius=<km>` or `bbox=<south,west,north,east>` when given.
+
+    Raises:
+        places.PlaceQueryError: For an area that cannot be understood.
+    """
+    queryset = places.filter_area(queryset, near=params.get('near'), radius=params.get('radius'), bbox=params.get('bbox'))
+    return search_jobs(queryset, query=params.get('q'), location=params.get('location'), skill=params.get('skill'))
+
+
+def search_applications(queryset, query=None, skill=None):
+    """Filters and ranks an Application queryset by the text of the resumes."""
+    return get_backend().filter_applications(queryset, query=query, skill=skill)
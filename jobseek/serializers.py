@@ -1,11 +1,19 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Company, Job, JobSkill, Skill, CustomUser, Application
+from .models import Company, Job, JobSkill, Skill, CustomUser, Application, ResumeUpload
+from .thumbnails import derivative_urls
 
 # Company serializer
 class CompanySerializer(serializers.ModelSerializer):
+    company_logo_thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = Company
-        fields = ['id', 'name', 'location', 'description', 'website', 'company_logo']
+        fields = ['id', 'name', 'location', 'place_id', 'latitude', 'longitude', 'description', 'website', 'company_logo',
+                  'company_logo_thumbnails']
+
+    def get_company_logo_thumbnails(self, company):
+        return derivative_urls(company.company_logo_digest, self.context.get('request'))
 
 # Job serializer
 class JobSerializer(serializers.ModelSerializer):
@@ -13,7 +21,18 @@ class JobSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Job
-        fields = ['id', 'title', 'description', 'company', 'location', 'job_type', 'experience_level', 'salary', 'is_active']
+        fields = ['id', 'title', 'description', 'company', 'location', 'place_id', 'latitude', 'longitude', 'job_type',
+                  'experience_level', 'salary', 'is_active']
+
+
+# Bulk job serializer, validates one item of a bulk import
+class BulkJobSerializer(serializers.ModelSerializer):
+    company = serializers.CharField(max_length=100)  # Company name, created if missing
+    skills = serializers.ListField(child=serializers.CharField(max_length=100), required=False, default=list)
+
+    class Meta:
+        model = Job
+        fields = ['title', 'description', 'company', 'location', 'job_type', 'experience_level', 'salary', 'is_active', 'skills']
 
 
 class SkillSerializer(serializers.ModelSerializer):
@@ -47,14 +66,19 @@ class JobSkillSerializer(serializers.ModelSerializer):
 # User serializer
 class CustomUserSerializer(serializers.ModelSerializer):
     password2 = serializers.CharField(write_only=True)
+    profile_picture_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
-        fields = ['username', 'email', 'password', 'password2', 'phone_number', 'dob', 'profile_picture', 'bio', 'address']
+        fields = ['username', 'email', 'password', 'password2', 'phone_number', 'dob', 'profile_picture',
+                  'profile_picture_thumbnails', 'bio', 'address']
         extra_kwargs = {
             'password': {'write_only': True}
         }
 
+    def get_profile_picture_thumbnails(self, user):
+        return derivative_urls(user.profile_picture_digest, self.context.get('request'))
+
     def validate(self, data):
         # Ensure both passwords match
         if data['password'] != data['password2']:
@@ -99,4 +123,40 @@ class ApplicationSerializer(serializers.ModelSerializer):
         instance.cover_letter = validated_data.get('cover_letter', instance.cover_letter)
         instance.resume = validated_data.get('resume', instance.resume)
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+# Application search result, with the skills found in the resume and the relevance
+class ApplicationSearchSerializer(ApplicationSerializer):
+    resume_skills = serializers.SerializerMethodField()
+    rank = serializers.FloatField(read_only=True, default=None)
+
+    class Meta(ApplicationSerializer.Meta):
+        fields = ApplicationSerializer.Meta.fields + ['resume_skills', 'rank']
+
+    def get_resume_skills(self, application):
+        document = getattr(application, 'resume_document', None)
+        return [skill.name for skill in document.matched_skills.all()] if document else []
+
+
+# Resume upload serializer, creates an upload session and reports its progress
+class ResumeUploadSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', write_only=True)
+    received = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ResumeUpload
+        fields = ['id', 'application', 'filename', 'size', 'sha256', 'chunk_size', 'received', 'completed_at']
+        read_only_fields = ['chunk_size', 'completed_at']
+
+    def get_received(self, upload):
+        # Indexes of the chunks already stored, the rest still have to be sent
+        return sorted(chunk.index for chunk in upload.chunks.all())
+
+    def validate_size(self, size):
+        if not 0 < size <= settings.RESUME_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Size must be between 1 and {settings.RESUME_UPLOAD_MAX_SIZE} bytes.")
+        return size
+
+    def create(self, validated_data):
+        return ResumeUpload.objects.create(chunk_size=settings.RESUME_UPLOAD_CHUNK_SIZE, **validated_data)
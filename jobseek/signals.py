@@ -0,0 +1,317 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import authentication, caching, changes, events, facets, places, resumes, salaries, search
+from .models import (Application, ClaimsUser, Company, CustomUser, Job, JobRecommendation, JobSkill, ResumeDocument,
+                     Skill)
+from .skill_index import skill_index
+from .tasks import enqueue
+
+
+# Create the change log triggers again where a migration dropped them
+
+@receiver(post_migrate)
+def install_change_triggers(sender, app_config, using='default', **kwargs):
+    if app_config.label != 'jobseek':
+        return
+    connection = connections[using]
+    if 'jobseek_change' in connection.introspection.table_names():
+        changes.install_triggers(connection)
+
+
+# Keep the search documents in sync with the rows they are built from
+
+@receiver(post_save, sender=Job)
+def index_job(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.refresh_documents([instance.pk])
+
+
+@receiver(post_save, sender=JobSkill)
+def index_job_skills(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.refresh_documents([instance.job_id])
+
+
+@receiver(post_delete, sender=JobSkill)
+def unindex_job_skill(sender, instance, **kwargs):
+    search.refresh_documents([instance.job_id], create=False)
+
+
+@receiver(post_save, sender=Company)
+def index_company_jobs(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.refresh_documents(Job.objects.filter(company=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Skill)
+def index_skill_jobs(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.refresh_documents(JobSkill.objects.filter(skills=instance).values_list('job_id', flat=True))
+
+
+# Resolve the location of jobs and companies to a gazetteer place
+
+@receiver(pre_save, sender=Job)
+@receiver(pre_save, sender=Company)
+def locate_place(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'location' not in update_fields):
+        return
+    places.locate(instance)
+
+
+# Keep the facet counts in sync with the jobs and their skills
+
+@receiver(pre_save, sender=Job)
+def remember_job_facets(sender, instance, raw=False, **kwargs):
+    instance._previous_state = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_state = (
+        Job.objects.filter(pk=instance.pk)
+        .values('job_type', 'experience_level', 'location', 'is_active', 'salary', 'place_id')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Job)
+def count_job_facets(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_previous_state', None)
+    if created or before is None:
+        facets.apply_changes(added=facets.job_facets(instance))
+        return
+    skill_ids = ()
+    if before['is_active'] != instance.is_active:
+        # Activation moves the skills in or out of the counts as well
+        skill_ids = list(JobSkill.objects.filter(job=instance).values_list('skills_id', flat=True))
+    old = Job(**before)
+    facets.apply_changes(
+        added=facets.job_facets(instance, skill_ids),
+        removed=facets.job_facets(old, skill_ids),
+    )
+
+
+@receiver(post_delete, sender=Job)
+def uncount_job_facets(sender, instance, **kwargs):
+    # The skills are uncounted by the JobSkill rows deleted in the cascade
+    facets.apply_changes(removed=facets.job_facets(instance))
+
+
+@receiver(pre_save, sender=JobSkill)
+def remember_job_skill(sender, instance, raw=False, **kwargs):
+    instance._previous_state = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_state = JobSkill.objects.filter(pk=instance.pk).values('job_id', 'skills_id').first()
+
+
+@receiver(post_save, sender=JobSkill)
+def count_job_skill(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    added, removed = [], []
+    before = getattr(instance, '_previous_state', None)
+    if before and facets.is_active_job(before['job_id']):
+        removed.append(('skill', str(before['skills_id'])))
+    if facets.is_active_job(instance.job_id):
+        added.append(('skill', str(instance.skills_id)))
+    facets.apply_changes(added=added, removed=removed)
+
+
+@receiver(post_delete, sender=JobSkill)
+def uncount_job_skill(sender, instance, **kwargs):
+    if facets.is_active_job(instance.job_id):
+        facets.apply_changes(removed=[('skill', str(instance.skills_id))])
+
+
+@receiver(post_save, sender=Skill)
+def refresh_skill_labels(sender, instance, raw=False, **kwargs):
+    facets.invalidate()
+
+
+# Keep the salary histograms in sync with the jobs and their skills, reusing
+# the previous state remembered for the facet counts
+
+@receiver(post_save, sender=Job)
+def count_job_salary(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_previous_state', None)
+    if created or before is None:
+        salaries.apply_changes(added=salaries.job_entries(instance))
+        return
+    skill_ids = ()
+    if before['is_active'] != instance.is_active or before['salary'] != instance.salary:
+        # The skill groups hold the salary too
+        skill_ids = list(JobSkill.objects.filter(job=instance).values_list('skills_id', flat=True))
+    salaries.apply_changes(
+        added=salaries.job_entries(instance, skill_ids),
+        removed=salaries.job_entries(Job(**before), skill_ids),
+    )
+
+
+@receiver(post_delete, sender=Job)
+def uncount_job_salary(sender, instance, **kwargs):
+    # The skills are taken out by the JobSkill rows deleted in the cascade
+    salaries.apply_changes(removed=salaries.job_entries(instance))
+
+
+@receiver(post_save, sender=JobSkill)
+def count_job_skill_salary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    added, removed = [], []
+    before = getattr(instance, '_previous_state', None)
+    if before and (salary := salaries.active_salary(before['job_id'])) is not None:
+        removed.append(('skill', str(before['skills_id']), salary))
+    if (salary := salaries.active_salary(instance.job_id)) is not None:
+        added.append(('skill', str(instance.skills_id), salary))
+    salaries.apply_changes(added=added, removed=removed)
+
+
+@receiver(post_delete, sender=JobSkill)
+def uncount_job_skill_salary(sender, instance, **kwargs):
+    salary = salaries.active_salary(instance.job_id)
+    if salary is not None:
+        salaries.apply_changes(removed=[('skill', str(instance.skills_id), salary)])
+
+
+# Keep the in-process skill bitmap index in sync, once the change is committed
+
+@receiver(post_save, sender=Job)
+def index_job_activity(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(partial(skill_index.set_job_active, instance.pk, instance.is_active))
+
+
+@receiver(post_delete, sender=Job)
+def unindex_job_activity(sender, instance, **kwargs):
+    transaction.on_commit(partial(skill_index.set_job_active, instance.pk, False))
+
+
+@receiver(post_save, sender=JobSkill)
+def index_job_skill_bit(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_previous_state', None)
+    if before:
+        transaction.on_commit(partial(skill_index.set_job_skill, before['job_id'], before['skills_id'], False))
+    transaction.on_commit(partial(skill_index.set_job_skill, instance.job_id, instance.skills_id, True))
+
+
+@receiver(post_delete, sender=JobSkill)
+def unindex_job_skill_bit(sender, instance, **kwargs):
+    transaction.on_commit(partial(skill_index.set_job_skill, instance.job_id, instance.skills_id, False))
+
+
+@receiver(post_save, sender=Skill)
+def index_skill_name(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(partial(skill_index.set_skill_name, instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Skill)
+def unindex_skill_name(sender, instance, **kwargs):
+    transaction.on_commit(partial(skill_index.set_skill_name, instance.pk, None))
+
+
+# Drop the cached job and company responses that render a changed row
+
+@receiver(post_save, sender=Job)
+@receiver(post_delete, sender=Job)
+def invalidate_job_responses(sender, instance, raw=False, **kwargs):
+    caching.invalidate('job', f'job:{instance.pk}')
+
+
+@receiver(post_save, sender=JobSkill)
+@receiver(post_delete, sender=JobSkill)
+def invalidate_job_skill_responses(sender, instance, raw=False, **kwargs):
+    caching.invalidate('job', f'job:{instance.job_id}')
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_responses(sender, instance, created=False, raw=False, **kwargs):
+    # Jobs render their company name
+    job_ids = [] if created else Job.objects.filter(company_id=instance.pk).values_list('id', flat=True)
+    caching.invalidate('company', f'company:{instance.pk}', 'job', *(f'job:{job_id}' for job_id in job_ids))
+
+
+# Render the logo and profile picture derivatives in the background
+
+IMAGE_FIELDS = {
+    Company: ('company_logo', 'company_logo_digest'),
+    CustomUser: ('profile_picture', 'profile_picture_digest'),
+}
+
+
+@receiver(pre_save, sender=Company)
+@receiver(pre_save, sender=CustomUser)
+def forget_replaced_image(sender, instance, raw=False, update_fields=None, **kwargs):
+    field, digest_field = IMAGE_FIELDS[sender]
+    if raw or instance.pk is None or not getattr(instance, digest_field):
+        return
+    if update_fields is not None and field not in update_fields:
+        return
+    stored = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    if stored != getattr(instance, field).name:
+        # The derivatives belong to the previous image
+        setattr(instance, digest_field, '')
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=CustomUser)
+def render_image_derivatives(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    field, digest_field = IMAGE_FIELDS[sender]
+    if not getattr(instance, field) or getattr(instance, digest_field):
+        return
+    scopes = ['company', f'company:{instance.pk}'] if sender is Company else []
+    enqueue(events.render_image_derivatives, model=sender._meta.label, pk=instance.pk, field=field,
+            digest_field=digest_field, scopes=scopes)
+
+
+# Keep the resume search documents in sync, extracting a new resume in the background
+
+@receiver(post_save, sender=Application)
+def index_application_resume(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    source = ResumeDocument.objects.filter(application=instance).values_list('source', flat=True).first()
+    if source == instance.resume.name:
+        resumes.refresh_fields(instance)
+    elif instance.resume:
+        enqueue(resumes.extract_resume, application_id=instance.pk)
+    else:
+        resumes.write_document(instance)
+
+
+# Revoke the tokens of users whose password or active flag may have changed
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=ClaimsUser)
+@receiver(post_delete, sender=CustomUser)
+def forget_cached_user(sender, instance, **kwargs):
+    authentication.forget_user(instance.pk)
+
+
+# Score users live again once they apply, until the next batch stores their top jobs
+
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+def forget_job_recommendations(sender, instance, created=None, raw=False, **kwargs):
+    if raw or created is False:  # Saved again, not applied; deletes pass no `created`
+        return
+    JobRecommendation.objects.filter(user__email=instance.applicant_email).delete()
@@ -0,0 +1,313 @@
+import logging
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from .models import Job, JobSkill, Skill
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'jobseek:skill_index:version'
+
+# Without a cache shared between processes, changes made by other workers
+# are picked up when the index is rebuilt after this many seconds
+MAX_AGE = 300
+
+TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+OPERATORS = {'and', 'or', 'not'}
+
+
+class SkillQueryError(ValueError):
+    """Raised for a skill expression that cannot be parsed."""
+    pass
+
+
+def iter_bits(bitmap, descending=True, bound=None, limit=None):
+    """
+    Yields the positions of the set bits of an int bitmap.
+
+    Args:
+        bitmap (int): The bitmap.
+        descending (bool, optional): Walk from the highest position down.
+        bound (int, optional): Only yield positions strictly below (when
+            descending) or above (when ascending) this one.
+        limit (int, optional): Stop after this many positions.
+    """
+    if bound is not None:
+        if descending:
+            bitmap &= (1 << max(bound, 0)) - 1
+        else:
+            bitmap &= ~((1 << (bound + 1)) - 1)
+    count = 0
+    while bitmap and (limit is None or count < limit):
+        if descending:
+            position = bitmap.bit_length() - 1
+        else:
+            position = (bitmap & -bitmap).bit_length() - 1
+        bitmap ^= 1 << position
+        count += 1
+        yield position
+
+
+def to_bitmap(ids):
+    """
+    Builds an int bitmap from job ids in one pass over a byte buffer; OR-ing
+    the bits one by one would copy the whole integer for every id.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for job_id in ids:
+        buffer[job_id >> 3] |= 1 << (job_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def tokenize(expression):
+    """
+    Splits a skill expression into parentheses, operators and skill names.
+    Consecutive words that are not operators form a single name, so
+    `Machine Learning AND Python` has two operands; names can also be quoted.
+    """
+    tokens, words = [], []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN_RE.match(expression, position)
+        if not match or match.end() == position:
+            raise SkillQueryError(f'Unexpected character at position {position}')
+        position = match.end()
+        opening, closing, quoted, word = match.groups()
+        if word and word.lower() not in OPERATORS:
+            words.append(word)
+            continue
+        if words:
+            tokens.append(('name', ' '.join(words)))
+            words = []
+        if opening:
+            tokens.append(('(', opening))
+        elif closing:
+            tokens.append((')', closing))
+        elif quoted is not None:
+            tokens.append(('name', quoted))
+        else:
+            tokens.append((word.lower(), word))
+    if words:
+        tokens.append(('name', ' '.join(words)))
+    return tokens
+
+
+class Parser:
+    """
+    Recursive descent parser for skill expressions:
+
+        expression := term ('or' term)*
+        term       := factor ('and' factor)*
+        factor     := 'not' factor | '(' expression ')' | name
+    """
+
+    def __init__(self, tokens, resolve, universe):
+        self.tokens = tokens
+        self.position = 0
+        self.resolve = resolve
+        self.universe = universe
+
+    def parse(self):
+        if not self.tokens:
+            raise SkillQueryError('Empty skill expression')
+        bitmap = self.expression()
+        if self.position != len(self.tokens):
+            raise SkillQueryError(f'Unexpected {self.tokens[self.position][1]!r}')
+        return bitmap
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self, kind):
+        if self.peek() != kind:
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else 'end of expression'
+            raise SkillQueryError(f'Expected {kind!r}, found {found!r}')
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def expression(self):
+        bitmap = self.term()
+        while self.peek() == 'or':
+            self.take('or')
+            bitmap |= self.term()
+        return bitmap
+
+    def term(self):
+        bitmap = self.factor()
+        while self.peek() == 'and':
+            self.take('and')
+            bitmap &= self.factor()
+        return bitmap
+
+    def factor(self):
+        kind = self.peek()
+        if kind == 'not':
+            self.take('not')
+            return self.universe & ~self.factor()
+        if kind == '(':
+            self.take('(')
+            bitmap = self.expression()
+            self.take(')')
+            return bitmap
+        return self.resolve(self.take('name'))
+
+
+class SkillBitmapIndex:
+    """
+    In-process inverted index from `Skill.id` to a bitmap of the ids of the
+    active jobs requiring it. Bitmaps are Python ints with bit `n` set for
+    job `n`, so AND/OR/NOT run as word-wise big integer operations; each
+    bitmap takes `max(Job.id) / 8` bytes at most.
+
+    The index is loaded on first use (or by `warm_up()` at startup), kept in
+    sync by the Job and JobSkill signals of this process, and rebuilt when
+    another process bumps the version in the shared cache or after MAX_AGE.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.skills = None
+        self.names = {}
+        self.active = 0
+        self.version = None
+        self.built_at = 0.0
+
+    # Loading
+
+    def build(self):
+        # Read the version first so a change made while loading forces another build
+        version = cache.get(VERSION_KEY, 0)
+        active = to_bitmap(
+            Job.objects.filter(is_active=True).values_list('id', flat=True).iterator(chunk_size=10000)
+        )
+        job_ids = {}
+        for skill_id, job_id in JobSkill.objects.values_list('skills_id', 'job_id').iterator(chunk_size=10000):
+            job_ids.setdefault(skill_id, []).append(job_id)
+        skills = {skill_id: to_bitmap(ids) for skill_id, ids in job_ids.items()}
+        names = {}
+        for skill_id, name in Skill.objects.values_list('id', 'name'):
+            names.setdefault(name.lower(), set()).add(skill_id)
+        with self.lock:
+            self.skills, self.names, self.active = skills, names, active
+            self.version = version
+            self.built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if (
+            self.skills is None
+            or cache.get(VERSION_KEY, 0) != self.version
+            or time.monotonic() - self.built_at > MAX_AGE
+        ):
+            self.build()
+
+    def warm_up(self):
+        """Builds the index, leaving it to the first query if the database is not ready."""
+        try:
+            self.build()
+        except DatabaseError:
+            logger.warning('Skill index not built at startup', exc_info=True)
+
+    def reset(self):
+        with self.lock:
+            self.skills = None
+
+    # Queries
+
+    def resolve(self, name):
+        bitmap = 0
+        skill_ids = set(self.names.get(name.lower(), ()))
+        if name.isdigit():
+            skill_ids.add(int(name))
+        for skill_id in skill_ids:
+            bitmap |= self.skills.get(skill_id, 0)
+        return bitmap & self.active
+
+    def match(self, expression):
+        """
+        Evaluates an expression such as `Python AND Django AND NOT PHP`.
+        Operands are skill names (case insensitive, quoted when they contain
+        an operator) or ids.
+
+        Returns:
+            int: The bitmap of the matching active job ids.
+
+        Raises:
+            SkillQueryError: If the expression cannot be parsed.
+        """
+        self.ensure_fresh()
+        with self.lock:
+            return Parser(tokenize(expression), self.resolve, self.active).parse() & self.active
+
+    # Maintenance, called by the signals
+
+    def _changed(self):
+        # Tell other processes to rebuild; this one is already up to date
+        cache.add(VERSION_KEY, 0)
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            version = None
+        if version is not None and self.version is not None and version == self.version + 1:
+            self.version = version
+
+    def set_job_skill(self, job_id, skill_id, present):
+        if not present and self.skills is not None:
+            # JobSkill pairs are not unique, another row can still link the job to the skill
+            present = JobSkill.objects.filter(job_id=job_id, skills_id=skill_id).exists()
+        with self.lock:
+            if self.skills is None:
+                return
+            bits = self.skills.get(skill_id, 0)
+            self.skills[skill_id] = bits | (1 << job_id) if present else bits & ~(1 << job_id)
+            self._changed()
+
+    def set_job_active(self, job_id, active):
+        with self.lock:
+            if self.skills is None:
+                return
+            self.active = self.active | (1 << job_id) if active else self.active & ~(1 << job_id)
+            self._changed()
+
+    def add_jobs(self, active_job_ids, job_skills, skill_names=None):
+        """
+        Adds many jobs at once with a single OR per touched bitmap, for bulk
+        loads that bypass the signals.
+
+        Args:
+            active_job_ids (iterable): Ids of the new active jobs.
+            job_skills (iterable): `(job_id, skill_id)` pairs of the new jobs.
+            skill_names (dict, optional): Names of newly created skills by id.
+        """
+        job_ids = {}
+        for job_id, skill_id in job_skills:
+            job_ids.setdefault(skill_id, []).append(job_id)
+        with self.lock:
+            if self.skills is None:
+                return
+            self.active |= to_bitmap(active_job_ids)
+            for skill_id, name in (skill_names or {}).items():
+                self.names.setdefault(name.lower(), set()).add(skill_id)
+            for skill_id, ids in job_ids.items():
+                self.skills[skill_id] = self.skills.get(skill_id, 0) | to_bitmap(ids)
+            self._changed()
+
+    def set_skill_name(self, skill_id, name):
+        with self.lock:
+            if self.skills is None:
+                return
+            for skill_ids in self.names.values():
+                skill_ids.discard(skill_id)
+            if name is not None:
+                self.names.setdefault(name.lower(), set()).add(skill_id)
+            self._changed()
+
+
+skill_index = SkillBitmapIndex()
@@ -0,0 +1,154 @@
+import logging
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Task, TaskQueue
+
+logger = logging.getLogger(__name__)
+
+# Registered task functions by name
+registry = {}
+
+
+def task(queue='default', max_attempts=5):
+    """
+    Registers a function as a background task. The function is called with
+    the payload as keyword arguments, so the payload must be JSON.
+
+    Args:
+        queue (str, optional): Queue the task runs on.
+        max_attempts (int, optional): Runs before the task is marked failed.
+    """
+    def register(function):
+        name = f'{function.__module__}.{function.__name__}'
+        registry[name] = function
+        function.task_name = name
+        function.queue = queue
+        function.max_attempts = max_attempts
+        return function
+    return register
+
+
+def enqueue(function, delay=None, **payload):
+    """
+    Queues a call of a registered task. The row is written in the current
+    transaction, so the task only becomes visible to workers if the
+    transaction commits.
+
+    Args:
+        function: A function decorated with `task`.
+        delay (timedelta, optional): Wait before the first run.
+        **payload: Keyword arguments of the call.
+
+    Returns:
+        Task: The queued task.
+    """
+    return Task.objects.create(
+        queue=function.queue,
+        name=function.task_name,
+        payload=payload,
+        max_attempts=function.max_attempts,
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+
+
+def queue_limit(queue):
+    return settings.TASK_QUEUES.get(queue, {}).get('concurrency', 1)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at TASK_RETRY_MAX_SECONDS."""
+    delay = min(settings.TASK_RETRY_MAX_SECONDS, settings.TASK_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def claim(queue, worker, limit):
+    """
+    Claims up to `limit` due tasks of a queue for a worker, without going
+    over the concurrency of the queue across all workers.
+
+    The queue row is updated first: that serializes the claims on the queue,
+    and on SQLite it takes the write lock before any read, so concurrent
+    claims wait instead of failing. On backends with SKIP LOCKED the due
+    rows are also locked that way, so a task row held by anything else is
+    passed over rather than waited on.
+
+    Returns:
+        list: The claimed tasks.
+    """
+    now = timezone.now()
+    TaskQueue.objects.get_or_create(name=queue)
+    with transaction.atomic():
+        TaskQueue.objects.filter(name=queue).update(claimed_at=now)
+
+        # Tasks of workers that died are put back, or failed once out of attempts
+        expired = Task.objects.filter(
+            queue=queue, status=Task.RUNNING, locked_at__lt=now - timedelta(seconds=settings.TASK_LEASE_SECONDS)
+        )
+        expired.filter(attempts__gte=F('max_attempts')).update(
+            status=Task.FAILED, finished_at=now, last_error='Lease expired', locked_by=''
+        )
+        expired.update(status=Task.QUEUED, run_at=now, locked_by='')
+
+        running = Task.objects.filter(queue=queue, status=Task.RUNNING).count()
+        slots = min(limit, queue_limit(queue) - running)
+        if slots <= 0:
+            return []
+        due = Task.objects.filter(queue=queue, status=Task.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:slots])
+        Task.objects.filter(id__in=ids).update(
+            status=Task.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1
+        )
+    return list(Task.objects.filter(id__in=ids).order_by('run_at', 'id'))
+
+
+def run(claimed):
+    """
+    Runs a claimed task and records the outcome: done, queued again after a
+    backoff, or failed once out of attempts.
+
+    Returns:
+        str: The new status.
+    """
+    function = registry.get(claimed.name)
+    now = timezone.now()
+    try:
+        if function is None:
+            raise LookupError(f'Unknown task {claimed.name}')
+        function(**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Task %s %s failed (attempt %s)', claimed.pk, claimed.name, claimed.attempts, exc_info=True)
+        if claimed.attempts >= claimed.max_attempts:
+            changes = {'status': Task.FAILED, 'finished_at': timezone.now()}
+        else:
+            changes = {'status': Task.QUEUED, 'run_at': now + retry_delay(claimed.attempts)}
+        changes.update(last_error=error, locked_by='')
+    else:
+        changes = {'status': Task.DONE, 'finished_at': timezone.now(), 'locked_by': ''}
+    # Only the worker holding the lease records the outcome
+    Task.objects.filter(pk=claimed.pk, locked_by=claimed.locked_by, status=Task.RUNNING).update(
+        updated_at=timezone.now(), **changes
+    )
+    return changes['status']
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{random.getrandbits(32):08x}'
+
+
+def queue_stats():
+    """Returns the number of tasks by queue and status."""
+    stats = {}
+    for row in Task.objects.values('queue', 'status').annotate(count=Count('id')).order_by():
+        stats.setdefault(row['queue'], {})[row['status']] = row['count']
+    return stats
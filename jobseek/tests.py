@@ -1,3 +1,1546 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import zipfile
+import zlib
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from base64 import urlsafe_b64encode
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.core import mail
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from unittest import skipUnless
+from PIL import Image
+
+from . import (authentication, changes, events, exports, facets, metrics, places, query_plans, recommendations, resumes,
+               salaries, tasks, thumbnails)
+from .middleware import dump_profile, sampler
+from .mixins import relation_lookups
+from .models import (
+    JOB_TYPE_CHOICES, Application, Change, Company, CustomUser, Job, JobRecommendation, JobSkill, JobSearchDocument, ResumeDocument,
+    ResumeUploadChunk, SalaryBucket, Skill, Task,
+)
+from .search import search_jobs
+from .serializers import ApplicationSerializer, JobSerializer, JobSkillSerializer
+from .skill_index import Parser, SkillQueryError, iter_bits, skill_index, tokenize
+from .tasks import enqueue, task
+
+
+def encode_position(job):
+    payload = json.dumps({'p': [job.created_at.isoformat(), job.id], 'r': 0})
+    return urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+
+
+def make_job(company, **kwargs):
+    fields = {
+        'title': 'Backend Engineer',
+        'description': 'Build services',
+        'location': 'Lagos',
+        'job_type': 0,
+        'experience_level': 2,
+        'salary': 500000,
+    }
+    fields.update(kwargs)
+    return Job.objects.create(company=company, **fields)
+
+
+class SearchDocumentTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.job = make_job(self.company)
+        self.python = Skill.objects.create(name='Python')
+
+    def test_document_follows_job_skills_and_company(self):
+        JobSkill.objects.create(job=self.job, skills=self.python)
+        self.company.name = 'Globex'
+        self.company.save()
+
+        document = JobSearchDocument.objects.get(job=self.job)
+        self.assertEqual(document.skills, 'Python')
+        self.assertEqual(document.company, 'Globex')
+
+    def test_removed_skill_is_no_longer_matched(self):
+        job_skill = JobSkill.objects.create(job=self.job, skills=self.python)
+        self.assertEqual(list(search_jobs(Job.objects.all(), skill='python')), [self.job])
+
+        job_skill.delete()
+        self.assertEqual(list(search_jobs(Job.objects.all(), skill='python')), [])
+
+    def test_deleting_job_removes_document(self):
+        JobSkill.objects.create(job=self.job, skills=self.python)
+        self.job.delete()
+        self.assertFalse(JobSearchDocument.objects.exists())
+        self.assertEqual(list(search_jobs(Job.objects.all(), query='backend')), [])
+
+
+class JobSearchTests(APITestCase):
+    def setUp(self):
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.title_match = make_job(company, title='Django Developer', location='Ikeja, Lagos State')
+        self.description_match = make_job(company, description='Some Django experience', location='Abuja')
+        self.other = make_job(company, title='Accountant', description='Ledgers')
+
+    def test_results_are_ranked_by_relevance(self):
+        response = self.client.get('/job/search/', {'q': 'django'})
+        ids = [job['id'] for job in response.data['results']]
+        self.assertEqual(ids, [self.title_match.id, self.description_match.id])
+
+    def test_location_matches_words_of_the_location(self):
+        response = self.client.get('/job/search/', {'location': 'lagos', 'q': 'django'})
+        self.assertEqual([job['id'] for job in response.data['results']], [self.title_match.id])
+
+    def test_ranked_results_are_paginated_by_rank(self):
+        response = self.client.get('/job/search/', {'q': 'django', 'page_size': 1})
+        self.assertEqual([job['id'] for job in response.data['results']], [self.title_match.id])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([job['id'] for job in response.data['results']], [self.description_match.id])
+        self.assertIsNone(response.data['next'])
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+
+    def create_jobs(self, count):
+        jobs = Job.objects.bulk_create(
+            Job(company=self.company, title=f'Job {i}', description='', location='Lagos',
+                job_type=0, experience_level=0, salary=1)
+            for i in range(count)
+        )
+        # Share timestamps between rows so the id has to break the ties
+        created_at = timezone.now()
+        for start in range(0, count, 3):
+            Job.objects.filter(id__in=[job.id for job in jobs[start:start + 3]]).update(created_at=created_at)
+        return jobs
+
+    def walk(self, url, link='next'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(job['id'] for job in response.data['results'])
+            url = response.data[link]
+        return ids
+
+    def test_pages_cover_every_row_once_in_order(self):
+        self.create_jobs(25)
+        expected = list(Job.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/job/?page_size=4'), expected)
+
+    def test_previous_links_walk_back(self):
+        self.create_jobs(10)
+        first = self.client.get('/job/?page_size=4').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(first['previous'])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/job/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Query plan format is SQLite specific')
+    def test_cursor_page_is_an_index_range_scan(self):
+        self.create_jobs(5)
+        response = self.client.get('/job/?page_size=2')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(response.data['next'])
+        sql = context.captured_queries[0]['sql']
+        self.assertNotIn('OFFSET', sql.upper())
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('job_created_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_deep_pages_run_the_same_query_as_the_table_grows(self):
+        def deepest_page_queries():
+            # Position the cursor on the oldest rows, the deepest page of the table
+            oldest = Job.objects.order_by('created_at', 'id')[20]
+            cache.clear()  # bulk_create sends no signal to drop the cached page
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/job/', {'cursor': encode_position(oldest), 'page_size': 10})
+            self.assertEqual(len(response.data['results']), 10)
+            return [query['sql'] for query in context.captured_queries]
+
+        self.create_jobs(200)
+        small = deepest_page_queries()
+        self.create_jobs(5000)
+        large = deepest_page_queries()
+        self.assertEqual(len(large), len(small))
+        self.assertNotIn('OFFSET', large[0].upper())
+        self.assertRegex(large[0], r'LIMIT 11$')
+
+
+class QueryCountTestCase(APITestCase):
+    """
+    Asserts that an endpoint runs the same fixed number of queries whatever
+    the number of rows it renders.
+    """
+    row_counts = (1, 12)
+
+    def assertConstantQueries(self, url, expected, add_rows):
+        """
+        Args:
+            url (str): The endpoint to request.
+            expected (int): The number of queries the request may run.
+            add_rows (callable): Called with a count, adds that many rows
+                rendered by the endpoint.
+        """
+        created = 0
+        for count in self.row_counts:
+            add_rows(count - created)
+            created = count
+            with self.assertNumQueries(expected):
+                response = self.client.get(url, {'page_size': max(self.row_counts)})
+            self.assertEqual(response.status_code, 200)
+
+
+class EndpointQueryCountTests(QueryCountTestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.user = CustomUser.objects.create_user(
+            username='ada', email='ada@example.com', password='secret', phone_number='08000000000'
+        )
+
+    def add_jobs(self, count):
+        for _ in range(count):
+            company = Company.objects.create(name='Acme', location='Lagos', description='')
+            job = make_job(company, title='Django Developer')
+            JobSkill.objects.create(job=job, skills=Skill.objects.create(name='Django'))
+
+    def add_applications(self, count):
+        for _ in range(count):
+            job = make_job(self.company)
+            Application.objects.create(
+                job=job, company=self.company, applicant_name='Ada', applicant_email=self.user.email,
+                resume='applications/resume.pdf', cover_letter='',
+            )
+
+    def add_users(self, count):
+        for _ in range(count):
+            index = CustomUser.objects.count()
+            CustomUser.objects.create_user(
+                username=f'user{index}', email=f'user{index}@example.com', password='secret',
+                phone_number=f'0801{index:07d}',
+            )
+
+    def test_job_endpoints(self):
+        self.assertConstantQueries('/job/', 1, self.add_jobs)
+        self.assertConstantQueries('/job/search/?q=django', 1, self.add_jobs)
+        self.assertConstantQueries('/jobskill/', 1, self.add_jobs)
+        self.assertConstantQueries('/skill/', 1, self.add_jobs)
+        self.assertConstantQueries('/company/', 1, self.add_jobs)
+
+    def test_job_detail(self):
+        self.add_jobs(1)
+        url = f'/job/{Job.objects.get().id}/'
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_application_endpoints(self):
+        self.assertConstantQueries('/application/', 1, self.add_applications)
+        self.client.force_authenticate(self.user)
+        self.assertConstantQueries('/application/get_by_user/', 1, self.add_applications)
+
+    def test_user_endpoint(self):
+        self.assertConstantQueries('/user/', 1, self.add_users)
+
+
+class RelationLookupTests(TestCase):
+    def test_lookups_follow_rendered_relations(self):
+        self.assertEqual(relation_lookups(JobSerializer), (('company',), ()))
+        self.assertEqual(relation_lookups(ApplicationSerializer), (('job', 'company'), ()))
+
+    def test_primary_keys_and_write_only_fields_need_no_join(self):
+        self.assertEqual(relation_lookups(JobSkillSerializer), ((), ()))
+
+
+class FacetCountTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.python = Skill.objects.create(name='Python')
+        self.django = Skill.objects.create(name='Django')
+
+    def facet(self, data, facet, value):
+        return next(row['count'] for row in data[facet] if row['value'] == value)
+
+    def test_store_matches_a_full_recount(self):
+        job = make_job(self.company, job_type=1, location='Abuja')
+        other = make_job(self.company, job_type=1, experience_level=4)
+        JobSkill.objects.create(job=job, skills=self.python)
+        link = JobSkill.objects.create(job=other, skills=self.python)
+        JobSkill.objects.create(job=other, skills=self.django)
+
+        job.location = 'Lagos'
+        job.save()
+        link.skills = self.django
+        link.save()
+        other.is_active = False
+        other.save()
+        other.is_active = True
+        other.save()
+        make_job(self.company).delete()
+
+        stored = facets.stored_counts()
+        facets.rebuild()
+        self.assertEqual(stored, facets.stored_counts())
+        self.assertEqual(self.facet(stored, 'job_type', 1), 2)
+        self.assertEqual(self.facet(stored, 'skill', self.django.id), 2)
+
+    def test_inactive_jobs_are_not_counted(self):
+        job = make_job(self.company)
+        JobSkill.objects.create(job=job, skills=self.python)
+        job.is_active = False
+        job.save()
+
+        data = self.client.get('/job/facets/').data
+        self.assertEqual(self.facet(data, 'job_type', 0), 0)
+        self.assertEqual(data['skill'], [])
+        self.assertEqual(data['location'], [])
+
+    def test_every_choice_is_listed(self):
+        data = self.client.get('/job/facets/').data
+        self.assertEqual([row['label'] for row in data['job_type']], [label for _, label in JOB_TYPE_CHOICES])
+
+    def test_unfiltered_counts_are_cached(self):
+        make_job(self.company)
+        self.client.get('/job/facets/')
+        with self.assertNumQueries(0):
+            self.client.get('/job/facets/')
+        make_job(self.company)
+        self.assertEqual(self.facet(self.client.get('/job/facets/').data, 'job_type', 0), 2)
+
+    def test_counts_follow_the_search_filters(self):
+        job = make_job(self.company, title='Django Developer', location='Abuja')
+        JobSkill.objects.create(job=job, skills=self.django)
+        make_job(self.company, title='Accountant')
+
+        data = self.client.get('/job/facets/', {'q': 'django'}).data
+        self.assertEqual(data['location'], [{'value': 'Abuja', 'label': 'Abuja', 'count': 1}])
+        self.assertEqual(data['skill'], [{'value': self.django.id, 'label': 'Django', 'count': 1}])
+
+
+class SkillExpressionTests(TestCase):
+    def evaluate(self, expression):
+        bitmaps = {'python': 0b0111, 'django': 0b0011, 'php': 0b0110, 'machine learning': 0b1000}
+        return Parser(tokenize(expression), lambda name: bitmaps.get(name.lower(), 0), 0b1111).parse()
+
+    def test_operators_and_precedence(self):
+        self.assertEqual(self.evaluate('Python AND Django AND NOT PHP'), 0b0001)
+        self.assertEqual(self.evaluate('php or django and python'), 0b0111)
+        self.assertEqual(self.evaluate('(php OR django) AND NOT python'), 0b0000)
+        self.assertEqual(self.evaluate('Machine Learning OR "PHP"'), 0b1110)
+
+    def test_invalid_expressions(self):
+        for expression in ('', 'Python AND', '(Python', 'Python)'):
+            with self.assertRaises(SkillQueryError):
+                self.evaluate(expression)
+
+    def test_iter_bits_pages_both_ways(self):
+        bitmap = 0b101101
+        self.assertEqual(list(iter_bits(bitmap)), [5, 3, 2, 0])
+        self.assertEqual(list(iter_bits(bitmap, bound=3, limit=1)), [2])
+        self.assertEqual(list(iter_bits(bitmap, descending=False, bound=2)), [3, 5])
+
+
+class SkillMatchTests(APITestCase):
+    def setUp(self):
+        skill_index.reset()
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.python, self.django, self.php = (
+            Skill.objects.create(name=name) for name in ('Python', 'Django', 'PHP')
+        )
+        self.jobs = [make_job(company) for _ in range(4)]
+        for job, skills in zip(self.jobs, [(self.python, self.django), (self.python, self.django, self.php),
+                                           (self.python,), (self.django,)]):
+            for skill in skills:
+                JobSkill.objects.create(job=job, skills=skill)
+
+    def match(self, expression, **params):
+        response = self.client.get('/job/match/', {'skills': expression, **params})
+        return response, [job['id'] for job in response.data.get('results', [])]
+
+    def test_boolean_match(self):
+        _, ids = self.match('Python AND Django AND NOT PHP')
+        self.assertEqual(ids, [self.jobs[0].id])
+        _, ids = self.match('php OR NOT python')
+        self.assertEqual(ids, [self.jobs[3].id, self.jobs[1].id])
+
+    def test_index_follows_committed_changes(self):
+        self.match('python')
+        with self.captureOnCommitCallbacks(execute=True):
+            JobSkill.objects.filter(job=self.jobs[2]).delete()
+            self.jobs[0].is_active = False
+            self.jobs[0].save()
+        _, ids = self.match('python')
+        self.assertEqual(ids, [self.jobs[1].id])
+
+    def test_duplicate_job_skills_keep_the_bit(self):
+        self.match('python')
+        duplicate = JobSkill.objects.create(job=self.jobs[2], skills=self.python)
+        with self.captureOnCommitCallbacks(execute=True):
+            duplicate.delete()
+        self.assertIn(self.jobs[2].id, self.match('python')[1])
+
+        # Moving one of the two rows away keeps the bit of the pair it left
+        duplicate = JobSkill.objects.create(job=self.jobs[2], skills=self.python)
+        with self.captureOnCommitCallbacks(execute=True):
+            duplicate.skills = self.php
+            duplicate.save()
+        self.assertIn(self.jobs[2].id, self.match('python AND php')[1])
+
+    def test_pages_walk_the_bitmap(self):
+        response, ids = self.match('python OR django', page_size=3)
+        more = [job['id'] for job in self.client.get(response.data['next']).data['results']]
+        self.assertEqual(ids + more, [job.id for job in reversed(self.jobs)])
+
+    def test_invalid_expression_is_rejected(self):
+        response, _ = self.match('python AND (')
+        self.assertEqual(response.status_code, 400)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.job = make_job(self.company)
+
+    def test_repeated_reads_skip_the_database(self):
+        for url in ('/job/', f'/job/{self.job.id}/', '/company/'):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.data, first.data)
+
+    def test_company_change_invalidates_job_responses(self):
+        self.client.get('/job/')
+        self.client.get(f'/job/{self.job.id}/')
+        self.company.name = 'Globex'
+        self.company.save()
+        self.assertEqual(self.client.get('/job/').data['results'][0]['company'], 'Globex')
+        self.assertEqual(self.client.get(f'/job/{self.job.id}/').data['company'], 'Globex')
+
+    def test_job_change_invalidates_its_detail(self):
+        self.client.get(f'/job/{self.job.id}/')
+        self.job.title = 'Frontend Engineer'
+        self.job.save()
+        self.assertEqual(self.client.get(f'/job/{self.job.id}/').data['title'], 'Frontend Engineer')
+
+    def test_conditional_get(self):
+        url = f'/job/{self.job.id}/'
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        # From the cache, then without it: neither path serializes again
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        self.job.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BulkIngestionTests(APITestCase):
+    def setUp(self):
+        skill_index.reset()
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.python = Skill.objects.create(name='Python')
+
+    def item(self, **kwargs):
+        data = {
+            'title': 'Django Developer', 'description': 'APIs', 'company': 'Acme', 'location': 'Lagos',
+            'job_type': 0, 'experience_level': 1, 'salary': 1000, 'skills': ['Python', 'Django'],
+        }
+        data.update(kwargs)
+        return data
+
+    def test_bulk_upserts_names_and_reports_errors(self):
+        items = [self.item(), self.item(company='Globex', skills=['Django']), self.item(job_type=99)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/job/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual(response.data['results'][2]['index'], 2)
+        self.assertIn('job_type', response.data['results'][2]['errors'])
+        self.assertEqual(Company.objects.filter(name='Acme').count(), 1)
+        self.assertEqual(Skill.objects.filter(name='Django').count(), 1)
+        self.assertEqual(JobSkill.objects.filter(skills=self.python).count(), 1)
+
+    def test_bulk_jobs_reach_the_derived_indexes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/job/bulk/', [self.item()], format='json')
+        job = Job.objects.get()
+
+        self.assertEqual([result['id'] for result in self.client.get('/job/search/', {'q': 'django'}).data['results']],
+                         [job.id])
+        self.assertEqual([result['id'] for result in self.client.get('/job/match/', {'skills': 'python AND django'}).data['results']],
+                         [job.id])
+        stored = facets.stored_counts()
+        facets.rebuild()
+        self.assertEqual(stored, facets.stored_counts())
+
+    def test_import_command_streams_jsonl_and_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl = os.path.join(directory, 'jobs.jsonl')
+            with open(jsonl, 'w') as stream:
+                stream.write(json.dumps(self.item()) + '\n\n' + json.dumps(self.item(title='Other')) + '\n')
+            csv_path = os.path.join(directory, 'jobs.csv')
+            with open(csv_path, 'w') as stream:
+                stream.write('title,description,company,location,job_type,experience_level,salary,is_active,skills\n')
+                stream.write('Analyst,Reports,Initech,Abuja,1,2,900,,SQL|Python\n')
+            call_command('import_jobs', jsonl, batch_size=1, stdout=StringIO())
+            call_command('import_jobs', csv_path, stdout=StringIO())
+
+        self.assertEqual(Job.objects.count(), 3)
+        analyst = Job.objects.get(title='Analyst')
+        self.assertEqual(analyst.company.name, 'Initech')
+        self.assertTrue(analyst.is_active)
+        self.assertEqual(sorted(analyst.jobskill_set.values_list('skills__name', flat=True)), ['Python', 'SQL'])
+
+
+class AsyncReadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.jobs = [make_job(self.company, title=f'Engineer {i}') for i in range(3)]
+        self.user = CustomUser.objects.create_user(username='ada', email='ada@example.com', password='secret')
+        Application.objects.create(job=self.jobs[0], company=self.company, applicant_name='Ada',
+                                   applicant_email='ada@example.com', resume='cv.pdf', cover_letter='Hi')
+        self.auth = {'AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    async def test_job_reads_match_the_sync_views(self):
+        for path in ['/job/', f'/job/{self.jobs[0].id}/', '/job/search/?q=engineer']:
+            expected = (await sync_to_async(self.client.get)(path)).json()
+            response = await self.async_client.get('/async' + path)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected)
+
+    async def test_job_list_pages_with_the_same_cursors(self):
+        response = await self.async_client.get('/async/job/', {'page_size': 2})
+        first = response.json()
+        self.assertEqual(len(first['results']), 2)
+        second = (await self.async_client.get(first['next'])).json()
+        self.assertEqual([job['id'] for job in second['results']], [self.jobs[0].id])
+
+    async def test_missing_job_is_not_found(self):
+        response = await self.async_client.get('/async/job/0/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_user_endpoints_require_a_valid_token(self):
+        for path in ['/async/application/get_by_user/', '/async/user/get_current_user/']:
+            self.assertEqual((await self.async_client.get(path)).status_code, 401)
+            response = await self.async_client.get(path, headers={'AUTHORIZATION': 'Bearer nonsense'})
+            self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.get('/async/user/get_current_user/', headers=self.auth)
+        self.assertEqual(response.json()['email'], 'ada@example.com')
+        response = await self.async_client.get('/async/application/get_by_user/', headers=self.auth)
+        self.assertEqual([item['job'] for item in response.json()['results']], ['Engineer 0'])
+
+    async def test_revoked_tokens_are_refused(self):
+        token = (await sync_to_async(authentication.TokenObtainPairSerializer.get_token)(self.user)).access_token
+        headers = {'AUTHORIZATION': f'Bearer {token}'}
+        response = await self.async_client.get('/async/user/get_current_user/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        self.user.set_password('changed')
+        await self.user.asave()
+        for path in ['/async/application/get_by_user/', '/async/user/get_current_user/']:
+            self.assertEqual((await self.async_client.get(path, headers=headers)).status_code, 401)
+
+
+class ResumeUploadTests(APITestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, RESUME_UPLOAD_CHUNK_SIZE=4)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        job = make_job(company)
+        response = self.client.post('/application/', {
+            'job_id': job.id, 'company_id': company.id, 'applicant_name': 'Ada',
+            'applicant_email': 'ada@example.com', 'cover_letter': 'Hi',
+        }, format='json')
+        self.application = Application.objects.get(pk=response.data['id'])
+        self.content = b'%PDF resume!'
+        self.ada = CustomUser.objects.create(username='ada', email='ada@example.com', phone_number='08000000001')
+        self.client.force_authenticate(self.ada)
+
+    def start(self, content=None, **kwargs):
+        content = self.content if content is None else content
+        data = {'application': self.application.id, 'filename': 'cv.pdf', 'size': len(content),
+                'sha256': hashlib.sha256(content).hexdigest()}
+        data.update(kwargs)
+        return self.client.post('/resume_upload/', data, format='json')
+
+    def put_chunk(self, upload_id, index, body):
+        return self.client.generic('PUT', f'/resume_upload/{upload_id}/chunks/{index}/', body,
+                                   content_type='application/octet-stream')
+
+    def test_chunks_resume_and_assemble_into_the_application(self):
+        upload_id = self.start().data['id']
+        self.assertEqual(self.put_chunk(upload_id, 2, b'ume!').status_code, 204)
+        self.assertEqual(self.put_chunk(upload_id, 0, b'XXXX').status_code, 204)
+        self.assertEqual(self.client.get(f'/resume_upload/{upload_id}/').data['received'], [0, 2])
+
+        self.assertEqual(self.client.post(f'/resume_upload/{upload_id}/finalize/').status_code, 400)
+        self.put_chunk(upload_id, 0, b'%PDF')  # Sent again, replaces the first attempt
+        self.put_chunk(upload_id, 1, b' res')
+        response = self.client.post(f'/resume_upload/{upload_id}/finalize/')
+
+        self.assertEqual(response.status_code, 200)
+        self.application.refresh_from_db()
+        with self.application.resume.open('rb') as resume:
+            self.assertEqual(resume.read(), self.content)
+        self.assertFalse(ResumeUploadChunk.objects.exists())
+        self.assertEqual(self.put_chunk(upload_id, 0, b'%PDF').status_code, 400)
+
+    def test_rejects_bad_sizes_and_content(self):
+        self.assertEqual(self.start(size=0).status_code, 400)
+        with override_settings(RESUME_UPLOAD_MAX_SIZE=8):
+            self.assertEqual(self.start().status_code, 400)
+
+        upload_id = self.start().data['id']
+        self.assertEqual(self.put_chunk(upload_id, 0, b'%PD').status_code, 400)
+        self.assertEqual(self.put_chunk(upload_id, 3, b'%PDF').status_code, 400)
+        for index, body in enumerate([b'%PDF', b' res', b'ume?']):
+            self.put_chunk(upload_id, index, body)
+        response = self.client.post(f'/resume_upload/{upload_id}/finalize/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sha256', response.data['detail'])
+        self.application.refresh_from_db()
+        self.assertFalse(self.application.resume)
+        self.put_chunk(upload_id, 2, b'ume!')
+        self.assertEqual(self.client.post(f'/resume_upload/{upload_id}/finalize/').status_code, 200)
+
+    def test_only_the_applicant_or_staff_upload(self):
+        upload_id = self.start().data['id']
+        self.client.force_authenticate(None)
+        self.assertEqual(self.start().status_code, 401)
+        self.assertEqual(self.client.post(f'/resume_upload/{upload_id}/finalize/').status_code, 401)
+
+        bola = CustomUser.objects.create(username='bola', email='bola@example.com', phone_number='08000000002')
+        self.client.force_authenticate(bola)
+        self.assertEqual(self.start().status_code, 403)
+        self.assertEqual(self.put_chunk(upload_id, 0, b'%PDF').status_code, 404)
+        self.assertEqual(self.client.post(f'/resume_upload/{upload_id}/finalize/').status_code, 404)
+
+        admin = CustomUser.objects.create(username='admin', phone_number='08000000003', is_staff=True)
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.start().status_code, 201)
+        for index, body in enumerate([b'%PDF', b' res', b'ume!']):
+            self.assertEqual(self.put_chunk(upload_id, index, body).status_code, 204)
+        self.assertEqual(self.client.post(f'/resume_upload/{upload_id}/finalize/').status_code, 200)
+
+
+class ThumbnailTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def image(self, size=(600, 300), orientation=None):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera Maker'
+        if orientation:
+            exif[0x0112] = orientation
+        output = BytesIO()
+        Image.new('RGB', size, 'red').save(output, 'JPEG', exif=exif)
+        return output.getvalue()
+
+    def test_render_resizes_rotates_and_strips_metadata(self):
+        digest, derivatives = thumbnails.render(self.image(orientation=6))
+
+        self.assertEqual(len(derivatives), len(thumbnails.SIZES) * len(thumbnails.FORMATS))
+        with Image.open(BytesIO(derivatives[thumbnails.derivative_name(digest, 'medium', 'jpeg')])) as medium:
+            self.assertEqual(medium.size, (128, 256))  # Rotated by the EXIF orientation
+            self.assertFalse(medium.getexif())
+        with Image.open(BytesIO(derivatives[thumbnails.derivative_name(digest, 'small', 'webp')])) as small:
+            self.assertEqual((small.format, small.size), ('WEBP', (32, 64)))
+
+    def test_regenerate_exposes_derivative_urls(self):
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        company.company_logo.save('logo.jpg', ContentFile(self.image()))
+        self.assertIsNone(self.client.get(f'/company/{company.id}/').data['company_logo_thumbnails'])
+
+        with ThreadPoolExecutor(1) as pool:
+            self.assertEqual(
+                thumbnails.regenerate(Company, 'company_logo', 'company_logo_digest', pool=pool,
+                                      scopes_for=lambda pk: ('company', f'company:{pk}')),
+                (1, 0),
+            )
+        company.refresh_from_db()
+        urls = self.client.get(f'/company/{company.id}/').data['company_logo_thumbnails']
+        self.assertTrue(urls['small']['webp'].endswith(f'{company.company_logo_digest}/small.webp'))
+        self.assertTrue(default_storage.exists(thumbnails.derivative_name(company.company_logo_digest, 'medium', 'jpeg')))
+
+        # A new logo drops the derivatives of the old one
+        company.company_logo.save('other.jpg', ContentFile(self.image(size=(100, 100))))
+        company.refresh_from_db()
+        self.assertEqual(company.company_logo_digest, '')
+
+    def test_saved_images_are_rendered_by_a_queued_task(self):
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.assertFalse(Task.objects.filter(name=events.render_image_derivatives.task_name).exists())
+        company.company_logo.save('logo.jpg', ContentFile(self.image()))
+        queued = Task.objects.get(name=events.render_image_derivatives.task_name)
+        self.assertEqual(queued.payload['model'], 'jobseek.Company')
+
+        with ThreadPoolExecutor(1) as pool:
+            self.assertTrue(thumbnails.generate(Company, company.pk, 'company_logo', 'company_logo_digest', pool=pool))
+            # Already recorded, nothing to render
+            self.assertFalse(thumbnails.generate(Company, company.pk, 'company_logo', 'company_logo_digest', pool=pool))
+        company.refresh_from_db()
+        self.assertTrue(default_storage.exists(thumbnails.derivative_name(company.company_logo_digest, 'small', 'webp')))
+
+
+calls = []
+
+
+@task(max_attempts=2)
+def record_call(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise RuntimeError('Boom')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claims_respect_due_time_and_queue_concurrency(self):
+        with self.settings(TASK_QUEUES={'default': {'concurrency': 2}}):
+            for value in range(3):
+                enqueue(record_call, value=value)
+            enqueue(record_call, delay=timedelta(hours=1), value='later')
+
+            first = tasks.claim('default', 'worker-a', limit=10)
+            self.assertEqual([claimed.payload['value'] for claimed in first], [0, 1])
+            self.assertEqual(tasks.claim('default', 'worker-b', limit=10), [])  # Queue at its concurrency
+            tasks.run(first[0])
+            self.assertEqual([claimed.payload['value'] for claimed in tasks.claim('default', 'worker-b', 10)], [2])
+        self.assertEqual(calls, [0])
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        queued = enqueue(record_call, value='x', fail=True)
+        claimed, = tasks.claim('default', 'worker', 1)
+        with self.assertLogs('jobseek.tasks', 'WARNING'):
+            self.assertEqual(tasks.run(claimed), Task.QUEUED)
+        queued.refresh_from_db()
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('Boom', queued.last_error)
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        claimed, = tasks.claim('default', 'worker', 1)
+        with self.assertLogs('jobseek.tasks', 'WARNING'):
+            self.assertEqual(tasks.run(claimed), Task.FAILED)
+        self.assertEqual(Task.objects.get(pk=queued.pk).attempts, 2)
+
+    def test_expired_leases_are_claimed_again(self):
+        enqueue(record_call, value='x')
+        tasks.claim('default', 'dead-worker', 1)
+        Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        claimed, = tasks.claim('default', 'worker', 1)
+        self.assertEqual((claimed.locked_by, claimed.attempts), ('worker', 2))
+
+    def test_api_events_queue_notifications(self):
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        job = make_job(company)
+        self.client.post('/user/', {'username': 'ada', 'email': 'ada@example.com', 'password': 'Secret123!',
+                                    'password2': 'Secret123!', 'phone_number': '08000000001'}, format='json')
+        self.client.post('/application/', {'job_id': job.id, 'company_id': company.id, 'applicant_name': 'Ada',
+                                           'applicant_email': 'ada@example.com', 'cover_letter': 'Hi'}, format='json')
+        self.assertEqual(
+            sorted(Task.objects.values_list('name', flat=True)),
+            ['jobseek.events.application_created', 'jobseek.events.user_registered'],
+        )
+
+        for claimed in tasks.claim('notifications', 'worker', 10):
+            self.assertEqual(tasks.run(claimed), Task.DONE)
+        self.assertEqual(sorted(message.subject for message in mail.outbox),
+                         ['Application received: Backend Engineer', 'Welcome to Jobseeker'])
+
+
+class TaskWorkerTests(TransactionTestCase):
+    def test_burst_worker_drains_every_queue(self):
+        for value in range(20):
+            enqueue(record_call, value=value)
+        out = StringIO()
+        call_command('run_worker', burst=True, concurrency=3, stdout=out)
+
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 20)
+        self.assertEqual(tasks.queue_stats(), {'default': {Task.DONE: 20}})
+        self.assertIn('default: 20 done, 0 retried, 0 failed', out.getvalue())
+
+
+def make_docx(*paragraphs):
+    body = ''.join(f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>' for text in paragraphs)
+    output = BytesIO()
+    with zipfile.ZipFile(output, 'w') as archive:
+        archive.writestr('word/document.xml', (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ))
+    return output.getvalue()
+
+
+def make_pdf(content):
+    stream = zlib.compress(content)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R'
+        b' /Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length ' + str(len(stream)).encode() + b' /Filter /FlateDecode >>\nstream\n' + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    pdf, offsets = b'%PDF-1.4\n', []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += str(number).encode() + b' 0 obj\n' + body + b'\nendobj\n'
+    xref = len(pdf)
+    pdf += b'xref\n0 ' + str(len(objects) + 1).encode() + b'\n0000000000 65535 f \n'
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    return pdf + b'trailer\n<< /Size ' + str(len(objects) + 1).encode() + b' /Root 1 0 R >>\nstartxref\n' \
+        + str(xref).encode() + b'\n%%EOF\n'
+
+
+class ResumeExtractionTests(TestCase):
+    def test_extracts_each_format(self):
+        self.assertEqual(resumes.extract_text('cv.txt', '\ufeffPython  \x00developer\n\n\n\nLagos'.encode()),
+                         'Python developer\n\nLagos')
+        self.assertEqual(resumes.extract_text('CV.DOCX', make_docx('Ada Lovelace', 'Django &amp; REST')),
+                         'Ada Lovelace\nDjango & REST')
+        pdf = make_pdf(b'BT /F1 12 Tf 72 720 Td (Senior \\(Python\\)) Tj 0 -14 Td [(Dja) 20 (ngo) -300 (expert)] TJ'
+                       b' <204C61676F73> Tj ET')
+        self.assertEqual(resumes.extract_text('cv.pdf', pdf), 'Senior (Python)\nDjango expert Lagos')
+
+    def test_rejects_unsupported_and_broken_files(self):
+        for name, data in (('cv.odt', b'text'), ('cv.docx', b'not a zip'), ('cv.pdf', b'<html>'),
+                           ('cv.pdf', b'%PDF-1.4\ntruncated')):
+            with self.assertRaises(resumes.ExtractionError):
+                resumes.extract_text(name, data)
+
+    def test_matches_whole_skill_names(self):
+        skills = [(1, 'Go'), (2, 'Machine Learning'), (3, 'C++'), (4, 'Node.js'), (5, 'Rust')]
+        text = 'Google, machine learning with C++ and Node.js'
+        self.assertEqual(resumes.match_skills(text, skills), [2, 3, 4])
+
+
+class ResumeSearchTests(APITestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        for name in ('Python', 'Django', 'Kubernetes'):
+            Skill.objects.create(name=name)
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.job = make_job(self.company)
+        self.ada = self.apply('Ada', 'cv.txt', b'Python and Django developer. Django REST framework.')
+        self.bob = self.apply('Bob', 'cv.docx', make_docx('Kubernetes operator', 'Some Python'))
+        self.eve = self.apply('Eve', 'cv.odt', b'Django')
+        self.drain()
+
+        staff = CustomUser.objects.create_user('recruiter', 'r@example.com', 'x', phone_number='08000000009',
+                                               is_staff=True)
+        self.client.force_authenticate(staff)
+
+    def apply(self, name, filename, content):
+        return Application.objects.create(
+            job=self.job, company=self.company, applicant_name=name, applicant_email=f'{name}@example.com',
+            cover_letter='Hello', resume=ContentFile(content, name=filename),
+        )
+
+    def drain(self):
+        while claimed := tasks.claim('resumes', 'worker', 10):
+            for claimed_task in claimed:
+                self.assertEqual(tasks.run(claimed_task), Task.DONE)
+
+    def search(self, **params):
+        return self.client.get('/application/search/', {'job': self.job.id, **params})
+
+    def test_worker_indexes_text_and_skills(self):
+        document = ResumeDocument.objects.get(application=self.ada)
+        self.assertEqual(document.source, self.ada.resume.name)
+        self.assertIn('Django REST framework', document.text)
+        self.assertEqual(sorted(document.matched_skills.values_list('name', flat=True)), ['Django', 'Python'])
+        self.assertEqual(ResumeDocument.objects.get(application=self.eve).error, 'Unsupported resume format odt')
+
+        # Only a new resume is extracted again
+        self.ada.cover_letter = 'Updated'
+        self.ada.save()
+        self.assertFalse(Task.objects.filter(queue='resumes', status=Task.QUEUED).exists())
+        self.assertEqual(ResumeDocument.objects.get(application=self.ada).cover_letter, 'Updated')
+        self.ada.resume = ContentFile(b'Kubernetes', name='new.txt')
+        self.ada.save()
+        self.drain()
+        self.assertEqual(list(ResumeDocument.objects.get(application=self.ada).matched_skills.values_list(
+            'name', flat=True)), ['Kubernetes'])
+
+    def test_search_ranks_applications_by_resume(self):
+        response = self.search(q='django')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['applicant_name'] for result in response.data['results']], ['Ada'])
+        self.assertEqual(sorted(response.data['results'][0]['resume_skills']), ['Django', 'Python'])
+
+        response = self.search(q='python')
+        self.assertEqual(sorted(result['applicant_name'] for result in response.data['results']), ['Ada', 'Bob'])
+        response = self.client.get('/application/search/', {'company': self.company.id, 'skill': 'kubernetes'})
+        self.assertEqual([result['applicant_name'] for result in response.data['results']], ['Bob'])
+
+        other = make_job(self.company)
+        response = self.client.get('/application/search/', {'job': other.id, 'q': 'python'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_search_is_for_staff_and_scoped(self):
+        self.assertEqual(self.client.get('/application/search/', {'q': 'python'}).status_code, 400)
+        self.assertEqual(self.search(q='python', company='x').status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertIn(self.search(q='python').status_code, (401, 403))
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        for metric in metrics.METRICS:
+            metric.clear()
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        make_job(company)
+
+    def test_server_timing_and_histograms(self):
+        response = self.client.get('/job/')
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'ser', 'total'})
+        self.assertRegex(timing['db'], r'^dur=[\d.]+;desc="[1-9]\d* queries"$')
+
+        enqueue(record_call, value=1)
+        self.client.force_login(CustomUser.objects.create(username='admin', phone_number='08000000099', is_staff=True))
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{view="job-list",method="GET",le="+Inf"} 1', text)
+        self.assertIn('http_request_serializer_duration_seconds_count{view="job-list",method="GET"} 1', text)
+        self.assertIn('http_responses_total{view="job-list",method="GET",status="200"} 1', text)
+        self.assertIn('background_tasks{queue="default",status="queued"} 1', text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_metrics_are_hidden_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        self.client.force_login(CustomUser.objects.create(username='ada', phone_number='08000000001'))
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_sampled_stacks_are_written_as_collapsed_stacks(self):
+        sampler.start()
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+        samples = sampler.stop()
+        self.assertTrue(any(stack.endswith('MetricsTests.test_sampled_stacks_are_written_as_collapsed_stacks')
+                            for stack in samples))
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILE_DIR=directory):
+            dump_profile('job-list', 'GET', 0.1, samples)
+            name, = os.listdir(directory)
+            self.assertTrue(name.endswith('-GET-job-list-100ms.folded'))
+            with open(os.path.join(directory, name)) as dump:
+                self.assertRegex(dump.readline(), r'^\S+(;\S+)* \d+$')
+
+
+class SeedCommandTests(TestCase):
+    def test_seeds_consistent_rows(self):
+        from wallet.models import Posting, Transaction, Wallet
+
+        call_command('seed', scale=0.001, seed=3, stdout=StringIO())
+        self.assertEqual((Company.objects.count(), Job.objects.count(), CustomUser.objects.count()), (2, 100, 100))
+        self.assertGreater(Transaction.objects.count(), 150)
+        self.assertEqual(Posting.objects.count(), 2 * Transaction.objects.count())
+        self.assertTrue(Application.objects.filter(applicant_email__startswith='seed3-').exists())
+        self.assertEqual(JobSearchDocument.objects.count(), 100)
+        self.assertTrue(Job.objects.filter(created_at__lt=timezone.now() - timedelta(days=30)).exists())
+        for wallet in Wallet.objects.filter(userwallet__isnull=False):
+            self.assertEqual(wallet.balance, wallet.ledger_balance())
+        with self.assertRaisesMessage(CommandError, 'already exist'):
+            call_command('seed', scale=0.001, seed=3, stdout=StringIO())
+
+
+class QueryPlanAuditTests(TestCase):
+    @staticmethod
+    def captured_sql(queryset):
+        # As the audit sees it, with the parameters inlined
+        with CaptureQueriesContext(connection) as queries:
+            list(queryset)
+        return queries[-1]['sql']
+
+    def setUp(self):
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        for i in range(30):
+            make_job(company, location='Lagos' if i % 3 else 'Abuja', salary=1000 * i)
+        self.explainer = query_plans.Explainer(min_rows=0)
+
+    def test_flags_scans_and_recommends_an_index(self):
+        sql = self.captured_sql(Job.objects.filter(location='Lagos', is_active=True).order_by('-salary'))
+        statement = query_plans.Statement(sql, {'job-list'})
+        statement.plan = self.explainer.explain(sql)
+        self.assertEqual({finding.kind for finding in statement.plan.findings} & {'scan', 'sort'}, {'scan', 'sort'})
+        self.assertEqual(query_plans.candidate(sql, 'jobseek_job', Job), (('location', 'is_active', 'salary'), False))
+
+        recommendation, = query_plans.recommend([statement], self.explainer)
+        self.assertEqual(recommendation.index.fields, ['location', 'is_active', 'salary'])
+        self.assertGreater(recommendation.resolved, 0)
+        self.assertTrue(recommendation.useful)
+        # The trial index is rolled back
+        self.assertEqual(self.explainer.explain(sql).findings, statement.plan.findings)
+
+    def test_indexed_filters_are_not_recommended_again(self):
+        sql = self.captured_sql(
+            Application.objects.filter(applicant_email='a@example.com').order_by('-created_at', '-id')
+        )
+        self.assertEqual(query_plans.candidate(sql, 'jobseek_application', Application),
+                         (('applicant_email', 'created_at', 'id'), False))
+        statement = query_plans.Statement(sql)
+        statement.plan = self.explainer.explain(sql)
+        self.assertEqual(query_plans.recommend([statement], self.explainer), [])
+
+    def test_command_audits_every_read_endpoint(self):
+        CustomUser.objects.create(username='ada', phone_number='08000000001', email='ada@example.com')
+        output = StringIO()
+        call_command('audit_queries', min_rows=0, stdout=output)
+        text = output.getvalue()
+        self.assertIn('job-list /job/: 200', text)
+        self.assertIn('application-get-by-user /application/get_by_user/: 200', text)
+        self.assertIn('distinct statements', text)
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        authentication.user_rows.clear()
+        self.user = CustomUser.objects.create_user(
+            username='ada', email='ada@example.com', password='secret', phone_number='08000000001',
+        )
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        Application.objects.create(job=make_job(company), company=company, applicant_name='Ada',
+                                   applicant_email='ada@example.com', cover_letter='Hi')
+
+    def obtain(self, password='secret'):
+        response = self.client.post('/api/token/', {'username': 'ada', 'password': password})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get(self, path, access):
+        return self.client.get(path, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_requests_do_not_read_the_user(self):
+        access = self.obtain()['access']
+        self.get('/application/get_by_user/', access)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get('/application/get_by_user/', access)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertFalse([query for query in queries if 'jobseek_customuser' in query['sql']])
+
+        # The rest of the row is read once, when a view needs it
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get('/user/get_current_user/', access).data['phone_number'], '08000000001')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/user/get_current_user/', access).data['phone_number'], '08000000001')
+
+    def test_password_change_and_deactivation_revoke_tokens(self):
+        access = self.obtain()['access']
+        self.assertEqual(self.get('/user/get_current_user/', access).status_code, 200)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.get('/user/get_current_user/', access).data['detail'], 'Token was revoked')
+
+        tokens = self.obtain('changed')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get('/user/get_current_user/', tokens['access']).status_code, 401)
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_demotion_revokes_access_and_refresh_writes_the_current_claims(self):
+        self.user.is_staff = True
+        self.user.save()
+        tokens = self.obtain()
+        self.assertEqual(self.get('/application/export/', tokens['access']).status_code, 200)
+        self.user.is_staff = False
+        self.user.email = 'ada@example.org'
+        self.user.save()
+        self.assertEqual(self.get('/application/export/', tokens['access']).data['detail'], 'Token was revoked')
+
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        for token in (RefreshToken(response.data['refresh']), AccessToken(response.data['access'])):
+            self.assertEqual((token['staff'], token['email']), (False, 'ada@example.org'))
+        self.assertEqual(self.get('/application/export/', response.data['access']).status_code, 403)
+        self.assertEqual(self.get('/user/get_current_user/', response.data['access']).data['email'], 'ada@example.org')
+        self.assertEqual(self.get('/application/get_by_user/', response.data['access']).data['results'], [])
+
+    def test_refresh_rotates_and_blacklists_once(self):
+        refresh = self.obtain()['refresh']
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get('/user/get_current_user/', response.data['access']).status_code, 200)
+        rotated = response.data['refresh']
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': refresh}).status_code, 401)
+
+        # Also refused by a process that has not seen it yet
+        authentication.blacklisted.clear()
+        authentication.outstanding_ids.clear()
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': refresh}).status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': rotated}).status_code, 200)
+
+
+class RecommendationTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        skills = {name: Skill.objects.create(name=name) for name in ('Python', 'Django', 'SQL', 'Figma')}
+
+        def job(title, *names, **kwargs):
+            job = make_job(self.company, title=title, **kwargs)
+            for name in names:
+                JobSkill.objects.create(job=job, skills=skills[name])
+            return job
+
+        self.applied = job('Applied', 'Python', 'Django')
+        self.backend = job('Backend', 'Python', 'Django', 'SQL')
+        self.python = job('Python', 'Python')
+        job('Design', 'Figma')
+        job('Closed', 'Python', 'Django', is_active=False)
+        self.user = CustomUser.objects.create(username='ada', phone_number='08000000001', email='ada@example.com')
+        self.apply(self.applied)
+        self.client.force_authenticate(self.user)
+
+    def apply(self, job):
+        Application.objects.create(job=job, company=self.company, applicant_name='Ada',
+                                   applicant_email='ada@example.com', cover_letter='')
+
+    def test_search_matches_scoring_every_job(self):
+        generator = random.Random(5)
+        matrix = recommendations.SkillMatrix(
+            (job_id, generator.sample(range(12), generator.randint(1, 5))) for job_id in range(1, 400)
+        )
+        for _ in range(10):
+            # Every skill is in the profile, so every job is searched
+            skill_lists = [range(12)] + [generator.sample(range(12), 3) for _ in range(3)]
+            profile = recommendations.profile_vector(skill_lists, matrix.weight)
+            exclude = set(generator.sample(range(1, 400), 20))
+            expected = heapq.nlargest(10, (
+                (matrix.score(row, profile), job_id) for row, job_id in enumerate(matrix.job_ids)
+                if job_id not in exclude
+            ))
+            found = matrix.top(profile, 10, exclude)
+            self.assertEqual([round(score, 9) for _, score in found], [round(score, 9) for score, _ in expected])
+            self.assertFalse({job_id for job_id, _ in found} & exclude)
+
+    def test_command_stores_recommendations_served_by_the_endpoint(self):
+        call_command('recommend_jobs', stdout=StringIO())
+        # Backend has a skill the profile lacks, it comes from filling the list
+        stored = JobRecommendation.objects.get(user=self.user)
+        self.assertEqual([job_id for job_id, _ in stored.jobs], [self.backend.pk, self.python.pk])
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/job/recommended/')
+        self.assertEqual(response.data['source'], 'stored')
+        self.assertEqual([job['title'] for job in response.data['results']], ['Backend', 'Python'])
+        self.assertGreater(response.data['results'][0]['score'], response.data['results'][1]['score'])
+
+        self.python.is_active = False
+        self.python.save()
+        response = self.client.get('/job/recommended/')
+        self.assertEqual([job['title'] for job in response.data['results']], ['Backend'])
+
+    def test_users_without_stored_recommendations_are_scored_live(self):
+        response = self.client.get('/job/recommended/')
+        self.assertEqual(response.data['source'], 'live')
+        self.assertEqual([job['title'] for job in response.data['results']], ['Backend', 'Python'])
+
+        call_command('recommend_jobs', stdout=StringIO())
+        self.apply(self.backend)
+        self.assertFalse(JobRecommendation.objects.filter(user=self.user).exists())
+        response = self.client.get('/job/recommended/')
+        self.assertEqual(response.data['source'], 'live')
+        self.assertEqual([job['title'] for job in response.data['results']], ['Python'])
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/job/recommended/').status_code, 401)
+
+
+class PlaceTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', location='Ikeja, Lagos', description='')
+        # One job in every city and district of the gazetteer
+        self.jobs = {
+            place.id: make_job(self.company, location=place.name)
+            for place in places.gazetteer().places.values() if place.kind in ('city', 'district')
+        }
+
+    def test_locations_resolve_to_the_most_specific_place(self):
+        for text, place_id in [('Ikeja, Lagos State', 'ng-la-ikeja'), ('Lekki Phase 1, Lagos', 'ng-la-lekki'),
+                               ('Port Harcourt, Rivers State', 'ng-ri-port-harcourt'), ('Lagos', 'ng-la-lagos'),
+                               ('Wuse 2, Abuja FCT', 'ng-fc-wuse'), ('Accra, Ghana', 'gh-accra')]:
+            self.assertEqual(places.resolve(text).id, place_id)
+        self.assertIsNone(places.resolve('Remote'))
+        self.assertEqual(places.resolve('Lagos', broad=True).id, 'ng-la')
+
+        job = make_job(self.company, location='Remote')
+        self.assertEqual((job.place_id, job.latitude, job.geohash), ('', None, ''))
+        job.location = 'Victoria Island, Lagos'
+        job.save()
+        job.refresh_from_db()
+        self.assertEqual(job.place_id, 'ng-la-victoria-island')
+        self.assertEqual(job.geohash, places.encode(job.latitude, job.longitude))
+        self.assertEqual(self.company.place_id, 'ng-la-ikeja')
+
+    def test_location_search_matches_places_under_it(self):
+        lagos = places.gazetteer().within(places.resolve('Lagos State'))
+        found = {job.id for job in search_jobs(Job.objects.all(), location='Lagos')}
+        self.assertEqual(found, {job.id for place_id, job in self.jobs.items() if place_id in lagos})
+        self.assertIn(self.jobs['ng-la-ikeja'].id, found)
+        self.assertNotIn(self.jobs['ng-fc-abuja'].id, found)
+
+        found = {job.id for job in search_jobs(Job.objects.all(), location='ikeja')}
+        self.assertEqual(found, {self.jobs['ng-la-ikeja'].id})
+
+    def test_radius_matches_the_distance_of_every_job(self):
+        for near, km in [('Ikeja', 12), ('Lagos', 50), ('Abuja', 300), ('6.45,3.6', 30), ('Nairobi', 1000)]:
+            latitude, longitude = places.point(near)
+            expected = {
+                job.id for job in self.jobs.values()
+                if places.distance_km(latitude, longitude, *places.decode(job.geohash)) <= km
+            }
+            found = set(places.filter_area(Job.objects.all(), near=near, radius=str(km)).values_list('id', flat=True))
+            self.assertEqual(found, expected, (near, km))
+            self.assertTrue(expected)
+
+    def test_bounding_box_and_invalid_areas(self):
+        response = self.client.get('/job/search/', {'bbox': '6.4,3.3,6.7,3.5', 'page_size': 100})
+        found = {job['id'] for job in response.data['results']}
+        self.assertEqual(found, {
+            job.id for job in self.jobs.values()
+            if 6.4 <= job.latitude <= 6.7 and 3.3 <= job.longitude <= 3.5
+        })
+        self.assertIn(self.jobs['ng-la-ikeja'].id, found)
+
+        for params in [{'near': 'Atlantis'}, {'near': 'Lagos', 'radius': 'far'}, {'near': 'Lagos', 'radius': '5000'},
+                       {'bbox': '7,3,6,4'}, {'bbox': '1,2,3'}]:
+            self.assertEqual(self.client.get('/job/search/', params).status_code, 400, params)
+        self.assertEqual(self.client.get('/company/nearby/').status_code, 400)
+
+        response = self.client.get('/company/nearby/', {'near': 'Lagos', 'radius': '25'})
+        self.assertEqual([company['id'] for company in response.data['results']], [self.company.id])
+        response = self.client.get('/company/nearby/', {'near': 'Abuja', 'radius': '25'})
+        self.assertEqual(response.data['results'], [])
+
+    async def test_async_search_applies_the_same_area(self):
+        for params in [{'bbox': '6.4,3.3,6.7,3.5'}, {'near': 'Abuja', 'radius': '300', 'q': 'engineer'}]:
+            params = dict(params, page_size=100)
+            expected = (await sync_to_async(self.client.get)('/job/search/', params)).json()
+            response = await self.async_client.get('/async/job/search/', params)
+            self.assertEqual(response.json(), expected)
+            self.assertLess(len(expected['results']), len(self.jobs))
+        response = await self.async_client.get('/async/job/search/', {'near': 'Atlantis'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill_resolves_rows_written_without_signals(self):
+        Job.objects.update(place_id='', latitude=None, longitude=None, geohash='')
+        Company.objects.filter(pk=self.company.pk).update(place_id='stale')
+        output = StringIO()
+        call_command('resolve_locations', chunk=7, stdout=output)
+        self.assertIn(f'Job: {len(self.jobs)} rows, {len(self.jobs)} updated, 0 without a place', output.getvalue())
+        for place_id, job in self.jobs.items():
+            job.refresh_from_db()
+            self.assertEqual(job.place_id, place_id)
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.place_id, 'ng-la-ikeja')
+
+
+class SalaryTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.python = Skill.objects.create(name='Python')
+        self.django = Skill.objects.create(name='Django')
+
+    def histograms(self):
+        return sorted(
+            (facet, value, bucket, count, round(total, 2))
+            for facet, value, bucket, count, total in SalaryBucket.objects.filter(count__gt=0)
+            .values_list('facet', 'value', 'bucket', 'count', 'total')
+        )
+
+    def test_histograms_match_a_rebuild(self):
+        job = make_job(self.company, salary=300000, location='Ikeja, Lagos State')
+        other = make_job(self.company, salary=900000, experience_level=4, location='Abuja')
+        JobSkill.objects.create(job=job, skills=self.python)
+        link = JobSkill.objects.create(job=other, skills=self.python)
+        JobSkill.objects.create(job=other, skills=self.django)
+
+        job.salary = 350000
+        job.location = 'Kano'
+        job.save()
+        link.skills = self.django
+        link.save()
+        other.is_active = False
+        other.save()
+        other.salary = 950000
+        other.is_active = True
+        other.save()
+        make_job(self.company, salary=1).delete()
+        self.client.post('/job/bulk/', [
+            {'title': 'Analyst', 'description': 'Reports', 'company': 'Acme', 'location': 'Lekki, Lagos', 'job_type': 1,
+             'experience_level': 1, 'salary': 420000, 'skills': ['Python', 'SQL']},
+        ], format='json')
+
+        maintained = self.histograms()
+        salaries.rebuild(chunk_size=2)
+        self.assertEqual(maintained, self.histograms())
+        self.assertEqual(salaries.report({})['count'], 3)
+        self.assertEqual(salaries.report({'skill': 'django'})['mean'], 950000)
+        self.assertEqual(salaries.report({'location': 'Lagos'})['count'], 1)
+
+    def test_percentiles_are_within_the_accuracy(self):
+        generator = random.Random(4)
+        values = [round(generator.lognormvariate(13, 1), -2) for _ in range(2000)] + [0]
+        Job.objects.bulk_create(
+            Job(company=self.company, title='Job', description='', location='Lagos', job_type=0,
+                experience_level=0, salary=salary)
+            for salary in values
+        )
+        salaries.rebuild()
+        percentiles = (0.1, 1, 5, 25, 50, 75, 95, 99, 100)
+        summary = salaries.report({'percentiles': ','.join(map(str, percentiles))})
+
+        values.sort()
+        self.assertEqual(summary['count'], len(values))
+        self.assertAlmostEqual(summary['mean'], sum(values) / len(values), places=1)
+        self.assertEqual(summary['min'], 0)
+        for percentile in percentiles:
+            actual = values[math.ceil(percentile / 100 * len(values)) - 1]
+            estimate = summary['percentiles'][f'p{percentile:g}']
+            self.assertLessEqual(abs(estimate - actual), actual * 0.01 + 0.01, percentile)
+
+    def test_endpoint_filters_groups_and_caches(self):
+        make_job(self.company, salary=100000, experience_level=1, location='Ikeja, Lagos State')
+        make_job(self.company, salary=200000, experience_level=1, location='Abuja')
+        make_job(self.company, salary=800000, experience_level=3, location='Abuja', is_active=False)
+
+        data = self.client.get('/job/salaries/', {'by': 'experience_level', 'percentiles': '50'}).data
+        self.assertEqual([(row['value'], row['label'], row['count']) for row in data['results']], [('1', 'Entry Level', 2)])
+        self.assertEqual(data['results'][0]['mean'], 150000)
+
+        data = self.client.get('/job/salaries/', {'location': 'Lagos'}).data
+        self.assertEqual((data['value'], data['label'], data['count']), ('ng-la', 'Lagos State', 1))
+        self.assertLessEqual(abs(data['percentiles']['p50'] - 100000), 1000)
+
+        self.client.get('/job/salaries/', {'experience_level': '1'})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/job/salaries/', {'experience_level': '1'}).data['count'], 2)
+        make_job(self.company, salary=300000, experience_level=1)
+        self.assertEqual(self.client.get('/job/salaries/', {'experience_level': '1'}).data['count'], 3)
+
+        for params in [{'skill': 'Cobol'}, {'skill': 'Python', 'location': 'Lagos'}, {'by': 'salary'},
+                       {'percentiles': '0'}, {'experience_level': '9'}, {'location': 'Atlantis'}]:
+            self.assertEqual(self.client.get('/job/salaries/', params).status_code, 400, params)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.acme = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.other = Company.objects.create(name='Globex', location='Abuja', description='')
+        self.old = make_job(self.acme, title='Old, "quoted"', location='Ikeja, Lagos State')
+        self.new = make_job(self.acme, title='New', is_active=False)
+        self.elsewhere = make_job(self.other, title='Elsewhere')
+        JobSkill.objects.create(job=self.old, skills=Skill.objects.create(name='Python'))
+        JobSkill.objects.create(job=self.old, skills=Skill.objects.create(name='Django'))
+        Job.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.application = Application.objects.create(
+            job=self.old, company=self.acme, applicant_name='Ada', applicant_email='ada@example.com', cover_letter='Hi',
+        )
+        Application.objects.create(
+            job=self.elsewhere, company=self.other, applicant_name='Bola', applicant_email='bola@example.com',
+            cover_letter='Hello',
+        )
+
+    def test_jobs_stream_as_ndjson_csv_or_gzip_with_filters(self):
+        response = self.client.get('/job/export/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.old.id, self.new.id, self.elsewhere.id])
+        self.assertEqual((rows[0]['skills'], rows[0]['place_id'], rows[0]['company']),
+                         (['Python', 'Django'], 'ng-la-ikeja', 'Acme'))
+
+        start = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get('/job/export/', {'output': 'csv', 'company': self.acme.id, 'start': start})
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row['title'] for row in rows], ['New'])
+
+        response = self.client.get('/job/export/', {'output': 'csv', 'compress': 'gzip', 'is_active': 'true'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('jobs.csv.gz', response['Content-Disposition'])
+        rows = list(csv.DictReader(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()))
+        self.assertEqual([(row['title'], row['skills']) for row in rows],
+                         [('Old, "quoted"', 'Python|Django'), ('Elsewhere', '')])
+
+        for params in [{'output': 'xml'}, {'company': 'acme'}, {'end': 'soon'}, {'is_active': 'yes'}]:
+            self.assertEqual(self.client.get('/job/export/', params).status_code, 400, params)
+
+    def test_applications_are_exported_to_admins(self):
+        self.assertIn(self.client.get('/application/export/').status_code, (401, 403))
+        admin = CustomUser.objects.create(username='admin', phone_number='08000000099', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get('/application/export/', {'company': self.acme.id})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(row['id'], row['job'], row['applicant_email']) for row in rows],
+                         [(self.application.id, 'Old, "quoted"', 'ada@example.com')])
+
+    def test_command_writes_a_compressed_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'applications.ndjson.gz')
+            call_command('export', 'applications', gzip=True, is_active=True, file=path, stdout=StringIO())
+            with open(path, 'rb') as exported:
+                rows = [json.loads(line) for line in gzip.decompress(exported.read()).splitlines()]
+        self.assertEqual(len(rows), 2)
+
+    def test_memory_does_not_grow_with_the_rows(self):
+        def peak(count):
+            Job.objects.bulk_create(
+                Job(company=self.acme, title=f'Job {i}', description='x' * 200, location='Lagos', job_type=0,
+                    experience_level=0, salary=1)
+                for i in range(count - Job.objects.count())
+            )
+            chunks, _, _ = exports.stream('jobs', Job.objects.all(), compress=True, batch_size=200)
+            tracemalloc.start()
+            try:
+                written = sum(len(chunk) for chunk in chunks)
+                return tracemalloc.get_traced_memory()[1], written
+            finally:
+                tracemalloc.stop()
+
+        small, small_size = peak(500)
+        large, large_size = peak(10_000)
+        self.assertGreater(large_size, small_size * 10)
+        self.assertLess(large, small * 1.5)
+
+
+class ChangeFeedTests(APITestCase):
+    def setUp(self):
+        self.acme = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.job = make_job(self.acme, title='Existing')
+        self.cursor = self.client.get('/changes/head/').data['cursor']
+
+    def entries(self, cursor, **params):
+        response = self.client.get('/changes/', {'cursor': cursor, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(entry['model'], entry['id'], entry['action']) for entry in response.data['results']], response.data
+
+    def test_changes_are_coalesced_with_tombstones_for_deletes(self):
+        created = make_job(self.acme, title='Created')
+        created.title = 'Created and renamed'
+        created.save()
+        self.job.title = 'Renamed'
+        self.job.save()
+        deleted = make_job(self.acme, title='Deleted')
+        Job.objects.filter(pk=deleted.pk).delete()
+
+        entries, data = self.entries(self.cursor)
+        self.assertEqual(entries, [
+            ('job', created.id, 'created'), ('job', self.job.id, 'updated'), ('job', deleted.id, 'deleted'),
+        ])
+        self.assertEqual(data['results'][0]['data']['title'], 'Created and renamed')
+        self.assertIsNone(data['results'][2]['data'])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.entries(data['next_cursor'])[0], [])
+        self.assertEqual(self.entries(self.cursor, models='company')[0], [])
+
+    def test_pages_follow_the_cursor(self):
+        jobs = [make_job(self.acme, title=f'Job {index}') for index in range(3)]
+        seen, cursor, has_more = [], self.cursor, True
+        while has_more:
+            entries, data = self.entries(cursor, limit=1)
+            seen.extend(object_id for _, object_id, _ in entries)
+            cursor, has_more = data['next_cursor'], data['has_more']
+        self.assertEqual(seen, [job.id for job in jobs])
+
+    def test_bulk_writes_and_cascades_are_logged_but_rollbacks_are_not(self):
+        bulk = Job.objects.bulk_create([Job(
+            title='Bulk', description='Bulk', location='Lagos', job_type=0, experience_level=2, salary=1000,
+            company=self.acme,
+        )])
+        Job.objects.filter(pk=self.job.pk).update(salary=2000)
+        try:
+            with transaction.atomic():
+                make_job(self.acme, title='Rolled back')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.entries(self.cursor)[0], [('job', bulk[0].id, 'created'), ('job', self.job.id, 'updated')])
+
+        cursor = self.client.get('/changes/head/').data['cursor']
+        company_id = self.acme.id
+        self.acme.delete()
+        self.assertEqual(sorted(self.entries(cursor)[0]), sorted([
+            ('company', company_id, 'deleted'), ('job', self.job.id, 'deleted'), ('job', bulk[0].id, 'deleted'),
+        ]))
+
+    def test_migrate_creates_missing_triggers_again(self):
+        self.assertEqual(changes.missing_triggers(connection), [])
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER jobseek_job_change_ai')
+        self.assertEqual(changes.missing_triggers(connection), ['jobseek_job_change_ai'])
+        with self.assertLogs('jobseek.changes', 'WARNING'):
+            call_command('migrate', verbosity=0)
+        self.assertEqual(changes.missing_triggers(connection), [])
+        created = make_job(self.acme, title='Logged again')
+        self.assertEqual(self.entries(self.cursor)[0], [('job', created.id, 'created')])
+
+    def test_pruned_cursors_expire_and_invalid_ones_are_rejected(self):
+        make_job(self.acme, title='Later')
+        Change.objects.update(changed_at=timezone.now() - timedelta(days=40))
+        make_job(self.acme, title='Recent')
+        head = self.client.get('/changes/head/').data['cursor']
+        call_command('prune_changes', days=30, stdout=StringIO())
+
+        self.assertEqual(self.client.get('/changes/', {'cursor': self.cursor}).status_code, 410)
+        self.assertEqual(self.client.get('/changes/').status_code, 410)
+        self.assertEqual(self.entries(head)[0], [])
+        for params in [{'cursor': 'nope'}, {'cursor': head, 'limit': 0}, {'cursor': head, 'models': 'skill'}]:
+            self.assertEqual(self.client.get('/changes/', params).status_code, 400, params)
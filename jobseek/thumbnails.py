@@ -0,0 +1,212 @@
+"""
+Fixed-size WebP and JPEG derivatives of uploaded images, rendered in a
+process pool so that decoding and resizing neither blocks a request nor
+holds the GIL of the serving process.
+
+Derivatives are stored under `derivatives/` in the default storage and named
+after the SHA-256 of the source content, so identical uploads share them and
+a changed upload never serves stale ones. The digest is recorded on the row
+once the derivatives exist.
+
+A saved image is rendered by a background task run by `manage.py
+run_worker`: the worker thread reads the source, waits for the pool and
+stores the result on its own database connection, and a failure is retried
+by the queue. Requests only queue the task.
+
+This module is imported by the pool workers, which do not set up Django, so
+it must not import models at module level.
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels of each derivative
+SIZES = {'small': 64, 'medium': 256}
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = 80
+PREFIX = 'derivatives/'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def derivative_name(digest, size, extension):
+    return f'{PREFIX}{digest[:2]}/{digest}/{size}.{extension}'
+
+
+def derivative_urls(digest, request=None):
+    """
+    Returns the URLs of the derivatives of a source digest as
+    `{size: {format: url}}`, or None while they have not been rendered.
+    """
+    if not digest:
+        return None
+    urls = {}
+    for size in SIZES:
+        urls[size] = {}
+        for extension in FORMATS:
+            url = default_storage.url(derivative_name(digest, size, extension))
+            urls[size][extension] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def render(data):
+    """
+    Renders every derivative of an image. Runs in a pool worker.
+
+    The image is rotated according to its EXIF orientation and re-encoded
+    from the pixels alone, which drops EXIF, XMP, ICC and any other
+    metadata of the upload.
+
+    Args:
+        data (bytes): Content of the source image.
+
+    Returns:
+        tuple: The SHA-256 of the source and the encoded derivatives by
+        storage name.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    derivatives = {}
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for size, pixels in SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+            for extension, image_format in FORMATS.items():
+                rendered = thumbnail
+                if image_format == 'JPEG' and has_alpha:
+                    # JPEG has no alpha channel, flatten onto white
+                    rendered = Image.new('RGB', thumbnail.size, 'white')
+                    rendered.paste(thumbnail, mask=thumbnail.getchannel('A'))
+                output = BytesIO()
+                rendered.save(output, image_format, quality=QUALITY)
+                derivatives[derivative_name(digest, size, extension)] = output.getvalue()
+    return digest, derivatives
+
+
+def get_pool():
+    """Returns the shared process pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a threaded server process is unsafe, workers come from a clean server
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('forkserver'),
+            )
+        return _pool
+
+
+def read_source(storage, name):
+    with storage.open(name, 'rb') as source:
+        return source.read()
+
+
+def store(model, pk, field, digest_field, source_name, result, scopes=()):
+    """
+    Saves rendered derivatives and records their digest on the row, unless
+    the row has meanwhile moved on to another source image.
+
+    Returns:
+        bool: Whether the row was updated.
+    """
+    digest, derivatives = result
+    for name, content in derivatives.items():
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content))
+    updated = model.objects.filter(pk=pk, **{field: source_name}).update(
+        **{digest_field: digest, 'updated_at': timezone.now()}
+    )
+    if updated and scopes:
+        from . import caching
+        caching.invalidate(*scopes)
+    return bool(updated)
+
+
+def generate(model, pk, field, digest_field, scopes=(), pool=None):
+    """
+    Renders and stores the derivatives of the current image of a row, unless
+    it has none or they are already recorded. Runs in a background task.
+
+    Args:
+        model: Company or CustomUser.
+        pk: Primary key of the row.
+        field (str): Name of the image field.
+        digest_field (str): Name of the field holding the derivative digest.
+        scopes (iterable, optional): Response cache scopes to invalidate.
+        pool (Executor, optional): Defaults to the shared process pool.
+
+    Returns:
+        bool: Whether the row was updated.
+    """
+    row = model.objects.filter(pk=pk).values_list(field, digest_field).first()
+    if row is None or not row[0] or row[1]:
+        return False
+    source = read_source(model._meta.get_field(field).storage, row[0])
+    result = (pool or get_pool()).submit(render, source).result()
+    return store(model, pk, field, digest_field, row[0], result, scopes)
+
+
+def regenerate(model, field, digest_field, queryset=None, pool=None, force=False, batch_size=None, scopes_for=None):
+    """
+    Renders the derivatives of every row of a model with an image, a batch
+    of rows at a time.
+
+    Args:
+        model: Company or CustomUser.
+        field (str): Name of the image field.
+        digest_field (str): Name of the field holding the derivative digest.
+        queryset (QuerySet, optional): Rows to consider, defaults to all.
+        pool (Executor, optional): Defaults to the shared process pool.
+        force (bool, optional): Render rows that already have derivatives.
+        batch_size (int, optional): Images in flight, defaults to 4 per worker.
+        scopes_for (callable, optional): Response cache scopes to invalidate
+            for a row, given its pk.
+
+    Returns:
+        tuple: Counts of rendered and failed images.
+    """
+    pool = pool or get_pool()
+    batch_size = batch_size or 4 * settings.THUMBNAIL_WORKERS
+    rows = (queryset if queryset is not None else model.objects.all()).exclude(**{field: ''}).exclude(**{field: None})
+    if not force:
+        rows = rows.filter(**{digest_field: ''})
+    rendered = failed = 0
+    batch = []
+
+    def drain():
+        nonlocal rendered, failed
+        for pk, name, future in batch:
+            try:
+                scopes = scopes_for(pk) if scopes_for else ()
+                store(model, pk, field, digest_field, name, future.result(), scopes)
+                rendered += 1
+            except Exception:
+                logger.warning('Could not render derivatives of %s', name, exc_info=True)
+                failed += 1
+        batch.clear()
+
+    storage = model._meta.get_field(field).storage
+    for pk, name in rows.order_by('pk').values_list('pk', field).iterator():
+        try:
+            batch.append((pk, name, pool.submit(render, read_source(storage, name))))
+        except OSError:
+            logger.warning('Could not read %s', name, exc_info=True)
+            failed += 1
+        if len(batch) >= batch_size:
+            drain()
+    drain()
+    return rendered, failed
@@ -0,0 +1,142 @@
+import hashlib
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import ResumeUpload, ResumeUploadChunk
+
+CHUNK_PREFIX = 'resume_uploads/'
+
+
+class UploadError(Exception):
+    pass
+
+
+class BodyReader:
+    """
+    Reads exactly `length` bytes of a request body, block by block, so that
+    a storage backend can stream it without the body being loaded first.
+    """
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        if not data:
+            # The client went away before sending the whole chunk
+            raise UploadError('Incomplete chunk')
+        return data
+
+
+class AssembledFile(File):
+    """
+    The chunks of an upload read back in order as one file, hashing the
+    content on the way. Only one storage read block is in memory at a time.
+    """
+
+    def __init__(self, names, size):
+        super().__init__(None)
+        self.names = names
+        self.size = size
+        self.sha256 = hashlib.sha256()
+
+    def chunks(self, chunk_size=None):
+        for name in self.names:
+            with default_storage.open(name, 'rb') as part:
+                for block in part.chunks(chunk_size):
+                    self.sha256.update(block)
+                    yield block
+
+    def multiple_chunks(self, chunk_size=None):
+        return True
+
+
+def store_chunk(upload, index, stream, length):
+    """
+    Streams one chunk of a request body to the storage backend. Sending a
+    chunk again replaces it, which is how a client resumes after a failure.
+
+    Args:
+        upload (ResumeUpload): The upload the chunk belongs to.
+        index (int): Position of the chunk, from 0.
+        stream: File-like request body.
+        length (int): Declared length of the body.
+
+    Raises:
+        UploadError: If the chunk is out of range, has the wrong length or
+        the upload is already finalized.
+    """
+    if upload.completed_at is not None:
+        raise UploadError('Upload already finalized')
+    if index >= upload.chunk_count:
+        raise UploadError(f'Chunk index must be below {upload.chunk_count}')
+    expected = upload.expected_chunk_size(index)
+    if length != expected:
+        raise UploadError(f'Chunk {index} must be {expected} bytes, got {length}')
+
+    previous = (
+        ResumeUploadChunk.objects.filter(upload=upload, index=index).values_list('name', flat=True).first()
+    )
+    name = default_storage.get_available_name(f'{CHUNK_PREFIX}{upload.pk}/{index}.part')
+    try:
+        name = default_storage.save(name, File(BodyReader(stream, length)))
+    except UploadError:
+        default_storage.delete(name)  # Drop the partial write
+        raise
+    # Single upsert statements, no read inside a transaction for writers to queue behind
+    ResumeUploadChunk.objects.bulk_create(
+        [ResumeUploadChunk(upload=upload, index=index, name=name)],
+        update_conflicts=True, unique_fields=['upload', 'index'], update_fields=['name'],
+    )
+    ResumeUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now())
+    if previous and previous != name:
+        default_storage.delete(previous)
+
+
+def finalize(upload):
+    """
+    Assembles the chunks into the resume of the application once every
+    chunk is in and the content matches the declared SHA-256.
+
+    Raises:
+        UploadError: If chunks are missing, the hash does not match or the
+        upload is already finalized.
+    """
+    names = list(upload.chunks.order_by('index').values_list('name', flat=True))
+    if len(names) != upload.chunk_count:
+        raise UploadError(f'{upload.chunk_count - len(names)} chunks missing')
+
+    # Claim the upload so that a concurrent finalize does not assemble it twice
+    if not ResumeUpload.objects.filter(pk=upload.pk, completed_at=None).update(completed_at=timezone.now()):
+        raise UploadError('Upload already finalized')
+    application = upload.application
+    previous = application.resume.name
+    content = AssembledFile(names, upload.size)
+    try:
+        application.resume.save(upload.filename, content, save=False)
+    except Exception:
+        ResumeUpload.objects.filter(pk=upload.pk).update(completed_at=None)
+        raise
+    if content.sha256.hexdigest() != upload.sha256.lower():
+        default_storage.delete(application.resume.name)
+        application.resume = previous
+        ResumeUpload.objects.filter(pk=upload.pk).update(completed_at=None)
+        raise UploadError('Content does not match the declared sha256')
+
+    application.save(update_fields=['resume', 'updated_at'])
+    discard_chunks(upload)
+    upload.refresh_from_db()
+    return application
+
+
+def discard_chunks(upload):
+    for name in upload.chunks.values_list('name', flat=True):
+        default_storage.delete(name)
+    upload.chunks.all().delete()
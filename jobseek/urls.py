@@ -8,5 +8,7 @@ router.register('jobskill', views.JobSkillViewSet, basename='jobskill')
 router.register('skill', views.SkillViewSet, basename='skill')
 router.register('user', views.CustomUserViewSet, basename='user')
 router.register('application', views.ApplicationViewSet, basename='application')
+router.register('resume_upload', views.ResumeUploadViewSet, basename='resume_upload')
+router.register('changes', views.ChangeViewSet, basename='changes')
 
 urlpatterns = router.urls
\ No newline at end of file
@@ -1,81 +1,282 @@
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework import viewsets
+from rest_framework import mixins, permissions, status, viewsets
 from .serializers import (CustomUserSerializer, 
                           CompanySerializer, 
                           JobSerializer, 
                           JobSkillSerializer, 
                           SkillSerializer, 
-                          ApplicationSerializer)
-from .models import Company, Job, JobSkill, Skill, Application, CustomUser
+                          ApplicationSerializer,
+                          ApplicationSearchSerializer,
+                          ResumeUploadSerializer)
+from .models import Company, Job, JobSkill, Skill, Application, CustomUser, ResumeUpload
+from . import events, uploads
+from .tasks import enqueue
+from . import changes, exports, facets, places, recommendations, salaries
+from .caching import CachedReadMixin
+from .ingest import JobIngestor
+from .mixins import RelationAwareQuerysetMixin
+from .search import search_applications, search_job_params
+from .skill_index import SkillQueryError, iter_bits, skill_index
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 
+# Largest number of jobs accepted by one bulk request
+BULK_MAX_ITEMS = 5000
 
 
-class CompanyViewSet(viewsets.ModelViewSet):
-    queryset = Company.objects.all()
+def filter_area(queryset, request):
+    # Radius around near=<place or lat,lon> and radius=<km>, or bbox=<south,west,north,east>
+    try:
+        return places.filter_area(
+            queryset,
+            near=request.query_params.get('near'),
+            radius=request.query_params.get('radius'),
+            bbox=request.query_params.get('bbox'),
+        )
+    except places.PlaceQueryError as error:
+        raise ValidationError({'detail': str(error)})
+
+
+def searched_jobs(queryset, request):
+    # The search parameters and area of the search and facets actions
+    try:
+        return search_job_params(queryset, request.query_params)
+    except places.PlaceQueryError as error:
+        raise ValidationError({'detail': str(error)})
+
+
+def export_response(request, name):
+    # output=ndjson|csv, compress=gzip, company=<id>, start and end creation moments, is_active=true|false
+    try:
+        queryset = exports.filtered(name, **exports.parse_filters(request.query_params))
+        chunks, content_type, filename = exports.stream(
+            name, queryset, output=request.query_params.get('output', 'ndjson'),
+            compress=request.query_params.get('compress') == 'gzip',
+        )
+    except exports.ExportError as error:
+        raise ValidationError({'detail': str(error)})
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class CompanyViewSet(CachedReadMixin, RelationAwareQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Company.objects.order_by('-created_at', '-id')
     serializer_class = CompanySerializer
+    cache_scope = 'company'
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        # Companies located in the area, newest first
+        if not (request.query_params.get('near') or request.query_params.get('bbox')):
+            raise ValidationError({'detail': 'Expected near=<place or lat,lon> or bbox=south,west,north,east.'})
 
-class JobViewSet(viewsets.ModelViewSet):
-    queryset = Job.objects.all()
+        page = self.paginate_queryset(filter_area(self.get_queryset(), request))
+        serializer = CompanySerializer(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
+
+class JobViewSet(CachedReadMixin, RelationAwareQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Job.objects.order_by('-created_at', '-id')
     serializer_class = JobSerializer
+    cache_scope = 'job'
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        # Get query parameters
+        # Match the jobs against the full-text index, best matches first, within the area if one is given
+
+        jobs = searched_jobs(self.get_queryset(), request)
+
+        # serializer and return one page of the ranked jobs
+
+        page = self.paginate_queryset(jobs)
+        serializer = JobSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        # A list of jobs with inline company and skill names
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'detail': 'Expected a list of jobs.'})
+        if len(items) > BULK_MAX_ITEMS:
+            raise ValidationError({'detail': f'At most {BULK_MAX_ITEMS} jobs per request.'})
+
+        results = list(JobIngestor().ingest(items))
+        created = sum(1 for result in results if 'id' in result)
+        return Response(
+            {'created': created, 'failed': len(results) - created, 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(detail=False, methods=['get'])
+    def match(self, request):
+        # Boolean skill expression, e.g. "Python AND Django AND NOT PHP"
+        expression = request.query_params.get('skills', '')
+        try:
+            bitmap = skill_index.match(expression)
+        except SkillQueryError as error:
+            raise ValidationError({'skills': str(error)})
+
+        # Read only the ids of the requested page from the bitmap, newest first
+
+        jobs = self.get_queryset().order_by('-id')
+        position, reverse = self.paginator.get_cursor(request, jobs)
+        job_ids = list(iter_bits(
+            bitmap,
+            descending=not reverse,
+            bound=position[0] if position else None,
+            limit=self.paginator.page_size + 1,
+        ))
+        page = self.paginate_queryset(jobs.filter(id__in=job_ids))
+        serializer = JobSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        # Same filters as the search action
+        query = request.query_params.get('q', None)
         location = request.query_params.get('location', None)
         skill_name = request.query_params.get('skill', None)
-        
-        # Listing all the jobs on the site
-        
-        jobs = Job.objects.all()
-        
-        # List Jobs by location
-        
-        if location:
-            jobs = jobs.filter(location__icontains=location)
-            
-        # Filter by Skill 
-        
-        if skill_name:
-            jobs = jobs.filter(jobskill__skill__name__icontains=skill_name)
-        
-        # serializer and return the filtered jobs
-        
-        serializer = JobSerializer(jobs, many=True)
-        return Response(serializer.data)
-class JobSkillViewSet(viewsets.ModelViewSet):
-    queryset = JobSkill.objects.all()
+
+        # Unfiltered counts come from the maintained store
+
+        if not (query or location or skill_name or request.query_params.get('near') or request.query_params.get('bbox')):
+            return Response(facets.stored_counts())
+
+        # Count only the jobs matching the search
+
+        jobs = searched_jobs(Job.objects.all(), request)
+        return Response(facets.queryset_counts(jobs))
+
+    @action(detail=False, methods=['get'])
+    def salaries(self, request):
+        # Percentiles and averages from the maintained histograms: all jobs, one group, or by=<facet>
+        try:
+            return Response(salaries.report(request.query_params))
+        except salaries.SalaryQueryError as error:
+            raise ValidationError({'detail': str(error)})
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # The whole catalog, streamed in keyset batches
+        return export_response(request, 'jobs')
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def recommended(self, request):
+        # Stored by the recommend_jobs command, or scored now for users without any
+
+        source, computed_at, scored = recommendations.recommendations_for(request.user)
+        jobs = recommendations.active_jobs(self.get_queryset(), scored)
+        results = [dict(JobSerializer(job).data, score=job.score) for job in jobs]
+        return Response({'source': source, 'computed_at': computed_at, 'results': results})
+
+
+class ChangeViewSet(viewsets.ViewSet):
+
+    def list(self, request):
+        # Jobs and companies changed after cursor=<next_cursor or head>, limit=<changes>, models=job,company
+        params = request.query_params
+        try:
+            limit = int(params.get('limit', changes.PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'limit': 'Expected a number.'})
+        try:
+            return Response(changes.page(
+                cursor=params.get('cursor'),
+                models=[model for model in params.get('models', '').split(',') if model],
+                limit=limit,
+                request=request,
+            ))
+        except changes.CursorExpiredError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_410_GONE)
+        except changes.ChangeFeedError as error:
+            raise ValidationError({'detail': str(error)})
+
+    @action(detail=False, methods=['get'])
+    def head(self, request):
+        # Taken before a full export, the feed then carries on from the export
+        return Response({'cursor': changes.head()})
+
+
+class JobSkillViewSet(RelationAwareQuerysetMixin, viewsets.ModelViewSet):
+    queryset = JobSkill.objects.order_by('-id')
     serializer_class = JobSkillSerializer
 
-class SkillViewSet(viewsets.ModelViewSet):
-    queryset = Skill.objects.all()
+class SkillViewSet(RelationAwareQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Skill.objects.order_by('-id')
     serializer_class = SkillSerializer
 
-class ApplicationViewSet(viewsets.ModelViewSet):
-    queryset = Application.objects.all()
+class ApplicationViewSet(RelationAwareQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Application.objects.order_by('-created_at', '-id')
     serializer_class = ApplicationSerializer
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            application = serializer.save()
+            enqueue(events.application_created, application_id=application.pk)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def search(self, request):
+        # Recruiters search the applications of one job or company by their resumes
+        query = request.query_params.get('q', None)
+        skill_name = request.query_params.get('skill', None)
+        filters = {}
+        for name in ('job', 'company'):
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            if not value.isdigit():
+                raise ValidationError({name: 'Expected an id.'})
+            filters[f'{name}_id'] = int(value)
+        if not filters:
+            raise ValidationError({'detail': 'Filter by job or company.'})
+
+        # Match the applications against the resume index, best matches first
+
+        applications = search_applications(
+            self.get_queryset().filter(**filters).prefetch_related('resume_document__matched_skills'),
+            query=query, skill=skill_name,
+        )
+        page = self.paginate_queryset(applications)
+        serializer = ApplicationSearchSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        # All the applications, usually of one company, streamed in keyset batches
+        return export_response(request, 'applications')
+
     @action(detail=False, methods=['get'])
     def get_by_user(self, request):
         user = request.user
-        applications = Application.objects.filter(applicant_email=user.email) 
-        serializer = ApplicationSerializer(applications, many=True)
-        return Response(serializer.data)
+        applications = self.get_queryset().filter(applicant_email=user.email)
+        page = self.paginate_queryset(applications)
+        serializer = ApplicationSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def create_by_user(self, request):
         user = request.user
         serializer = ApplicationSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(applicant_email=user.email)  # Adjust as necessary based on your model
+            with transaction.atomic():
+                application = serializer.save(applicant_email=user.email)  # Adjust as necessary based on your model
+                enqueue(events.application_created, application_id=application.pk)
             return Response(serializer.data)
         return Response(serializer.errors)
 
-class CustomUserViewSet(viewsets.ModelViewSet):
-    queryset = CustomUser.objects.all()
+class CustomUserViewSet(RelationAwareQuerysetMixin, viewsets.ModelViewSet):
+    queryset = CustomUser.objects.order_by('-created_at', '-id')
     serializer_class = CustomUserSerializer
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            user = serializer.save()
+            enqueue(events.user_registered, user_id=user.pk)
+
     @action(detail=False, methods=['get'])
     def get_current_user(self, request):
         
@@ -86,6 +287,61 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     def create_by_user(self, request):
         serializer = CustomUserSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save() 
+            with transaction.atomic():
+                user = serializer.save()
+                enqueue(events.user_registered, user_id=user.pk)
             return Response(serializer.data)
         return Response(serializer.errors)
+
+class ResumeUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable resume uploads: create an upload with the size and SHA-256 of
+    the file, PUT each chunk as the raw request body, then finalize to
+    attach the file to the application. Retrieving the upload lists the
+    chunks already received, so an interrupted client only resends the rest.
+    Applicants upload to their own applications, staff to any.
+    """
+    queryset = ResumeUpload.objects.prefetch_related('chunks')
+    serializer_class = ResumeUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        # Someone else's upload is not found, so it can be neither sent to nor finalized
+        user = self.request.user
+        queryset = super().get_queryset()
+        if user.is_staff:
+            return queryset
+        if not user.email:
+            return queryset.none()
+        return queryset.filter(application__applicant_email=user.email)
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        application = serializer.validated_data['application']
+        if not (user.is_staff or (user.email and application.applicant_email == user.email)):
+            raise PermissionDenied('You can only upload a resume to your own application.')
+        serializer.save()
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        upload = self.get_object()
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise ValidationError({'detail': 'Invalid Content-Length.'})
+        try:
+            # The body is read straight from the request stream, never parsed
+            uploads.store_chunk(upload, int(index), request.stream, length)
+        except uploads.UploadError as error:
+            raise ValidationError({'detail': str(error)})
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        # Found only while the application is still the caller's, as checked on the join
+        upload = self.get_object()
+        try:
+            application = uploads.finalize(upload)
+        except uploads.UploadError as error:
+            raise ValidationError({'detail': str(error)})
+        return Response(ApplicationSerializer(application, context=self.get_serializer_context()).data)
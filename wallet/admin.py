@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Wallet, Transaction, WalletAddress, CompanyWallet, UserWallet
+from .models import Wallet, Transaction, WalletAddress, CompanyWallet, UserWallet, Posting, BalanceCheckpoint
 
 
 admin.site.register(Wallet)
@@ -8,4 +8,6 @@ admin.site.register(Transaction)
 admin.site.register(WalletAddress)
 admin.site.register(CompanyWallet)
 admin.site.register(UserWallet)
+admin.site.register(Posting)
+admin.site.register(BalanceCheckpoint)
 
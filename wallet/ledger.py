@@ -0,0 +1,81 @@
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CENT, BalanceCheckpoint, Posting, Wallet
+
+
+def write_checkpoints(batch_size=200, settle=timedelta(minutes=1)):
+    """
+    Writes a new checkpoint for every wallet with postings after its latest
+    checkpoint, batch by batch, each batch in its own transaction.
+
+    Only postings made more than `settle` ago are folded in. Posting ids are
+    allocated before their transaction commits, so a newer posting can
+    become visible before an older one; leaving the recent ones to the next
+    run keeps a checkpoint from skipping a posting that commits late.
+
+    Args:
+        batch_size (int, optional): Wallets per batch.
+        settle (timedelta, optional): Age below which postings are left out.
+
+    Yields:
+        int: The number of checkpoints written by each batch.
+    """
+    high = Posting.objects.filter(created_at__lte=timezone.now() - settle).aggregate(high=Max('id'))['high']
+    if high is None:
+        return
+
+    latest = BalanceCheckpoint.objects.filter(wallet=OuterRef('pk')).order_by('-last_posting_id')
+    wallets = (
+        Wallet.objects
+        .annotate(
+            last_posting_id=Coalesce(Subquery(latest.values('last_posting_id')[:1]), 0),
+            checkpoint_balance=Subquery(latest.values('balance')[:1]),
+            checkpoint_as_of=Subquery(latest.values('as_of')[:1]),
+            newest_posting_id=Subquery(
+                Posting.objects.filter(wallet=OuterRef('pk'), id__lte=high).order_by('-id').values('id')[:1]
+            ),
+        )
+        .filter(newest_posting_id__gt=F('last_posting_id'))
+        .order_by('pk')
+        .values('pk', 'last_posting_id', 'checkpoint_balance', 'checkpoint_as_of')
+    )
+
+    after = 0
+    while True:
+        batch = list(wallets.filter(pk__gt=after)[:batch_size])
+        if not batch:
+            return
+        after = batch[-1]['pk']
+        yield write_batch(batch, high)
+
+
+def write_batch(batch, high):
+    condition = reduce(or_, (Q(wallet=row['pk'], id__gt=row['last_posting_id']) for row in batch))
+    deltas = {
+        row['wallet']: row
+        for row in Posting.objects.filter(condition, id__lte=high)
+        .values('wallet')
+        .annotate(total=Sum('amount'), last=Max('id'), as_of=Max('created_at'))
+    }
+    checkpoints = []
+    for row in batch:
+        delta = deltas[row['pk']]
+        as_of = delta['as_of']
+        if row['checkpoint_as_of'] is not None:
+            as_of = max(as_of, row['checkpoint_as_of'])
+        checkpoints.append(BalanceCheckpoint(
+            wallet_id=row['pk'],
+            balance=((row['checkpoint_balance'] or 0) + delta['total']).quantize(CENT),
+            last_posting_id=delta['last'],
+            as_of=as_of,
+        ))
+    with transaction.atomic():
+        BalanceCheckpoint.objects.bulk_create(checkpoints)
+    return len(checkpoints)
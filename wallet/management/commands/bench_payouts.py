@@ -0,0 +1,108 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+
+from jobseek.models import Company, CustomUser
+from wallet import payouts
+from wallet.models import CENT, CompanyWallet, Posting, Transaction, UserWallet, Wallet, WalletAddress
+
+
+class Command(BaseCommand):
+    help = (
+        'Pays a set of fresh recipients from a company wallet, once with one batch payout and once '
+        'with a transfer per recipient, and reports the time and queries of each. The rows are '
+        'deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=10_000)
+        parser.add_argument('--baseline', type=int, default=500,
+                            help='Recipients paid one transfer at a time, extrapolated to all')
+        parser.add_argument('--amount', type=Decimal, default=Decimal('12.34'))
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        count, amount = options['recipients'], options['amount']
+        prefix = f'8{random.Random(options["seed"]).randrange(10000):04d}'
+        company = Company.objects.create(name=f'Payout bench {prefix}', location='Lagos', description='')
+        company_wallet = CompanyWallet.objects.create(
+            company=company,
+            wallet=Wallet.objects.create(balance=amount * (count + options['baseline']), phone_number=f'{prefix}999998'),
+        )
+        users = []
+        try:
+            users = self.populate(prefix, count)
+            batch_elapsed, batch_queries = self.batch(company_wallet, users, amount)
+            baseline = users[:options['baseline']]
+            single_elapsed, single_queries = self.one_by_one(company_wallet, baseline, amount)
+            self.verify(company_wallet, users, amount, len(baseline))
+        finally:
+            # Their transactions and postings go with them
+            CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+            Wallet.objects.filter(phone_number__startswith=prefix).delete()
+            company.delete()
+
+        per_transfer = single_elapsed / max(len(baseline), 1)
+        self.stdout.write(
+            f'batch payout: {count} recipients in {batch_elapsed:.2f}s '
+            f'({count / batch_elapsed:.0f}/s), {batch_queries} queries'
+        )
+        self.stdout.write(
+            f'one transfer per recipient: {len(baseline)} recipients in {single_elapsed:.2f}s '
+            f'({1 / per_transfer:.0f}/s), {single_queries} queries; '
+            f'~{per_transfer * count:.1f}s and ~{single_queries * count // max(len(baseline), 1)} queries for {count}'
+        )
+        self.stdout.write(self.style.SUCCESS('Balances and ledger match the payouts'))
+
+    @staticmethod
+    def populate(prefix, count):
+        users = CustomUser.objects.bulk_create(
+            CustomUser(username=f'payee-{prefix}-{i}', phone_number=f'{prefix}{i:06d}') for i in range(count)
+        )
+        wallets = Wallet.objects.bulk_create(Wallet(phone_number=user.phone_number) for user in users)
+        UserWallet.objects.bulk_create(UserWallet(wallet=wallet, user=user) for user, wallet in zip(users, wallets))
+        WalletAddress.objects.bulk_create(
+            WalletAddress(wallet=user, address=f'{user.phone_number}-bp') for user in users
+        )
+        return users
+
+    @staticmethod
+    def batch(company_wallet, users, amount):
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            payouts.pay_out(company_wallet, [(user.pk, amount) for user in users], 'Bench payout')
+        return time.perf_counter() - started, len(queries)
+
+    @staticmethod
+    def one_by_one(company_wallet, users, amount):
+        # What Transaction.create_transfer does, from the company wallet
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for user in users:
+                wallet = Wallet.for_user(user)
+                address = WalletAddress.objects.filter(wallet=user).first()
+                with transaction.atomic():
+                    Wallet.apply_balance_changes({company_wallet.wallet_id: -amount, wallet.pk: amount})
+                    record = Transaction.objects.create(
+                        user=user, transaction_type=Transaction.PAYOUT, amount=amount,
+                        description='Bench transfer', recipient_address=address,
+                    )
+                    record.post(debit=company_wallet.wallet_id, credit=wallet.pk)
+        return time.perf_counter() - started, len(queries)
+
+    @staticmethod
+    def verify(company_wallet, users, amount, baseline):
+        expected = amount * (len(users) + baseline)
+        paid = Wallet.objects.filter(userwallet__user__in=users).aggregate(total=Sum('balance'))['total']
+        debited = Posting.objects.filter(wallet=company_wallet.wallet_id).aggregate(total=Sum('amount'))['total']
+        company_wallet.wallet.refresh_from_db()
+        if (Decimal(paid).quantize(CENT), -Decimal(debited).quantize(CENT), company_wallet.wallet.balance) != (
+            expected, expected, Decimal('0.00')
+        ):
+            raise CommandError(f'Recipients hold {paid} and the ledger debits {debited}, expected {expected}; '
+                               f'company left with {company_wallet.wallet.balance}')
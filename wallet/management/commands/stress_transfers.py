@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+
+from jobseek.models import CustomUser
+from wallet.models import CENT, InsufficientBalanceError, Transaction, UserWallet, Wallet, WalletAddress
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs random concurrent transfers between a set of fresh wallets, checks that no money '
+        'was created or lost and reports transfers per second. The wallets are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallets', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--transfers', type=int, default=2000, help='Transfers attempted in total')
+        parser.add_argument('--balance', type=Decimal, default=Decimal('100.00'), help='Starting balance')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # Threads need committed rows, so this cannot run in a rolled back transaction
+        users, wallets = self.populate(options['wallets'], options['balance'], options['seed'])
+        try:
+            elapsed, outcomes = self.run(users, options['threads'], options['transfers'], options['seed'])
+            self.verify(wallets, options['balance'], outcomes['ok'])
+        finally:
+            CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+            Wallet.objects.filter(pk__in=[wallet.pk for wallet in wallets]).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{outcomes["ok"]} transfers in {elapsed:.2f}s ({outcomes["ok"] / elapsed:.0f}/s), '
+            f'{outcomes["insufficient"]} refused for insufficient balance, '
+            f'{outcomes["error"]} database errors; money conserved'
+        ))
+
+    def populate(self, count, balance, seed):
+        prefix = f'9{random.Random(seed).randrange(10000):04d}'
+        users = [
+            CustomUser.objects.create(username=f'stress-{prefix}-{i}', phone_number=f'{prefix}{i:06d}')
+            for i in range(count)
+        ]
+        wallets = Wallet.objects.bulk_create(Wallet(phone_number=user.phone_number) for user in users)
+        UserWallet.objects.bulk_create(UserWallet(wallet=wallet, user=user) for user, wallet in zip(users, wallets))
+        for user in users:
+            WalletAddress.objects.create(wallet=user)
+            Transaction.create_deposit(user, balance)
+        return users, wallets
+
+    @staticmethod
+    def run(users, threads, transfers, seed):
+        outcomes = Counter()
+        lock = threading.Lock()
+
+        def worker(number):
+            rng = random.Random(seed + number)
+            local = Counter()
+            try:
+                for _ in range(transfers // threads):
+                    sender, recipient = rng.sample(users, 2)
+                    amount = Decimal(rng.randrange(1, 5000)) / 100
+                    try:
+                        Transaction.create_transfer(sender, recipient, amount)
+                        local['ok'] += 1
+                    except InsufficientBalanceError:
+                        local['insufficient'] += 1
+                    except DatabaseError:
+                        local['error'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    outcomes.update(local)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(worker, range(threads)))
+        return time.perf_counter() - started, outcomes
+
+    @staticmethod
+    def verify(wallets, balance, transfers):
+        ids = [wallet.pk for wallet in wallets]
+        total = Wallet.objects.filter(pk__in=ids).aggregate(total=Sum('balance'))['total'].quantize(CENT)
+        if total != balance * len(wallets):
+            raise CommandError(f'Balances add up to {total}, expected {balance * len(wallets)}')
+        if Wallet.objects.filter(pk__in=ids, balance__lt=0).exists():
+            raise CommandError('A wallet went negative')
+
+        recorded = Transaction.objects.filter(user__userwallet__wallet__in=ids, transaction_type=Transaction.TRANSFER)
+        if recorded.count() != transfers:
+            raise CommandError(f'{recorded.count()} transfers recorded, {transfers} succeeded')
+        for wallet in Wallet.objects.filter(pk__in=ids):
+            if wallet.balance != wallet.ledger_balance():
+                raise CommandError(f'Wallet {wallet.pk} balance does not match its ledger')
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from wallet.ledger import write_checkpoints
+from wallet.models import Wallet
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes a balance checkpoint for every wallet with new ledger postings, in batches. '
+        'With --verify, also checks each wallet balance against its ledger.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--settle-seconds', type=int, default=60,
+                            help='Leave out postings younger than this')
+        parser.add_argument('--verify', action='store_true')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = 0
+        for count in write_checkpoints(options['batch_size'], timedelta(seconds=options['settle_seconds'])):
+            written += count
+            self.stdout.write(f'{written} checkpoints written')
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} checkpoints in {time.perf_counter() - started:.1f}s'
+        ))
+
+        if options['verify']:
+            mismatched = 0
+            for wallet in Wallet.objects.order_by('pk').iterator():
+                ledger_balance = wallet.ledger_balance()
+                if ledger_balance != wallet.balance:
+                    mismatched += 1
+                    self.stderr.write(f'Wallet {wallet.pk}: balance {wallet.balance}, ledger {ledger_balance}')
+            self.stdout.write(f'{mismatched} wallets do not match their ledger')
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def open_checkpoints(apps, schema_editor):
+    # Balances before the ledger have no postings behind them, so each
+    # existing wallet starts from a checkpoint holding its current balance
+    Wallet = apps.get_model('wallet', 'Wallet')
+    BalanceCheckpoint = apps.get_model('wallet', 'BalanceCheckpoint')
+    now = timezone.now()
+    BalanceCheckpoint.objects.bulk_create(
+        (
+            BalanceCheckpoint(wallet_id=pk, balance=balance, last_posting_id=0, as_of=now)
+            for pk, balance in Wallet.objects.exclude(balance=0).values_list('id', 'balance').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0002_transfer_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('last_posting_id', models.BigIntegerField()),
+                ('as_of', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='wallet.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'as_of'], name='checkpoint_wallet_as_of_idx')],
+                'constraints': [models.UniqueConstraint(fields=('wallet', 'last_posting_id'), name='unique_wallet_checkpoint')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Posting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='wallet.transaction')),
+                ('wallet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='postings', to='wallet.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'id'], name='posting_wallet_id_idx')],
+            },
+        ),
+        migrations.RunPython(open_checkpoints, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Round
+from django.utils import timezone
 from jobseek .models import CustomUser
 from decimal import Decimal
 import uuid
@@ -7,8 +10,12 @@ TRANSCATION_TYPES = (
     ('deposit', 'Deposit'),
     ('withdrawal', 'Withdrawal'),
     ('transfer', 'Transfer'),
+    ('payout', 'Payout'),
 )
 
+# SQLite sums decimals as floats, so ledger sums are rounded back to cents
+CENT = Decimal('0.01')
+
 
 class Wallet(models.Model):
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
@@ -17,10 +24,121 @@ class Wallet(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=Q(balance__gte=0), name='wallet_balance_non_negative'),
+        ]
+
     def __str__(self):
         return f"{self.phone_number}: {self.balance:.2f} {self.currency}"
 
+    @classmethod
+    def for_user(cls, user: CustomUser) -> 'Wallet':
+        """
+        Returns the wallet of a user, the oldest one if they have several.
+
+        Raises:
+            Wallet.DoesNotExist: If the user has no wallet.
+        """
+        wallet = cls.objects.filter(userwallet__user=user).order_by('id').first()
+        if wallet is None:
+            raise cls.DoesNotExist(f"{user} has no wallet")
+        return wallet
+
+    @classmethod
+    def apply_balance_changes(cls, changes: dict) -> None:
+        """
+        Adds a delta to the balance of several wallets, all or nothing.
+
+        Each balance is changed with a single UPDATE, so concurrent changes
+        cannot overwrite each other, and a debit only matches the row while
+        the balance covers it. Rows are updated in id order, so two calls
+        touching the same wallets lock them in the same order and cannot
+        deadlock. The check constraint on the balance backs this up in the
+        database. Sums are rounded to cents, as SQLite adds decimals as
+        floats and would otherwise drift below a balance that covers a debit.
+
+        Args:
+            changes (dict): Decimal delta by wallet id.
+
+        Raises:
+            InsufficientBalanceError: If a debit exceeds the balance.
+            Wallet.DoesNotExist: If a wallet is missing.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            for wallet_id in sorted(changes):
+                delta = changes[wallet_id]
+                wallets = cls.objects.filter(pk=wallet_id)
+                if delta < 0:
+                    wallets = wallets.filter(balance__gte=-delta)
+                if wallets.update(balance=Round(F('balance') + delta, 2), updated_at=now):
+                    continue
+                if delta < 0 and cls.objects.filter(pk=wallet_id).exists():
+                    raise InsufficientBalanceError("Insufficient balance")
+                raise cls.DoesNotExist(f"Wallet {wallet_id} does not exist")
+
+    @classmethod
+    def credit_balances(cls, credits: dict, batch_size: int = 500) -> None:
+        """
+        Adds positive amounts to the balance of many wallets with one UPDATE
+        per batch of wallets instead of one per wallet. The rows of a batch
+        are locked in id order first where the database supports it, like
+        `apply_balance_changes` does row by row.
+
+        The statement is written by hand: a CASE of Django expressions costs
+        more to compile than the database takes to run it.
+
+        Args:
+            credits (dict): Positive Decimal amount by wallet id.
+            batch_size (int, optional): Wallets per UPDATE.
+
+        Raises:
+            Wallet.DoesNotExist: If a wallet is missing.
+        """
+        quote = connection.ops.quote_name
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        wallet_ids = sorted(credits)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(wallet_ids), batch_size):
+                batch = wallet_ids[start:start + batch_size]
+                list(cls.objects.select_for_update().filter(pk__in=batch).order_by('pk').values_list('pk'))
+                cursor.execute(
+                    'UPDATE %s SET balance = ROUND(balance + CASE id %s END, 2), updated_at = %%s WHERE id IN (%s)' % (
+                        quote(cls._meta.db_table), ' '.join(['WHEN %s THEN %s'] * len(batch)),
+                        ', '.join(['%s'] * len(batch)),
+                    ),
+                    [value for wallet_id in batch for value in (wallet_id, credits[wallet_id])] + [now] + batch,
+                )
+                if cursor.rowcount != len(batch):
+                    missing = set(batch) - set(cls.objects.filter(pk__in=batch).values_list('pk', flat=True))
+                    raise cls.DoesNotExist(f"Wallets {sorted(missing)} do not exist")
+
+    def ledger_balance(self, at=None) -> Decimal:
+        """
+        Derives the balance from the ledger: the latest checkpoint plus the
+        postings after it, so the cost grows with the postings since the
+        last checkpoint instead of with the whole history.
+
+        Args:
+            at (datetime, optional): Point in time, defaults to now.
+
+        Returns:
+            Decimal: The balance at that time.
+        """
+        checkpoints = self.checkpoints.order_by('-last_posting_id')
+        postings = self.postings.all()
+        if at is not None:
+            checkpoints = checkpoints.filter(as_of__lte=at)
+            postings = postings.filter(created_at__lte=at)
+        checkpoint = checkpoints.first()
+        balance = Decimal('0.00')
+        if checkpoint is not None:
+            balance = checkpoint.balance
+            postings = postings.filter(id__gt=checkpoint.last_posting_id)
+        total = postings.aggregate(total=Sum('amount'))['total'] or 0
+        return (balance + total).quantize(CENT)
+
 class UserWallet(models.Model):
     wallet = models.OneToOneField(Wallet, on_delete=models.CASCADE)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
@@ -69,6 +187,11 @@ class WalletAddress(models.Model):
         return wallet_address
 
 class Transaction(models.Model):
+    DEPOSIT = 'deposit'
+    WITHDRAWAL = 'withdrawal'
+    TRANSFER = 'transfer'
+    PAYOUT = 'payout'
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     transaction_type = models.CharField(
         max_length=10,
@@ -88,28 +211,45 @@ class Transaction(models.Model):
         'WalletAddress',
         on_delete=models.CASCADE,
         related_name='received_transactions',
-    )
+        blank=True,
+        null=True,
+    )  # Optional for withdrawals
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=Q(amount__gt=0), name='transaction_amount_positive'),
+        ]
+        # History pages and statements seek into these in (created_at, id) order
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='transaction_user_idx'),
+            models.Index(fields=['sender_address', 'created_at', 'id'], name='transaction_sender_idx'),
+            models.Index(fields=['recipient_address', 'created_at', 'id'], name='transaction_recipient_idx'),
+        ]
+
     def __str__(self) -> str:
         """
         Return a string representation of the transaction.
 
         The format will vary depending on the transaction type:
             - Transfer: "sender_address -> recipient_address: amount"
+            - Payout: "payout to recipient_address: amount"
             - Withdrawal: "withdrawn from user_wallet_address: amount"
         """
-        if self.transaction_type == 'TRANSFER':
+        if self.transaction_type == self.TRANSFER:
             return (
                 f"{self.sender_address.address} -> {self.recipient_address.address}: {self.amount}"
             )
-        elif self.transaction_type == 'WITHDRAWAL':
+        elif self.transaction_type == self.PAYOUT:
+            recipient = self.recipient_address.address if self.recipient_address else 'unaddressed wallet'
+            return f"payout to {recipient}: {self.amount}"
+        elif self.transaction_type == self.WITHDRAWAL:
             return (
-                f"withdrawn from {self.user.wallet.wallet_address.address}: {self.amount}"
+                f"withdrawn from {self.sender_address.address}: {self.amount}"
             )
         else:
-            return f"deposited to {self.user.wallet.wallet_address.address}: {self.amount}"
+            return f"deposited to {self.recipient_address.address}: {self.amount}"
 
     @classmethod
     def create_transfer(
@@ -130,28 +270,32 @@ class Transaction(models.Model):
 
         Returns:
             Transaction: The created transaction object.
-        """
-        sender_wallet = sender.wallet
-        if sender_wallet.balance < amount:
-            raise InsufficientBalanceError("Insufficient balance")
-
-        transaction = cls.objects.create(
-            user=sender,
-            transaction_type=cls.TRANSFER,
-            amount=amount,
-            description=description,
-            sender_address=sender_wallet.wallet_address,
-            recipient_address=recipient.wallet.wallet_address,
-        )
-
-        sender_wallet.balance -= amount
-        sender_wallet.save()
 
-        recipient_wallet = recipient.wallet
-        recipient_wallet.balance += amount
-        recipient_wallet.save()
-
-        return transaction
+        Raises:
+            InsufficientBalanceError: If the sender cannot cover the amount.
+        """
+        cls.check_amount(amount)
+        sender_wallet = Wallet.for_user(sender)
+        recipient_wallet = Wallet.for_user(recipient)
+        if sender_wallet.pk == recipient_wallet.pk:
+            raise ValueError("Cannot transfer to the same wallet")
+
+        # Lookups happen before the transaction so that it starts with a
+        # write and holds its locks as briefly as possible
+        sender_address = WalletAddress.objects.filter(wallet=sender).first()
+        recipient_address = WalletAddress.objects.filter(wallet=recipient).first()
+        with transaction.atomic():
+            Wallet.apply_balance_changes({sender_wallet.pk: -amount, recipient_wallet.pk: amount})
+            record = cls.objects.create(
+                user=sender,
+                transaction_type=cls.TRANSFER,
+                amount=amount,
+                description=description,
+                sender_address=sender_address,
+                recipient_address=recipient_address,
+            )
+            record.post(debit=sender_wallet.pk, credit=recipient_wallet.pk)
+            return record
 
     @classmethod
     def create_withdrawal(
@@ -170,24 +314,25 @@ class Transaction(models.Model):
 
         Returns:
             Transaction: The created transaction object.
-        """
-        user_wallet = user.wallet
-        if user_wallet.balance < amount:
-            raise InsufficientBalanceError("Insufficient balance")
-
-        transaction = cls.objects.create(
-            user=user,
-            transaction_type=cls.WITHDRAWAL,
-            amount=amount,
-            description=description,
-            sender_address=user_wallet.wallet_address,  # Use sender's wallet address
-            recipient_address=None,  # No recipient for withdrawals
-        )
-
-        user_wallet.balance -= amount
-        user_wallet.save()
 
-        return transaction
+        Raises:
+            InsufficientBalanceError: If the balance cannot cover the amount.
+        """
+        cls.check_amount(amount)
+        user_wallet = Wallet.for_user(user)
+        user_address = WalletAddress.objects.filter(wallet=user).first()
+        with transaction.atomic():
+            Wallet.apply_balance_changes({user_wallet.pk: -amount})
+            record = cls.objects.create(
+                user=user,
+                transaction_type=cls.WITHDRAWAL,
+                amount=amount,
+                description=description,
+                sender_address=user_address,  # Use sender's wallet address
+                recipient_address=None,  # No recipient for withdrawals
+            )
+            record.post(debit=user_wallet.pk, credit=None)
+            return record
     
     @classmethod
     def create_deposit(
@@ -207,19 +352,109 @@ class Transaction(models.Model):
         Returns:
             Transaction: The created transaction object.
         """
-        transaction = cls.objects.create(
-            user=user,
-            transaction_type=cls.DEPOSIT,
-            amount=amount,
-            description=description,
-            sender_address=None,  # No sender for deposits
-            recipient_address=user.wallet.wallet_address,  # Use recipient's wallet address
+        cls.check_amount(amount)
+        user_wallet = Wallet.for_user(user)
+        user_address = WalletAddress.objects.filter(wallet=user).first()
+        with transaction.atomic():
+            Wallet.apply_balance_changes({user_wallet.pk: amount})
+            record = cls.objects.create(
+                user=user,
+                transaction_type=cls.DEPOSIT,
+                amount=amount,
+                description=description,
+                sender_address=None,  # No sender for deposits
+                recipient_address=user_address,  # Use recipient's wallet address
+            )
+            record.post(debit=None, credit=user_wallet.pk)
+            return record
+
+    def post(self, debit, credit) -> None:
+        """
+        Writes the two ledger postings of the transaction. None stands for
+        the external account money comes from on deposits and goes to on
+        withdrawals.
+
+        Args:
+            debit (int): Id of the wallet the amount leaves, or None.
+            credit (int): Id of the wallet the amount enters, or None.
+        """
+        Posting.objects.bulk_create([
+            Posting(transaction=self, wallet_id=debit, amount=-self.amount),
+            Posting(transaction=self, wallet_id=credit, amount=self.amount),
+        ])
+
+    @classmethod
+    def history(cls, user: CustomUser, queryset: models.QuerySet = None) -> models.QuerySet:
+        """
+        The transactions that moved money in or out of the wallets of a user,
+        from their ledger postings rather than from who recorded them or the
+        addresses on them, with `net`: what they added to those wallets.
+
+        Args:
+            user (CustomUser): Owner of the wallets.
+            queryset (QuerySet, optional): Transactions to narrow, defaults to all.
+        """
+        postings = Posting.objects.filter(wallet__userwallet__user=user)
+        net = postings.filter(transaction=OuterRef('pk')).values('transaction').annotate(total=Sum('amount'))
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.filter(pk__in=postings.values('transaction_id')).annotate(
+            net=Subquery(net.values('total'), output_field=DecimalField(max_digits=12, decimal_places=2)),
         )
 
-        user.wallet.balance += amount
-        user.wallet.save()
+    @staticmethod
+    def check_amount(amount: Decimal) -> None:
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+
+
+# Ledger models
+class Posting(models.Model):
+    """
+    One side of a transaction in the double-entry ledger. Every transaction
+    has a debit (negative amount) and a credit (positive amount) posting,
+    so the postings of a transaction always add up to zero.
+    """
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='postings')
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.PROTECT,
+        related_name='postings',
+        blank=True,
+        null=True,
+    )  # Null for the external side of deposits and withdrawals
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'id'], name='posting_wallet_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id or 'external'}: {self.amount}"
+
+
+class BalanceCheckpoint(models.Model):
+    """
+    The balance of a wallet after all of its postings up to `last_posting_id`,
+    the latest of which was made at `as_of`.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='checkpoints')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_posting_id = models.BigIntegerField()
+    as_of = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
 
-        return transaction
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'last_posting_id'], name='unique_wallet_checkpoint'),
+        ]
+        indexes = [
+            models.Index(fields=['wallet', 'as_of'], name='checkpoint_wallet_as_of_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} @ {self.as_of}: {self.balance}"
 
 
 class InsufficientBalanceError(Exception):
@@ -0,0 +1,132 @@
+"""
+Batch payouts from a company wallet to the wallets of many users, applied
+all or nothing with a fixed number of statements per batch of recipients
+instead of a transfer per recipient.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import CENT, Posting, Transaction, UserWallet, Wallet, WalletAddress
+
+# Largest number of recipients accepted by one payout
+MAX_RECIPIENTS = 10_000
+
+# Recipients per UPDATE and per INSERT
+BATCH_SIZE = 500
+
+# Largest amount a balance column holds, from its max_digits and decimal_places
+MAX_AMOUNT = Decimal('99999999.99')
+
+
+class PayoutError(Exception):
+    """
+    Raised when some recipients of a payout are invalid. Nothing is paid;
+    `results` has the error of each invalid recipient.
+    """
+
+    def __init__(self, message, results):
+        super().__init__(message)
+        self.results = results
+
+
+def parse_amount(amount):
+    try:
+        amount = Decimal(str(amount))
+    except InvalidOperation:
+        return None, 'Expected a decimal amount'
+    if not amount.is_finite() or amount <= 0:
+        return None, 'Amount must be positive'
+    if amount != amount.quantize(CENT) or amount > MAX_AMOUNT:
+        return None, 'Amount must have at most 2 decimal places and 8 digits before them'
+    return amount.quantize(CENT), None
+
+
+def pay_out(company_wallet, payouts, description="", batch_size=BATCH_SIZE):
+    """
+    Pays many users from a company wallet in one database transaction.
+
+    The total is checked against the company balance once, by the single
+    conditional UPDATE that debits it. The recipients are then credited a
+    batch of wallets per UPDATE, and the transactions and their ledger
+    postings are written with bulk inserts. Each transaction is recorded
+    against its recipient, like a deposit. A recipient listed twice is paid
+    twice.
+
+    Args:
+        company_wallet (CompanyWallet): The wallet paying out.
+        payouts (iterable): `(recipient, amount)` pairs, the recipient being
+            a CustomUser or its id and the amount a Decimal or a string.
+        description (str, optional): A description for every transaction.
+        batch_size (int, optional): Recipients per statement.
+
+    Returns:
+        list: A dict per recipient, in order, with the recipient id, the
+        amount and the id of its transaction.
+
+    Raises:
+        PayoutError: If a recipient is invalid; nothing is paid.
+        InsufficientBalanceError: If the company cannot cover the total.
+    """
+    results, errors = [], 0
+    for recipient, amount in payouts:
+        recipient_id = getattr(recipient, 'pk', recipient)
+        amount, error = parse_amount(amount)
+        if not isinstance(recipient_id, int) or isinstance(recipient_id, bool):
+            error = 'Expected a recipient id'
+        results.append({'recipient': recipient_id, 'amount': amount, 'error': error})
+        errors += error is not None
+    if not results:
+        raise PayoutError('No recipients', results)
+
+    # The oldest wallet of each recipient, like Wallet.for_user
+    recipient_ids = {result['recipient'] for result in results if result['error'] is None}
+    wallets, addresses = {}, {}
+    for user_id, wallet_id in UserWallet.objects.filter(user_id__in=recipient_ids).values_list('user_id', 'wallet_id'):
+        wallets[user_id] = min(wallet_id, wallets.get(user_id, wallet_id))
+    for user_id, address_id in WalletAddress.objects.filter(wallet_id__in=recipient_ids).values_list('wallet_id', 'id'):
+        addresses[user_id] = address_id
+    for result in results:
+        if result['error'] is not None:
+            continue
+        wallet_id = wallets.get(result['recipient'])
+        if wallet_id is None:
+            result['error'] = 'Recipient has no wallet'
+        elif wallet_id == company_wallet.wallet_id:
+            result['error'] = 'Cannot pay the paying wallet'
+        errors += result['error'] is not None
+    if errors:
+        raise PayoutError(f'{errors} invalid recipients', [
+            {'recipient': result['recipient'], 'error': result['error']} for result in results if result['error']
+        ])
+
+    credits = {}
+    for result in results:
+        wallet_id = wallets[result['recipient']]
+        credits[wallet_id] = credits.get(wallet_id, Decimal('0.00')) + result['amount']
+    total = sum(credits.values())
+
+    with transaction.atomic():
+        # The debit comes first: one row checked and locked before any credit
+        Wallet.apply_balance_changes({company_wallet.wallet_id: -total})
+        Wallet.credit_balances(credits, batch_size)
+        records = Transaction.objects.bulk_create([
+            Transaction(
+                user_id=result['recipient'],
+                transaction_type=Transaction.PAYOUT,
+                amount=result['amount'],
+                description=description,
+                recipient_address_id=addresses.get(result['recipient']),
+            )
+            for result in results
+        ], batch_size=batch_size)
+        postings = []
+        for record, result in zip(records, results):
+            postings.append(Posting(transaction=record, wallet_id=company_wallet.wallet_id, amount=-record.amount))
+            postings.append(Posting(transaction=record, wallet_id=wallets[result['recipient']], amount=record.amount))
+        Posting.objects.bulk_create(postings, batch_size=batch_size)
+
+    return [
+        {'recipient': result['recipient'], 'amount': result['amount'], 'transaction': record.pk}
+        for record, result in zip(records, results)
+    ]
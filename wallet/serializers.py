@@ -0,0 +1,21 @@
+from rest_framework import serializers
+
+from .models import Transaction
+
+
+# Transaction serializer, one line of a wallet history seen by one user
+class TransactionSerializer(serializers.ModelSerializer):
+    sender = serializers.SlugRelatedField(source='sender_address', slug_field='address', read_only=True)
+    recipient = serializers.SlugRelatedField(source='recipient_address', slug_field='address', read_only=True)
+    direction = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Transaction
+        fields = ['id', 'transaction_type', 'direction', 'amount', 'description', 'sender', 'recipient', 'created_at']
+
+    def get_direction(self, record):
+        # Money into the wallets of the viewer, from Transaction.history, or as given in the context
+        net = getattr(record, 'net', None)
+        if net is None:
+            return self.context['direction']
+        return 'in' if net > 0 else 'out'
@@ -0,0 +1,77 @@
+"""
+Wallet statements streamed as CSV or NDJSON. Rows are read in keyset
+batches and written as they are read, so memory stays flat whatever the
+date range.
+"""
+import csv
+import json
+
+from jobseek.pagination import KeysetPagination
+
+FIELDS = ['id', 'created_at', 'transaction_type', 'amount', 'net', 'description',
+          'sender_address__address', 'recipient_address__address']
+
+COLUMNS = ['id', 'created_at', 'type', 'direction', 'amount', 'description', 'sender', 'recipient']
+
+ORDERING = [('created_at', False), ('id', False)]
+
+
+def iter_rows(queryset, batch_size=1000):
+    """
+    Yields the statement rows of a Transaction queryset, oldest first.
+
+    Each batch is its own query positioned after the last row of the
+    previous one, so no cursor stays open while the response is sent.
+
+    Args:
+        queryset (QuerySet): Transactions of the statement, from
+            Transaction.history for the direction.
+        batch_size (int, optional): Rows per query.
+    """
+    queryset = queryset.order_by('created_at', 'id').values(*FIELDS)
+    position = None
+    while True:
+        batch = queryset
+        if position is not None:
+            batch = batch.filter(KeysetPagination.after(ORDERING, position))
+        rows = list(batch[:batch_size])
+        for row in rows:
+            incoming = row['net'] > 0
+            yield {
+                'id': row['id'],
+                'created_at': row['created_at'].isoformat(),
+                'type': row['transaction_type'],
+                'direction': 'in' if incoming else 'out',
+                'amount': str(row['amount'] if incoming else -row['amount']),
+                'description': row['description'] or '',
+                'sender': row['sender_address__address'],
+                'recipient': row['recipient_address__address'],
+            }
+        if len(rows) < batch_size:
+            return
+        position = [rows[-1]['created_at'], rows[-1]['id']]
+
+
+class Echo:
+    """A file-like object handing back what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([row[column] for column in COLUMNS])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
@@ -1,3 +1,296 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from jobseek.models import Company, CustomUser
+
+from . import payouts, statements
+from .ledger import write_checkpoints
+from .models import (
+    BalanceCheckpoint, CompanyWallet, InsufficientBalanceError, Posting, Transaction, UserWallet, Wallet, WalletAddress,
+)
+
+
+def make_user_wallet(username, phone_number, balance='0.00'):
+    user = CustomUser.objects.create(username=username, phone_number=phone_number)
+    wallet = Wallet.objects.create(balance=Decimal(balance), phone_number=phone_number)
+    UserWallet.objects.create(wallet=wallet, user=user)
+    WalletAddress.objects.create(wallet=user)
+    return user, wallet
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.ada, self.ada_wallet = make_user_wallet('ada', '08000000001', '100.00')
+        self.bola, self.bola_wallet = make_user_wallet('bola', '08000000002')
+
+    def test_transfer_moves_money_and_records_it(self):
+        record = Transaction.create_transfer(self.ada, self.bola, Decimal('30.50'), 'Rent')
+
+        self.ada_wallet.refresh_from_db()
+        self.bola_wallet.refresh_from_db()
+        self.assertEqual(self.ada_wallet.balance, Decimal('69.50'))
+        self.assertEqual(self.bola_wallet.balance, Decimal('30.50'))
+        self.assertEqual(record.transaction_type, Transaction.TRANSFER)
+        self.assertEqual(record.recipient_address, self.bola.walletaddress)
+        self.assertIn('->', str(record))
+
+    def test_overdraft_changes_nothing(self):
+        with self.assertRaises(InsufficientBalanceError):
+            Transaction.create_transfer(self.ada, self.bola, Decimal('100.01'))
+        with self.assertRaises(InsufficientBalanceError):
+            Transaction.create_withdrawal(self.bola, Decimal('1.00'))
+
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(Wallet.objects.get(pk=self.bola_wallet.pk).balance, Decimal('0.00'))
+
+    def test_deposit_and_withdrawal(self):
+        Transaction.create_deposit(self.bola, Decimal('5.00'))
+        Transaction.create_withdrawal(self.bola, Decimal('5.00'))
+        self.assertEqual(Wallet.objects.get(pk=self.bola_wallet.pk).balance, Decimal('0.00'))
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_rejects_non_positive_amounts_and_self_transfers(self):
+        with self.assertRaises(ValueError):
+            Transaction.create_transfer(self.ada, self.bola, Decimal('0'))
+        with self.assertRaises(ValueError):
+            Transaction.create_transfer(self.ada, self.ada, Decimal('1'))
+
+    def test_database_refuses_negative_balances(self):
+        self.ada_wallet.balance = Decimal('-1.00')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.ada_wallet.save()
+
+
+class TransferEndpointTests(APITestCase):
+    def test_transfer_endpoint(self):
+        ada, ada_wallet = make_user_wallet('ada', '08000000001', '10.00')
+        bola, _ = make_user_wallet('bola', '08000000002')
+        self.assertEqual(self.client.post('/wallet/wallet/transfer/', {}).status_code, 401)
+
+        self.client.force_authenticate(ada)
+        response = self.client.post('/wallet/wallet/transfer/', {'recipient': bola.pk, 'amount': '2.50'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['direction'], response.data['amount']), ('out', '2.50'))
+        self.assertEqual(Wallet.objects.get(pk=ada_wallet.pk).balance, Decimal('7.50'))
+        for body in ({'recipient': bola.pk, 'amount': '8.00'}, {'recipient': ada.pk, 'amount': '1.00'},
+                     {'recipient': 'bola', 'amount': '1.00'}, {'recipient': bola.pk, 'amount': '-1'}):
+            self.assertEqual(self.client.post('/wallet/wallet/transfer/', body, format='json').status_code, 400)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+class LedgerTests(APITestCase):
+    def setUp(self):
+        self.ada, self.ada_wallet = make_user_wallet('ada', '08000000001')
+        self.bola, self.bola_wallet = make_user_wallet('bola', '08000000002')
+        Transaction.create_deposit(self.ada, Decimal('100.00'))
+        Transaction.create_transfer(self.ada, self.bola, Decimal('40.00'))
+
+    def backdate_postings(self, delta):
+        Posting.objects.update(created_at=timezone.now() - delta)
+
+    def test_every_transaction_posts_a_balanced_pair(self):
+        Transaction.create_withdrawal(self.bola, Decimal('15.00'))
+        for record in Transaction.objects.all():
+            amounts = sorted(record.postings.values_list('amount', flat=True))
+            self.assertEqual(amounts, [-record.amount, record.amount])
+        self.assertEqual(self.ada_wallet.ledger_balance(), Decimal('60.00'))
+        self.assertEqual(self.bola_wallet.ledger_balance(), Decimal('25.00'))
+
+    def test_checkpoints_fold_settled_postings_only(self):
+        self.backdate_postings(timedelta(hours=1))
+        Transaction.create_transfer(self.bola, self.ada, Decimal('10.00'))
+
+        self.assertEqual(sum(write_checkpoints(batch_size=1)), 2)
+        checkpoint = BalanceCheckpoint.objects.get(wallet=self.bola_wallet)
+        self.assertEqual(checkpoint.balance, Decimal('40.00'))
+        self.assertEqual(sum(write_checkpoints()), 0)
+
+        # Only the postings after the checkpoint are read
+        with self.assertNumQueries(2):
+            self.assertEqual(self.bola_wallet.ledger_balance(), Decimal('30.00'))
+        self.assertEqual(self.ada_wallet.ledger_balance(), Decimal('70.00'))
+
+    def test_historical_balance(self):
+        self.backdate_postings(timedelta(hours=2))
+        list(write_checkpoints())
+        moment = timezone.now() - timedelta(hours=1)
+        Transaction.create_transfer(self.bola, self.ada, Decimal('10.00'))
+
+        self.assertEqual(self.bola_wallet.ledger_balance(moment), Decimal('40.00'))
+        self.assertEqual(self.bola_wallet.ledger_balance(timezone.now() - timedelta(hours=3)), Decimal('0'))
+
+        self.client.force_authenticate(self.bola)
+        url = f'/wallet/wallet/{self.bola_wallet.pk}/balance/'
+        self.assertEqual(self.client.get(url).data['balance'], Decimal('30.00'))
+        self.assertEqual(self.client.get(url, {'at': moment.isoformat()}).data['balance'], Decimal('40.00'))
+        self.assertEqual(self.client.get(url, {'at': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(f'/wallet/wallet/{self.ada_wallet.pk}/balance/').status_code, 404)
+
+    def test_verify_reports_drift(self):
+        Wallet.objects.filter(pk=self.ada_wallet.pk).update(balance=Decimal('61.00'))
+        out, err = StringIO(), StringIO()
+        call_command('write_checkpoints', verify=True, stdout=out, stderr=err)
+        self.assertIn('1 wallets do not match', out.getvalue())
+        self.assertIn(f'Wallet {self.ada_wallet.pk}', err.getvalue())
+
+
+class PayoutTests(APITestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create(username='admin', phone_number='08000000000', is_staff=True)
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        self.company_wallet = CompanyWallet.objects.create(
+            company=company, wallet=Wallet.objects.create(balance=Decimal('100.00'), phone_number='08000000099'),
+        )
+        self.payees = [make_user_wallet(f'payee{i}', f'0800000001{i}') for i in range(3)]
+
+    def balances(self):
+        return [Wallet.objects.get(pk=wallet.pk).balance for _, wallet in self.payees]
+
+    def test_pays_every_recipient_in_few_statements(self):
+        (ada, ada_wallet), (bola, _), (chidi, _) = self.payees
+        with self.assertNumQueries(19):  # Savepoints included
+            results = payouts.pay_out(self.company_wallet, [
+                (ada, '10.00'), (bola.pk, Decimal('20.50')), (chidi, 5), (ada, '1.25'),
+            ], 'Bounty', batch_size=2)
+
+        self.assertEqual([result['amount'] for result in results],
+                         [Decimal('10.00'), Decimal('20.50'), Decimal('5.00'), Decimal('1.25')])
+        self.assertEqual(self.balances(), [Decimal('11.25'), Decimal('20.50'), Decimal('5.00')])
+        self.company_wallet.wallet.refresh_from_db()
+        self.assertEqual(self.company_wallet.wallet.balance, Decimal('63.25'))
+        record = Transaction.objects.get(pk=results[0]['transaction'])
+        self.assertEqual((record.transaction_type, record.user, record.recipient_address),
+                         (Transaction.PAYOUT, ada, ada.walletaddress))
+        self.assertEqual(sorted(record.postings.values_list('amount', flat=True)), [Decimal('-10.00'), Decimal('10.00')])
+        self.assertEqual(ada_wallet.ledger_balance(), Decimal('11.25'))
+
+    def test_invalid_recipients_or_overdraft_pay_nobody(self):
+        stranger = CustomUser.objects.create(username='stranger', phone_number='08000000050')
+        (ada, _), _, _ = self.payees
+        with self.assertRaises(payouts.PayoutError) as raised:
+            payouts.pay_out(self.company_wallet, [
+                (ada, '10.00'), (stranger, '1.00'), (ada, '-1'), (ada, '0.001'), ('x', '1'),
+            ])
+        self.assertEqual([result['error'] for result in raised.exception.results], [
+            'Recipient has no wallet', 'Amount must be positive',
+            'Amount must have at most 2 decimal places and 8 digits before them', 'Expected a recipient id',
+        ])
+        with self.assertRaises(InsufficientBalanceError):
+            payouts.pay_out(self.company_wallet, [(user, '50.00') for user, _ in self.payees])
+
+        self.assertEqual(self.balances(), [Decimal('0.00')] * 3)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_payout_endpoint(self):
+        url = f'/wallet/company_wallet/{self.company_wallet.pk}/payouts/'
+        body = {'description': 'Payroll', 'payouts': [
+            {'recipient': user.pk, 'amount': '30.00'} for user, _ in self.payees
+        ]}
+        self.client.force_authenticate(self.payees[0][0])
+        self.assertEqual(self.client.post(url, body, format='json').status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(url, {'payouts': [{'recipient': 0, 'amount': '1'}, 'junk']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 2)
+        response = self.client.post(url, body, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['paid'], response.data['total'], response.data['balance']),
+                         (3, '90.00', '10.00'))
+        self.assertEqual(self.client.post(url, body, format='json').data['detail'], 'Insufficient balance.')
+
+    def test_payees_see_the_credit_and_the_admin_does_not(self):
+        ada = self.payees[0][0]
+        payouts.pay_out(self.company_wallet, [(ada, '10.00')], 'Bounty')
+        self.client.force_authenticate(ada)
+        rows = self.client.get('/wallet/transactions/').data['results']
+        self.assertEqual([(row['transaction_type'], row['direction'], row['amount']) for row in rows],
+                         [('payout', 'in', '10.00')])
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/wallet/transactions/').data['results'], [])
+
+
+class TransactionHistoryTests(APITestCase):
+    def setUp(self):
+        self.ada, _ = make_user_wallet('ada', '08000000001')
+        self.bola, _ = make_user_wallet('bola', '08000000002')
+        self.deposit = Transaction.create_deposit(self.ada, Decimal('100.00'))
+        Transaction.create_transfer(self.ada, self.bola, Decimal('40.00'))
+        Transaction.create_transfer(self.bola, self.ada, Decimal('5.00'))
+        Transaction.create_withdrawal(self.bola, Decimal('10.00'))
+        self.client.force_authenticate(self.bola)
+
+    def test_history_pages_newest_first_in_fixed_queries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/wallet/transactions/', {'page_size': 2})
+        self.assertEqual([(row['transaction_type'], row['direction'], row['amount']) for row in response.data['results']],
+                         [('withdrawal', 'out', '10.00'), ('transfer', 'out', '5.00')])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([(row['transaction_type'], row['direction'], row['sender']) for row in response.data['results']],
+                         [('transfer', 'in', self.ada.walletaddress.address)])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get('/wallet/transactions/', {'direction': 'in'})
+        self.assertEqual([row['amount'] for row in response.data['results']], ['40.00'])
+        self.assertEqual(self.client.get('/wallet/transactions/', {'direction': 'up'}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/wallet/transactions/').status_code, 401)
+
+    def test_statement_streams_a_date_range(self):
+        Transaction.objects.filter(pk=self.deposit.pk).update(created_at=timezone.now() - timedelta(days=3))
+        self.client.force_authenticate(self.ada)
+        response = self.client.get('/wallet/transactions/statement/')
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([(row['type'], row['amount']) for row in rows],
+                         [('deposit', '100.00'), ('transfer', '-40.00'), ('transfer', '5.00')])
+
+        start = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get('/wallet/transactions/statement/', {'output': 'ndjson', 'start': start})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([line['amount'] for line in lines], ['-40.00', '5.00'])
+        self.assertEqual(self.client.get('/wallet/transactions/statement/', {'end': 'soon'}).status_code, 400)
+
+    def test_statement_rows_are_read_in_batches(self):
+        queryset = Transaction.history(self.bola)
+        with self.assertNumQueries(4):
+            rows = list(statements.iter_rows(queryset, batch_size=1))
+        self.assertEqual([(row['type'], row['direction']) for row in rows],
+                         [('transfer', 'in'), ('transfer', 'out'), ('withdrawal', 'out')])
+
+    def test_payouts_to_users_without_an_address_are_theirs(self):
+        chidi = CustomUser.objects.create(username='chidi', phone_number='08000000003')
+        UserWallet.objects.create(wallet=Wallet.objects.create(phone_number='08000000003'), user=chidi)
+        company = Company.objects.create(name='Acme', location='Lagos', description='')
+        company_wallet = CompanyWallet.objects.create(
+            company=company, wallet=Wallet.objects.create(balance=Decimal('50.00'), phone_number='08000000099'),
+        )
+        payouts.pay_out(company_wallet, [(chidi, '20.00')], 'Bounty')
+        Transaction.create_deposit(chidi, Decimal('1.00'))
+
+        self.client.force_authenticate(chidi)
+        rows = self.client.get('/wallet/transactions/').data['results']
+        self.assertEqual([(row['transaction_type'], row['direction'], row['amount']) for row in rows],
+                         [('deposit', 'in', '1.00'), ('payout', 'in', '20.00')])
+        response = self.client.get('/wallet/transactions/statement/')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([(row['type'], row['direction'], row['amount']) for row in rows],
+                         [('payout', 'in', '20.00'), ('deposit', 'in', '1.00')])
+
+
+class TransferStressTests(TransactionTestCase):
+    def test_concurrent_transfers_conserve_money(self):
+        out = StringIO()
+        call_command('stress_transfers', wallets=5, threads=4, transfers=200, balance=Decimal('100.00'), stdout=out)
+        self.assertIn(' 0 database errors; money conserved', out.getvalue())
+        self.assertFalse(Wallet.objects.exists())
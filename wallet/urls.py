@@ -2,6 +2,9 @@ from rest_framework import routers
 from . import views
 
 router = routers.DefaultRouter()
+router.register('wallet', views.WalletViewSet, basename='wallet')
+router.register('company_wallet', views.CompanyWalletViewSet)
+router.register('transactions', views.TransactionViewSet, basename='transaction')
 
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = router.urls
@@ -1,3 +1,185 @@
-from django.shortcuts import render
+from datetime import datetime, time
 
-# Create your views here.
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from jobseek.mixins import RelationAwareQuerysetMixin
+from jobseek.models import CustomUser
+
+from . import payouts, statements
+from .models import CompanyWallet, InsufficientBalanceError, Transaction, Wallet
+from .serializers import TransactionSerializer
+
+
+def parse_moment(params, name):
+    """
+    Reads an ISO 8601 date or date and time from the query parameters, a
+    date standing for its midnight.
+
+    Raises:
+        ValidationError: If the value cannot be parsed.
+    """
+    value = params.get(name)
+    if value is None:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value) if len(value) == 10 else None
+        if day is None:
+            raise ValidationError({name: 'Expected an ISO 8601 date or date and time.'})
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class WalletViewSet(viewsets.GenericViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Wallet.objects.filter(userwallet__user=self.request.user).order_by('id')
+
+    @action(detail=True, methods=['get'])
+    def balance(self, request, pk=None):
+        """
+        Returns the ledger balance of one of the user's wallets, now or at the
+        ISO 8601 time given in `at`.
+        """
+        wallet = self.get_object()
+        at = parse_moment(request.query_params, 'at')
+        return Response({
+            'wallet': wallet.pk,
+            'currency': wallet.currency,
+            'at': at or timezone.now(),
+            'balance': wallet.ledger_balance(at),
+        })
+
+    @action(detail=False, methods=['post'])
+    def transfer(self, request):
+        """
+        Transfers money from the user's wallet to another user's. Expects
+        `{"recipient": user_id, "amount": "10.00", "description": ...}`.
+        """
+        amount, error = payouts.parse_amount(request.data.get('amount'))
+        if error:
+            raise ValidationError({'amount': error})
+        recipient_id = request.data.get('recipient')
+        if not isinstance(recipient_id, int) or isinstance(recipient_id, bool):
+            raise ValidationError({'recipient': 'Expected a recipient id.'})
+        recipient = CustomUser.objects.filter(pk=recipient_id).first()
+        if recipient is None:
+            raise ValidationError({'recipient': 'Unknown recipient.'})
+        try:
+            record = Transaction.create_transfer(
+                request.user, recipient, amount, description=str(request.data.get('description') or '')[:100],
+            )
+        except Wallet.DoesNotExist:
+            raise ValidationError({'detail': 'Sender and recipient need a wallet.'})
+        except ValueError as error:
+            raise ValidationError({'detail': str(error)})
+        except InsufficientBalanceError:
+            raise ValidationError({'detail': 'Insufficient balance.'})
+        return Response(
+            TransactionSerializer(record, context={'direction': 'out'}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class TransactionViewSet(RelationAwareQuerysetMixin, viewsets.GenericViewSet):
+    """
+    The transactions of the user: the ones that moved money in or out of
+    their wallets according to the ledger, newest first. `direction=in|out`
+    keeps one side.
+    """
+    queryset = Transaction.objects.order_by('-created_at', '-id')
+    serializer_class = TransactionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        direction = self.request.query_params.get('direction')
+        if direction not in (None, 'in', 'out'):
+            raise ValidationError({'direction': 'Expected in or out.'})
+        transactions = Transaction.history(self.request.user, super().get_queryset())
+        if direction == 'in':
+            return transactions.filter(net__gt=0)
+        if direction == 'out':
+            return transactions.filter(net__lte=0)
+        return transactions
+
+    def list(self, request):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def statement(self, request):
+        """
+        Streams the transactions between `start` (inclusive) and `end`
+        (exclusive) as CSV, or NDJSON with `output=ndjson`, oldest first
+        and with signed amounts.
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in statements.FORMATS:
+            raise ValidationError({'output': f'Expected one of {", ".join(statements.FORMATS)}.'})
+        start = parse_moment(request.query_params, 'start')
+        end = parse_moment(request.query_params, 'end')
+        transactions = self.get_queryset()
+        if start is not None:
+            transactions = transactions.filter(created_at__gte=start)
+        if end is not None:
+            transactions = transactions.filter(created_at__lt=end)
+
+        write, content_type = statements.FORMATS[output]
+        response = StreamingHttpResponse(
+            write(statements.iter_rows(transactions)), content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="statement.{output}"'
+        return response
+
+
+class CompanyWalletViewSet(viewsets.GenericViewSet):
+    queryset = CompanyWallet.objects.select_related('wallet').order_by('id')
+    permission_classes = [permissions.IsAdminUser]
+
+    @action(detail=True, methods=['post'])
+    def payouts(self, request, pk=None):
+        """
+        Pays many users from the company wallet, all or nothing. Expects
+        `{"description": ..., "payouts": [{"recipient": user_id, "amount": "10.00"}, ...]}`
+        and reports the transaction of every recipient, or the error of
+        every invalid one.
+        """
+        company_wallet = self.get_object()
+        items = request.data.get('payouts') if isinstance(request.data, dict) else None
+        if not isinstance(items, list):
+            raise ValidationError({'payouts': 'Expected a list of payouts.'})
+        if len(items) > payouts.MAX_RECIPIENTS:
+            raise ValidationError({'payouts': f'At most {payouts.MAX_RECIPIENTS} recipients per payout.'})
+        pairs = [
+            (item.get('recipient'), item.get('amount')) if isinstance(item, dict) else (None, None)
+            for item in items
+        ]
+        try:
+            results = payouts.pay_out(
+                company_wallet, pairs, description=str(request.data.get('description') or '')[:100],
+            )
+        except payouts.PayoutError as error:
+            return Response(
+                {'paid': 0, 'failed': len(error.results), 'results': error.results},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except InsufficientBalanceError:
+            raise ValidationError({'detail': 'Insufficient balance.'})
+        company_wallet.wallet.refresh_from_db(fields=['balance'])
+        return Response({
+            'paid': len(results),
+            'failed': 0,
+            'total': str(sum(result['amount'] for result in results)),
+            'balance': str(company_wallet.wallet.balance),
+            'results': [dict(result, amount=str(result['amount'])) for result in results],
+        }, status=status.HTTP_201_CREATED)